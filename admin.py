@@ -3,14 +3,43 @@ import pandas as pd
 import requests
 import time
 import os
+from datetime import datetime, date
+import database
 from database import SessionLocal
-from models import Turno, Cliente, Staff, Servicio, Usuario
+from models import Cliente, Staff, Servicio, Usuario
 
 # Configuración de la página
 st.set_page_config(page_title="Admin Barbería", layout="wide")
 
+# Consultas a la base de cada rerun (conteo, N+1 y lentas en el log). st.rerun() y st.stop()
+# cortan el script en cualquier punto: el alcance del rerun anterior se cierra al empezar este.
+if "alcance_consultas" in st.session_state:
+    st.session_state["alcance_consultas"].cerrar()
+st.session_state["alcance_consultas"] = database.abrir_alcance("admin")
+
 # Intenta leer la URL de las variables de entorno
 API_URL = "https://barberia-bot-backend-1.onrender.com"
+# Sesión HTTP compartida: reutiliza conexiones y manda la API key del negocio (X-API-Key)
+api = requests.Session()
+if os.getenv("ADMIN_API_KEY"):
+    api.headers["X-API-Key"] = os.getenv("ADMIN_API_KEY")
+TURNOS_POR_PAGINA = 100
+CLIENTES_POR_PAGINA = 100
+
+# GET con ETag: guardamos la última respuesta y, si no cambió, la API contesta 304 sin cuerpo
+def get_con_etag(url):
+    cache = st.session_state.setdefault("cache_etag", {})
+    headers = {"If-None-Match": cache[url][0]} if url in cache else {}
+    res = api.get(url, headers=headers)
+    if res.status_code == 304:
+        return cache[url][1]
+    if res.status_code == 200:
+        datos = res.json()
+        if "ETag" in res.headers:
+            cache[url] = (res.headers["ETag"], datos)
+        return datos
+    return None
+
 # --- GESTIÓN DE SESIÓN (LOGIN) ---
 if 'logged_in' not in st.session_state:
     st.session_state['logged_in'] = False
@@ -80,6 +109,8 @@ with st.sidebar:
     st.header("Menú Principal")
     opcion = st.radio("Ir a:", ["Dashboard", "Servicios", "Staff", "Clientes"])
 
+st.session_state["alcance_consultas"].nombre = f"admin: {opcion}"
+
 # --- PÁGINA: DASHBOARD (TURNOS) ---
 if opcion == "Dashboard":
     st.title("📅 Centro de Comando")
@@ -97,63 +128,74 @@ if opcion == "Dashboard":
         7: "Jul", 8: "Ago", 9: "Sep", 10: "Oct", 11: "Nov", 12: "Dic"
     }
 
-    db = SessionLocal()
+    # 2. Paginación por cursor: guardamos los cursores de las páginas ya recorridas
+    if st.session_state.get('turnos_historial') != ver_historial:
+        st.session_state['turnos_cursores'] = [None]
+        st.session_state['turnos_historial'] = ver_historial
+    cursores = st.session_state['turnos_cursores']
+
+    params = {"limite": TURNOS_POR_PAGINA}
+    if not ver_historial:
+        params["desde"] = datetime.combine(date.today(), datetime.min.time()).isoformat()
+    if cursores[-1]:
+        params["cursor"] = cursores[-1]
+
     try:
-        # Traemos todos los turnos
-        turnos = db.query(Turno).all()
+        # Traemos solo una página de turnos (filtrada y con cliente/servicio/staff ya incluidos)
+        res = api.get(f"{API_URL}/turnos/", params=params)
+        res.raise_for_status()
+        pagina = res.json()
+        turnos = pagina["items"]
         
         if turnos:
             data = []
             for t in turnos:
                 # Formateo de fecha
-                dia = t.fecha_hora_inicio.day
-                mes = meses_es[t.fecha_hora_inicio.month]
-                anio = t.fecha_hora_inicio.year
-                hora = t.fecha_hora_inicio.strftime("%H:%M")
+                inicio = datetime.fromisoformat(t["fecha_hora_inicio"])
+                dia = inicio.day
+                mes = meses_es[inicio.month]
+                anio = inicio.year
+                hora = inicio.strftime("%H:%M")
                 
                 fecha_bonita = f"{dia} {mes} {anio}, {hora} hs"
                 
                 # Manejo de errores si se borró el cliente
-                if t.cliente:
-                    nombre_cli = t.cliente.nombre
-                    tel_raw = t.cliente.telefono_whatsapp
+                if t["cliente"]:
+                    nombre_cli = t["cliente"]["nombre"]
+                    tel_raw = t["cliente"]["telefono_whatsapp"]
                     tel_clean = tel_raw.replace("+", "").replace(" ", "")
                     link_wa = f"https://wa.me/{tel_clean}"
                 else:
                     nombre_cli = "Desconocido"
                     link_wa = "#"
 
-                estado_icon = "✅" if t.estado == "confirmado" else ("⏳" if t.estado == "pendiente" else "❌")
+                estado = t["estado"] or ""
+                estado_icon = "✅" if estado == "confirmado" else ("⏳" if estado == "pendiente" else "❌")
                 
                 data.append({
-                    "ID": t.id,
-                    "Fecha_Raw": t.fecha_hora_inicio,
+                    "ID": t["id"],
+                    "Fecha_Raw": inicio,
                     "Fecha": fecha_bonita,
                     "Cliente": nombre_cli,
                     "Contacto": link_wa,
-                    "Servicio": t.servicio.nombre if t.servicio else "N/A",
-                    "Barbero": t.staff.nombre if t.staff else "N/A",
-                    "Estado": f"{estado_icon} {t.estado.capitalize()}",
-                    "Estado_Key": t.estado # Para filtrar fácil
+                    "Servicio": t["servicio"]["nombre"] if t["servicio"] else "N/A",
+                    "Barbero": t["staff"]["nombre"] if t["staff"] else "N/A",
+                    "Estado": f"{estado_icon} {estado.capitalize()}",
+                    "Estado_Key": estado # Para filtrar fácil
                 })
             
+            # Ya viene filtrado y ordenado por fecha desde la API
             df = pd.DataFrame(data)
-            
-            # Filtro de historial
-            df["Fecha_Raw"] = pd.to_datetime(df["Fecha_Raw"])
-            if not ver_historial:
-                hoy = pd.Timestamp.now().normalize()
-                df = df[df["Fecha_Raw"] >= hoy]
-                
-            df = df.sort_values(by="Fecha_Raw", ascending=True)
 
-            # --- MÉTRICAS ---
+            # --- MÉTRICAS (calculadas en la base para todo el rango, no solo esta página) ---
+            params_metricas = {"desde": params["desde"]} if "desde" in params else {}
+            metricas = api.get(f"{API_URL}/metricas/", params=params_metricas).json()["total"]
             with st.container(border=True):
                 col1, col2, col3, col4 = st.columns(4)
-                col1.metric("📅 Turnos", len(df))
-                col2.metric("✂ Servicios", df["Servicio"].nunique())
-                col3.metric("⏳ Pendientes", len(df[df["Estado_Key"]=="pendiente"]))
-                col4.metric("✅ Confirmados", len(df[df["Estado_Key"]=="confirmado"]))
+                col1.metric("📅 Turnos", metricas["turnos"])
+                col2.metric("✂ Servicios", metricas["servicios"])
+                col3.metric("⏳ Pendientes", metricas["pendientes"])
+                col4.metric("✅ Confirmados", metricas["confirmados"])
 
             # --- TABLA ---
             st.write("### 📋 Agenda Detallada")
@@ -168,6 +210,19 @@ if opcion == "Dashboard":
                         "Contacto": st.column_config.LinkColumn("Chat", display_text="💬 WhatsApp"),
                     }
                 )
+
+                # Navegación entre páginas
+                col_prev, col_pag, col_next = st.columns([1, 2, 1])
+                with col_prev:
+                    if len(cursores) > 1 and st.button("⬅ Anterior"):
+                        cursores.pop()
+                        st.rerun()
+                with col_pag:
+                    st.caption(f"Página {len(cursores)}")
+                with col_next:
+                    if pagina["siguiente_cursor"] and st.button("Siguiente ➡"):
+                        cursores.append(pagina["siguiente_cursor"])
+                        st.rerun()
                 
                 # ========================================================
                 # ZONA DE ACCIÓN: CONFIRMAR Y CANCELAR (ARREGLADA)
@@ -186,6 +241,12 @@ if opcion == "Dashboard":
                             fila = df_pendientes[df_pendientes["ID"] == id_turno].iloc[0]
                             return f"{fila['Cliente']} - {fila['Fecha']}"
 
+                        # Por la API (negocio de la API key); la fecha de inicio completa la clave del turno
+                        def cambiar_estado_turno(id_turno, estado):
+                            fila = df_pendientes[df_pendientes["ID"] == id_turno].iloc[0]
+                            return api.patch(f"{API_URL}/turnos/{id_turno}",
+                                             json={"estado": estado, "fecha_hora_inicio": fila["Fecha_Raw"].isoformat()})
+
                         turno_id_to_edit = st.selectbox(
                             "Seleccionar Turno:", 
                             options=df_pendientes["ID"].tolist(),
@@ -198,13 +259,13 @@ if opcion == "Dashboard":
                         st.write("") 
                         # key única y SIN use_container_width
                         if st.button("✅ Confirmar", key="btn_confirm_ok"):
-                            turno_ok = db.query(Turno).filter(Turno.id == turno_id_to_edit).first()
-                            if turno_ok:
-                                turno_ok.estado = "confirmado"
-                                db.commit()
+                            res_ok = cambiar_estado_turno(turno_id_to_edit, "confirmado")
+                            if res_ok.ok:
                                 st.toast("✅ Turno confirmado correctamente")
                                 time.sleep(0.5)
                                 st.rerun()
+                            else:
+                                st.error(f"No se pudo confirmar: {res_ok.json().get('detail', res_ok.text)}")
 
                     # --- BOTÓN CANCELAR (EL FIX DEFINITIVO) ---
                     with col_btn_cancel:
@@ -213,11 +274,9 @@ if opcion == "Dashboard":
                         # key única, SIN use_container_width, type primary para rojo
                         if st.button("❌ Cancelar", type="primary", key="btn_cancel_fix"):
                             st.toast("⏳ Procesando...")
-                            turno_cancel = db.query(Turno).filter(Turno.id == turno_id_to_edit).first()
+                            res_cancel = cambiar_estado_turno(turno_id_to_edit, "cancelado")
                             
-                            if turno_cancel:
-                                turno_cancel.estado = "cancelado"
-                                db.commit()
+                            if res_cancel.ok:
                                 st.warning(f"Turno cancelado.") # Aviso visible
                                 time.sleep(1) # Pausa dramática para leer
                                 st.rerun() # Recarga obligatoria
@@ -233,8 +292,46 @@ if opcion == "Dashboard":
             
     except Exception as e:
         st.error(f"Error cargando turnos: {e}")
-    finally:
-        db.close()
+
+    # 3. Meses viejos que ya no están en la base (archivados en Parquet, ver particiones.py)
+    if ver_historial:
+        with st.expander("🗄 Turnos archivados", expanded=False):
+            cursores_archivo = st.session_state.setdefault('archivo_cursores', [None])
+            params_archivo = {"limite": TURNOS_POR_PAGINA}
+            if cursores_archivo[-1]:
+                params_archivo["cursor"] = cursores_archivo[-1]
+            res = api.get(f"{API_URL}/turnos/archivo", params=params_archivo)
+            if res.status_code == 501:
+                st.info("El servidor no tiene pyarrow instalado: el archivo histórico no está disponible.")
+            elif res.ok:
+                pagina_archivo = res.json()
+                if pagina_archivo["items"]:
+                    st.dataframe(
+                        pd.DataFrame([{
+                            "Fecha": datetime.fromisoformat(t["fecha_hora_inicio"]).strftime("%d/%m/%Y %H:%M"),
+                            "Cliente": t["cliente"]["nombre"] if t["cliente"] else "Desconocido",
+                            "Servicio": t["servicio"]["nombre"] if t["servicio"] else "N/A",
+                            "Barbero": t["staff"]["nombre"] if t["staff"] else "N/A",
+                            "Estado": (t["estado"] or "").capitalize(),
+                        } for t in pagina_archivo["items"]]),
+                        hide_index=True,
+                        use_container_width=True
+                    )
+                    col_prev, col_pag, col_next = st.columns([1, 2, 1])
+                    with col_prev:
+                        if len(cursores_archivo) > 1 and st.button("⬅ Anterior", key="archivo_anterior"):
+                            cursores_archivo.pop()
+                            st.rerun()
+                    with col_pag:
+                        st.caption(f"Página {len(cursores_archivo)}")
+                    with col_next:
+                        if pagina_archivo["siguiente_cursor"] and st.button("Siguiente ➡", key="archivo_siguiente"):
+                            cursores_archivo.append(pagina_archivo["siguiente_cursor"])
+                            st.rerun()
+                else:
+                    st.info("No hay turnos archivados.")
+            else:
+                st.error(f"Error cargando el archivo: {res.text}")
 
 # --- PÁGINA: SERVICIOS ---
 elif opcion == "Servicios":
@@ -252,7 +349,7 @@ elif opcion == "Servicios":
             if st.form_submit_button("Guardar Nuevo"):
                 datos = {"nombre": nombre_nuevo, "precio": precio_nuevo, "duracion_minutos": duracion_nuevo, "activo": True}
                 try:
-                    res = requests.post(f"{API_URL}/servicios/", json=datos)
+                    res = api.post(f"{API_URL}/servicios/", json=datos)
                     if res.status_code == 200:
                         st.success("✅ ¡Creado!")
                         time.sleep(1)
@@ -267,9 +364,8 @@ elif opcion == "Servicios":
     st.subheader("📝 Gestión de Servicios")
     
     try:
-        respuesta = requests.get(f"{API_URL}/servicios/")
-        if respuesta.status_code == 200:
-            lista_servicios = respuesta.json()
+        lista_servicios = get_con_etag(f"{API_URL}/servicios/")
+        if lista_servicios is not None:
             
             if lista_servicios:
                 col_tabla, col_edicion = st.columns([1, 1], gap="large")
@@ -298,12 +394,12 @@ elif opcion == "Servicios":
                                 b1, b2 = st.columns(2)
                                 if b1.form_submit_button("💾 Guardar"):
                                     datos_upd = {"nombre": nuevo_nombre, "precio": nuevo_precio, "duracion_minutos": nueva_duracion}
-                                    requests.put(f"{API_URL}/servicios/{id_seleccionado}", json=datos_upd)
+                                    api.put(f"{API_URL}/servicios/{id_seleccionado}", json=datos_upd)
                                     st.success("Actualizado")
                                     st.rerun()
                                     
                                 if b2.form_submit_button("🗑 Eliminar", type="primary"):
-                                    requests.delete(f"{API_URL}/servicios/{id_seleccionado}")
+                                    api.delete(f"{API_URL}/servicios/{id_seleccionado}")
                                     st.warning("Eliminado")
                                     time.sleep(1)
                                     st.rerun()
@@ -323,9 +419,9 @@ elif opcion == "Staff":
             telefono_staff = col2.text_input("Teléfono")
             
             if st.form_submit_button("Guardar Nuevo"):
-                datos_staff = {"nombre": nombre_staff, "telefono": telefono_staff, "negocio_id": 1, "activo": True}
+                datos_staff = {"nombre": nombre_staff, "telefono": telefono_staff, "activo": True}
                 try:
-                    res = requests.post(f"{API_URL}/staff/", json=datos_staff)
+                    res = api.post(f"{API_URL}/staff/", json=datos_staff)
                     if res.status_code == 200:
                         st.success(f"✅ ¡{nombre_staff} agregado!")
                         st.rerun()
@@ -334,9 +430,8 @@ elif opcion == "Staff":
 
     st.write("---")
     try:
-        respuesta = requests.get(f"{API_URL}/staff/")
-        if respuesta.status_code == 200:
-            staff_list = respuesta.json()
+        staff_list = get_con_etag(f"{API_URL}/staff/")
+        if staff_list is not None:
             if staff_list:
                 col_tabla, col_edicion = st.columns([1, 1], gap="large")
                 
@@ -362,12 +457,12 @@ elif opcion == "Staff":
                                 b1, b2 = st.columns(2)
                                 if b1.form_submit_button("💾 Guardar"):
                                     datos_upd = {"nombre": nuevo_nombre, "telefono": nuevo_telefono}
-                                    requests.put(f"{API_URL}/staff/{id_seleccionado}", json=datos_upd)
+                                    api.put(f"{API_URL}/staff/{id_seleccionado}", json=datos_upd)
                                     st.success("Actualizado")
                                     st.rerun()
                                     
                                 if b2.form_submit_button("🗑 Despedir", type="primary"):
-                                    requests.delete(f"{API_URL}/staff/{id_seleccionado}")
+                                    api.delete(f"{API_URL}/staff/{id_seleccionado}")
                                     st.warning("Eliminado")
                                     time.sleep(1)
                                     st.rerun()
@@ -381,10 +476,23 @@ elif opcion == "Clientes":
     st.subheader("👤 Cartera de Clientes")
     st.write("Aquí puedes ponerle nombre real a los clientes que llegan desde WhatsApp.")
 
+    # Paginación por cursor: la API manda el de la página siguiente en X-Siguiente-Cursor
+    cursores_clientes = st.session_state.setdefault('clientes_cursores', [None])
+    params = {"limite": CLIENTES_POR_PAGINA}
+    if cursores_clientes[-1]:
+        params["cursor"] = cursores_clientes[-1]
+
+    # Búsqueda en el servidor (nombre o teléfono en cualquier formato); sin búsqueda, el listado paginado
+    busqueda = st.text_input("🔎 Buscar por nombre o teléfono", placeholder="Ej: Juan, 0981 123...").strip()
+
     try:
-        respuesta = requests.get(f"{API_URL}/clientes/")
+        if len(busqueda) >= 3:
+            respuesta = api.get(f"{API_URL}/clientes/buscar", params={"q": busqueda})
+        else:
+            respuesta = api.get(f"{API_URL}/clientes/", params=params)
         if respuesta.status_code == 200:
             lista_clientes = respuesta.json()
+            siguiente_cursor = respuesta.headers.get("X-Siguiente-Cursor")
             
             if lista_clientes:
                 col_tabla, col_edicion = st.columns([1, 1], gap="large")
@@ -393,6 +501,18 @@ elif opcion == "Clientes":
                     st.markdown("#### Listado")
                     df = pd.DataFrame(lista_clientes)
                     st.dataframe(df[["id", "nombre", "telefono_whatsapp"]], hide_index=True, height=400)
+
+                    col_prev, col_pag, col_next = st.columns([1, 2, 1])
+                    with col_prev:
+                        if len(busqueda) < 3 and len(cursores_clientes) > 1 and st.button("⬅ Anterior", key="clientes_anterior"):
+                            cursores_clientes.pop()
+                            st.rerun()
+                    with col_pag:
+                        st.caption(f"{len(lista_clientes)} resultados" if len(busqueda) >= 3 else f"Página {len(cursores_clientes)}")
+                    with col_next:
+                        if siguiente_cursor and st.button("Siguiente ➡", key="clientes_siguiente"):
+                            cursores_clientes.append(siguiente_cursor)
+                            st.rerun()
                 
                 with col_edicion:
                     st.markdown("#### Editar Cliente")
@@ -415,13 +535,13 @@ elif opcion == "Clientes":
                                         "telefono_whatsapp": nuevo_telefono,
                                         "email": ""
                                     }
-                                    res = requests.put(f"{API_URL}/clientes/{id_selec}", json=datos)
+                                    res = api.put(f"{API_URL}/clientes/{id_selec}", json=datos)
                                     if res.status_code == 200:
                                         st.success("¡Nombre actualizado!")
                                         st.rerun()
                                     else:
                                         st.error("Error al actualizar.")
             else:
-                st.info("Aún no hay clientes.")
+                st.info("Ningún cliente coincide con la búsqueda." if len(busqueda) >= 3 else "Aún no hay clientes.")
     except Exception as e:
         st.error(f"Error de conexión: {e}")
\ No newline at end of file
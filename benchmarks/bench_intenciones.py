@@ -0,0 +1,57 @@
+"""Costo por mensaje de clasificar intenciones del bot.
+
+Compara el router precompilado (intenciones.clasificar) con la cadena de `in`
+que usaba el webhook antes, sobre un corpus de mensajes reales.
+
+    python benchmarks/bench_intenciones.py [repeticiones]
+"""
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from intenciones import clasificar
+
+CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "mensajes_whatsapp.txt")
+
+# La clasificación anterior del webhook, tal cual (para comparar costo y resultados)
+def clasificar_anterior(texto):
+    texto_usuario = texto.lower().strip()
+    if "-" in texto_usuario and ":" in texto_usuario:
+        return "reserva"
+    elif any(x in texto_usuario for x in ["hola", "buenas", "que tal", "qué tal", "como le va", "mbaeteko", "hi", "inicio"]):
+        return "saludo"
+    elif "1" in texto_usuario or "servicios" in texto_usuario:
+        return "servicios"
+    elif "2" in texto_usuario or "mis reservas" in texto_usuario:
+        return "mis_reservas"
+    return "desconocido"
+
+# Las dos se miden intercaladas, ronda por ronda, y queda la mejor de cada una: así el ruido
+# de la máquina (otro proceso, frecuencia de CPU) les toca a las dos por igual
+def medir(funciones, mensajes, repeticiones, rondas=15):
+    mejores = [float("inf")] * len(funciones)
+    for _ in range(rondas):
+        for i, funcion in enumerate(funciones):
+            segundos = timeit.timeit(lambda: [funcion(m) for m in mensajes], number=repeticiones)
+            mejores[i] = min(mejores[i], segundos)
+    return [s / (repeticiones * len(mensajes)) * 1e9 for s in mejores]
+
+def main():
+    repeticiones = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    with open(CORPUS, encoding="utf-8") as f:
+        mensajes = [linea.rstrip("\n") for linea in f if linea.strip()]
+
+    router, cadena = medir([clasificar, clasificar_anterior], mensajes, repeticiones)
+    print(f"{len(mensajes)} mensajes x {repeticiones} repeticiones")
+    print(f"  router precompilado: {router:8.0f} ns/mensaje")
+    print(f"  cadena de 'in':      {cadena:8.0f} ns/mensaje")
+
+    print("\nMensajes que cambian de intención:")
+    for m in mensajes:
+        antes, ahora = clasificar_anterior(m), clasificar(m).nombre
+        if antes != ahora:
+            print(f"  {m!r:45} {antes:>13} -> {ahora}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,243 @@
+"""Latencia y consultas SQL por operación en los caminos calientes de las reservas.
+
+Prepara una base descartable con datos sintéticos (datos_sinteticos.py) y mide, para cada
+operación, percentiles de latencia y cuántas sentencias SQL ejecuta. Los resultados se pueden
+guardar como línea base y comparar en la corrida siguiente: las regresiones salen marcadas
+(y el proceso termina con código 1, para usarlo en CI).
+
+    python benchmarks/bench_reservas.py                                  # SQLite temporal, escala pequena
+    python benchmarks/bench_reservas.py --escala mediana --guardar base
+    python benchmarks/bench_reservas.py --escala mediana --comparar base
+    python benchmarks/bench_reservas.py --db postgresql://localhost/bench --reiniciar
+
+Con --db postgresql://... se BORRAN y recrean las tablas de esa base (por eso pide --reiniciar).
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+import platform
+from datetime import datetime, date, timedelta
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+LINEAS_BASE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "lineas_base")
+
+# Diferencias que cuentan como regresión al comparar. La mediana es mucho más estable entre
+# corridas que el p95, y en operaciones de décimas de ms el ruido relativo es grande: se exigen las dos cosas.
+UMBRAL_LATENCIA = 0.25      # +25% en p50...
+UMBRAL_LATENCIA_MS = 0.1    # ...y al menos 0.1 ms más
+UMBRAL_CONSULTAS = 0.1      # cualquier consulta de más por operación (en promedio)
+
+# 1. CONTADOR DE SENTENCIAS SQL (motor sync y async)
+class ContadorConsultas:
+    def __init__(self, *engines):
+        self.total = 0
+        from sqlalchemy import event
+        for engine in engines:
+            event.listen(engine, "before_cursor_execute", self._contar)
+
+    def _contar(self, *args):
+        self.total += 1
+
+# 2. MEDICIÓN
+def percentil(valores, p):
+    ordenados = sorted(valores)
+    indice = min(len(ordenados) - 1, max(0, round(p / 100 * len(ordenados)) - 1))
+    return ordenados[indice]
+
+# p50 = la mejor mediana de varias rondas (lo más estable entre corridas); p95/p99 sobre todas las muestras
+def medir(nombre, preparar, ejecutar, contador, repeticiones, calentamiento, rondas):
+    for i in range(calentamiento):
+        ejecutar(preparar(-1 - i))
+    tiempos, consultas, medianas = [], [], []
+    por_ronda = max(1, repeticiones // rondas)
+    for i in range(por_ronda * rondas):
+        args = preparar(i)  # fuera del tiempo medido
+        antes = contador.total
+        inicio = time.perf_counter()
+        ejecutar(args)
+        tiempos.append((time.perf_counter() - inicio) * 1000)
+        consultas.append(contador.total - antes)
+        if len(tiempos) % por_ronda == 0:
+            medianas.append(percentil(tiempos[-por_ronda:], 50))
+    return {
+        "p50_ms": round(min(medianas), 3),
+        "p95_ms": round(percentil(tiempos, 95), 3),
+        "p99_ms": round(percentil(tiempos, 99), 3),
+        "consultas": round(sum(consultas) / len(consultas), 2),
+        "consultas_max": max(consultas),
+    }
+
+# 3. OPERACIONES
+def operaciones(escala, hoy):
+    import crud, schemas, disponibilidad, main
+    from database import SessionLocal
+    from fastapi.testclient import TestClient
+    from datos_sinteticos import telefono_cliente, telefono_negocio
+
+    rnd = random.Random(7)
+    db = SessionLocal()
+    staff_ids = list(range(1, escala.staff_por_negocio + 1))           # barberos del negocio 1
+    futuro = datetime.combine(hoy + timedelta(days=3650), datetime.min.time())  # agenda vacía: sin choques
+
+    def cliente_al_azar():
+        return telefono_cliente(1, rnd.randrange(1, escala.clientes_por_negocio + 1))
+
+    def en_otro_formato(telefono):
+        # El mismo número como lo escribiría alguien en la web: "0981..." en lugar de "+595981..."
+        return "0" + telefono[len("+595"):]
+
+    def horario_en_agenda(_):
+        inicio = datetime.combine(hoy + timedelta(days=rnd.randrange(-20, 10)), datetime.min.time()) \
+            + timedelta(hours=rnd.randrange(8, 19), minutes=rnd.choice([0, 15, 30, 45]))
+        return rnd.choice(staff_ids), inicio, inicio + timedelta(minutes=30)
+
+    def turno_libre(i):
+        # Cada repetición en un horario distinto y vacío (la reserva siempre se concreta)
+        inicio = futuro + timedelta(days=i // 20 + (500 if i < 0 else 0), hours=8, minutes=30 * (i % 20))
+        return schemas.TurnoCreate(
+            negocio_id=1, staff_id=staff_ids[0], servicio_id=1,
+            telefono_cliente=cliente_al_azar(), nombre_cliente="Bench", fecha_hora_inicio=inicio
+        )
+
+    def sin_cache(_):
+        crud.cache_clientes = crud.CacheClientes()
+        return en_otro_formato(cliente_al_azar())
+
+    ops = [
+        ("check_disponibilidad", horario_en_agenda,
+         lambda a: crud.check_disponibilidad(db, *a)),
+        ("obtener_horarios_disponibles", lambda _: (hoy + timedelta(days=rnd.randrange(-20, 10)), rnd.choice(staff_ids)),
+         lambda a: disponibilidad.obtener_horarios_disponibles(db, a[0], a[1], 30)),
+        ("get_or_create_cliente (sin caché)", sin_cache,
+         lambda telefono: crud.get_or_create_cliente(db, telefono, negocio_id=1)),
+        ("get_or_create_cliente (en caché)", lambda _: telefono_cliente(1, 1),
+         lambda telefono: crud.get_or_create_cliente(db, telefono, negocio_id=1)),
+        ("create_turno", turno_libre,
+         lambda turno: crud.create_turno(db, turno)),
+    ]
+
+    # El webhook completo (ASGI en proceso, sin red): tenant, sesión, router, base y bitácora
+    cliente_http = TestClient(main.app)
+    mensajes = {"hola": "hola", "servicios": "1", "mis reservas": "mis reservas"}
+    secuencia = iter(range(10 ** 9))
+
+    def webhook(texto_de):
+        def preparar(i):
+            return {"Body": texto_de(i), "From": f"whatsapp:{cliente_al_azar()}",
+                    "To": f"whatsapp:{telefono_negocio(1)}", "MessageSid": f"SMbench{next(secuencia)}"}
+        def ejecutar(form):
+            cliente_http.post("/webhook/", data=form).raise_for_status()
+        return preparar, ejecutar
+
+    for nombre, texto in mensajes.items():
+        ops.append((f"webhook ({nombre})", *webhook(lambda i, t=texto: t)))
+    reservas = futuro + timedelta(days=2000)
+    ops.append(("webhook (reserva)", *webhook(
+        lambda i: f"1 {(reservas + timedelta(days=i // 20 + (500 if i < 0 else 0))):%Y-%m-%d} "
+                  f"{8 + (i % 20) // 2:02d}:{30 * (i % 2):02d}"
+    )))
+    return ops, cliente_http, db
+
+# 4. LÍNEAS BASE
+def guardar(nombre, resultado):
+    os.makedirs(LINEAS_BASE, exist_ok=True)
+    ruta = os.path.join(LINEAS_BASE, f"{nombre}.json")
+    with open(ruta, "w", encoding="utf-8") as f:
+        json.dump(resultado, f, indent=2, ensure_ascii=False)
+    print(f"\n💾 Línea base guardada en {ruta}")
+
+def comparar(nombre, resultado, umbral=UMBRAL_LATENCIA):
+    ruta = os.path.join(LINEAS_BASE, f"{nombre}.json")
+    with open(ruta, encoding="utf-8") as f:
+        base = json.load(f)
+    if base["meta"]["escala"] != resultado["meta"]["escala"] or base["meta"]["dialecto"] != resultado["meta"]["dialecto"]:
+        print(f"⚠ La línea base es de otra escala/base ({base['meta']['escala']}, {base['meta']['dialecto']})")
+
+    print(f"\nComparación con '{nombre}' ({base['meta']['fecha']}):")
+    print(f"{'operación':36} {'p50 antes':>10} {'p50 ahora':>10} {'Δ':>8} {'p95 Δ':>8} {'consultas':>14}")
+    regresiones = []
+    for op, ahora in resultado["operaciones"].items():
+        antes = base["operaciones"].get(op)
+        if antes is None:
+            print(f"{op:36} {'-':>10} {ahora['p50_ms']:10.3f} {'nuevo':>8}")
+            continue
+        delta = (ahora["p50_ms"] - antes["p50_ms"]) / antes["p50_ms"] if antes["p50_ms"] else 0
+        delta_p95 = (ahora["p95_ms"] - antes["p95_ms"]) / antes["p95_ms"] if antes["p95_ms"] else 0
+        mas_lento = delta > umbral and ahora["p50_ms"] - antes["p50_ms"] > UMBRAL_LATENCIA_MS
+        mas_consultas = ahora["consultas"] - antes["consultas"] > UMBRAL_CONSULTAS
+        marca = ""
+        if mas_lento or mas_consultas:
+            marca = " ▲"
+            regresiones.append(op)
+        print(f"{op:36} {antes['p50_ms']:10.3f} {ahora['p50_ms']:10.3f} {delta:+8.0%} {delta_p95:+8.0%} "
+              f"{antes['consultas']:6.2f} → {ahora['consultas']:<6.2f}{marca}")
+    if regresiones:
+        print(f"\n▲ Regresiones: {', '.join(regresiones)}")
+    return regresiones
+
+# 5. CORRIDA
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--db", help="URL de la base (por defecto un SQLite temporal)")
+    parser.add_argument("--reiniciar", action="store_true", help="Permite borrar y recrear las tablas de --db")
+    parser.add_argument("--escala", default="pequena")
+    parser.add_argument("--repeticiones", type=int, default=200)
+    parser.add_argument("--calentamiento", type=int, default=10)
+    parser.add_argument("--rondas", type=int, default=5)
+    parser.add_argument("--umbral", type=float, default=UMBRAL_LATENCIA, help="Suba del p50 que cuenta como regresión (0.25 = 25%%)")
+    parser.add_argument("--guardar", metavar="NOMBRE", help="Guarda el resultado como línea base")
+    parser.add_argument("--comparar", metavar="NOMBRE", help="Compara contra una línea base guardada")
+    args = parser.parse_args()
+
+    if args.db and not args.db.startswith("sqlite") and not args.reiniciar:
+        sys.exit("❌ Esto borra las tablas de esa base: agregá --reiniciar si es una base descartable.")
+    temporal = None
+    if not args.db:
+        temporal = tempfile.mkdtemp(prefix="bench_barberia_")
+        args.db = f"sqlite:///{os.path.join(temporal, 'bench.db')}"
+    # database.py lee el entorno al importarse: todo lo del proyecto se importa después de esto
+    os.environ["DATABASE_URL"] = args.db
+    os.environ.pop("ASYNC_DATABASE_URL", None)
+    os.environ.setdefault("NEGOCIO_ID_POR_DEFECTO", "1")
+
+    import database
+    from datos_sinteticos import ESCALAS, preparar_base
+    if args.escala not in ESCALAS:
+        sys.exit(f"Escala desconocida: {args.escala} (opciones: {', '.join(ESCALAS)})")
+    escala = ESCALAS[args.escala]
+    hoy = date.today()
+
+    inicio = time.perf_counter()
+    totales = preparar_base(database.engine, escala, hoy)
+    print(f"🌱 Datos: {totales} en {time.perf_counter() - inicio:.1f} s ({database.engine.dialect.name})")
+
+    contador = ContadorConsultas(database.engine, database.async_engine.sync_engine)
+    ops, cliente_http, db = operaciones(escala, hoy)
+    resultado = {
+        "meta": {
+            "escala": args.escala, "dialecto": database.engine.dialect.name, "repeticiones": args.repeticiones,
+            "fecha": datetime.now().isoformat(timespec="seconds"), "python": platform.python_version(),
+        },
+        "operaciones": {},
+    }
+    print(f"\n{'operación':36} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'consultas':>10}")
+    with cliente_http:
+        for nombre, preparar, ejecutar in ops:
+            r = medir(nombre, preparar, ejecutar, contador, args.repeticiones, args.calentamiento, args.rondas)
+            resultado["operaciones"][nombre] = r
+            print(f"{nombre:36} {r['p50_ms']:9.3f} {r['p95_ms']:9.3f} {r['p99_ms']:9.3f} {r['consultas']:10.2f}")
+    db.close()
+
+    regresiones = comparar(args.comparar, resultado, args.umbral) if args.comparar else []
+    if args.guardar:
+        guardar(args.guardar, resultado)
+    sys.exit(1 if regresiones else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,245 @@
+"""Prueba de carga del webhook de WhatsApp: ¿cuántas conversaciones aguanta una instancia?
+
+Reproduce un flujo de POST de Twilio (Body, From, To, MessageSid) contra /webhook/ a una
+tasa objetivo, con una mezcla configurable de saludos, navegación del menú e intentos de
+reserva. Reporta throughput, latencia de cola, tasa de choques de reserva y de errores.
+
+Por defecto corre todo en el proceso y sin red: la API via httpx.ASGITransport y un SQLite
+temporal sembrado con datos_sinteticos.py. Con --url se apunta a un servidor ya levantado.
+
+    python benchmarks/carga_webhook.py --tasa 50 --duracion 20
+    python benchmarks/carga_webhook.py --mezcla saludo=0.2,menu=0.3,reserva=0.5 --guardar-trafico trafico.jsonl
+    python benchmarks/carga_webhook.py --trafico trafico.jsonl --tasa 100
+    python benchmarks/carga_webhook.py --url http://localhost:8000 --numero +14155238886
+
+Carga abierta: los mensajes salen a la hora programada aunque el servidor se atrase, y la
+latencia se mide desde esa hora (no desde que se pudo enviar), así la cola cuenta. Dentro de
+una misma conversación los mensajes van en orden: el cliente espera la respuesta anterior.
+"""
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import tempfile
+from collections import Counter, defaultdict
+from datetime import date, timedelta
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+MEZCLA_POR_DEFECTO = "saludo=0.3,menu=0.4,reserva=0.3"
+
+# 1. TRÁFICO SINTÉTICO
+# Cada conversación sigue un guion de la mezcla; al terminarlo empieza otro.
+def guion(tipo, rnd, servicios, dias_reserva, desde):
+    if tipo == "saludo":
+        return [("saludo", rnd.choice(["hola", "Buenas!", "buen día", "hola, qué tal?"]))]
+    if tipo == "menu":
+        if rnd.random() < 0.3:
+            return [("menu", "hola"), ("menu", "2")]  # mis reservas
+        return [("menu", "hola"), ("menu", "1"), ("menu", str(rnd.choice(servicios)))]
+    # Reserva directa en una ventana chica: varios clientes van por el mismo horario
+    dia = desde + timedelta(days=rnd.randrange(dias_reserva))
+    hora = 8 * 60 + 30 * rnd.randrange(24)
+    return [("reserva", f"{rnd.choice(servicios)} {dia:%Y-%m-%d} {hora // 60:02d}:{hora % 60:02d}")]
+
+def trafico_sintetico(cantidad, conversaciones, mezcla, semilla=1, servicios=(1, 2, 3), dias_reserva=2, desde=None):
+    rnd = random.Random(semilla)
+    desde = desde or date.today() + timedelta(days=1)
+    tipos, pesos = zip(*mezcla.items())
+    pendientes = defaultdict(list)
+    mensajes = []
+    for _ in range(cantidad):
+        c = rnd.randrange(conversaciones)
+        if not pendientes[c]:
+            pendientes[c] = guion(rnd.choices(tipos, pesos)[0], rnd, list(servicios), dias_reserva, desde)
+        tipo, body = pendientes[c].pop(0)
+        mensajes.append({"From": f"whatsapp:+5959800{c:05d}", "Body": body, "tipo": tipo})
+    return mensajes
+
+def leer_mezcla(texto):
+    mezcla = {}
+    for parte in texto.split(","):
+        tipo, peso = parte.split("=")
+        if tipo not in ("saludo", "menu", "reserva"):
+            raise ValueError(f"Tipo desconocido en la mezcla: {tipo}")
+        mezcla[tipo] = float(peso)
+    return mezcla
+
+# Sin "tipo" (ej: exportado de la bitácora) se deduce con el mismo router que usa el bot
+def leer_trafico(ruta):
+    from intenciones import clasificar
+    tipos = {"reserva": "reserva", "horario": "reserva", "saludo": "saludo"}
+    with open(ruta, encoding="utf-8") as f:
+        mensajes = [json.loads(linea) for linea in f if linea.strip()]
+    for m in mensajes:
+        m.setdefault("tipo", tipos.get(clasificar(m["Body"]).nombre, "menu"))
+    return mensajes
+
+def guardar_trafico(ruta, mensajes):
+    with open(ruta, "w", encoding="utf-8") as f:
+        for m in mensajes:
+            f.write(json.dumps(m, ensure_ascii=False) + "\n")
+
+# 2. CLASIFICAR LA RESPUESTA DEL BOT (por el texto del TwiML, ver bot.py)
+def resultado_de(tipo, texto):
+    if "Error interno" in texto:
+        return "error_bot"
+    if tipo != "reserva":
+        return "ok"
+    if "Reserva Confirmada" in texto:
+        return "confirmada"
+    if "ocupado" in texto:
+        return "choque"
+    return "rechazada"  # formato, servicio inexistente...
+
+# 3. DISPARO (carga abierta a tasa fija)
+async def disparar(cliente, mensajes, tasa, numero, max_en_vuelo, timeout):
+    loop = asyncio.get_running_loop()
+    en_vuelo = asyncio.Semaphore(max_en_vuelo)
+    turnos_conversacion = defaultdict(asyncio.Lock)  # FIFO: respeta el orden dentro de cada conversación
+    registros = []
+    corrida = f"{time.time_ns():x}"
+
+    async def enviar(i, m, programado):
+        conversacion = turnos_conversacion[m["From"]]
+        async with conversacion, en_vuelo:
+            datos = {"Body": m["Body"], "From": m["From"], "To": f"whatsapp:{numero}", "MessageSid": f"SMcarga{corrida}{i}"}
+            try:
+                r = await asyncio.wait_for(cliente.post("/webhook/", data=datos), timeout)
+                estado = r.status_code
+                resultado = resultado_de(m.get("tipo"), r.text) if estado == 200 else "error_http"
+            except asyncio.TimeoutError:
+                estado, resultado = None, "timeout"
+            except Exception as e:
+                estado, resultado = None, f"excepcion:{type(e).__name__}"
+        registros.append({
+            "tipo": m["tipo"], "estado": estado, "resultado": resultado,
+            "latencia_ms": (loop.time() - programado) * 1000,
+        })
+
+    inicio = loop.time()
+    tareas = []
+    for i, m in enumerate(mensajes):
+        programado = inicio + i / tasa
+        espera = programado - loop.time()
+        if espera > 0:
+            await asyncio.sleep(espera)
+        tareas.append(asyncio.create_task(enviar(i, m, programado)))
+    await asyncio.gather(*tareas)
+    return registros, loop.time() - inicio
+
+# 4. REPORTE
+def percentil(valores, p):
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, max(0, round(p / 100 * len(ordenados)) - 1))] if ordenados else 0.0
+
+def resumir(registros, segundos, tasa):
+    latencias = [r["latencia_ms"] for r in registros]
+    resultados = Counter(r["resultado"] for r in registros)
+    errores = sum(n for k, n in resultados.items() if k.startswith(("error", "timeout", "excepcion")))
+    reservas = [r for r in registros if r["tipo"] == "reserva" and r["estado"] == 200]
+    choques = sum(1 for r in reservas if r["resultado"] == "choque")
+    resumen = {
+        "mensajes": len(registros),
+        "segundos": round(segundos, 2),
+        "tasa_objetivo": tasa,
+        "throughput": round(len(registros) / segundos, 1) if segundos else 0.0,
+        "latencia_ms": {p: round(percentil(latencias, n), 1) for p, n in (("p50", 50), ("p95", 95), ("p99", 99), ("max", 100))},
+        "tasa_errores": round(errores / len(registros), 4) if registros else 0.0,
+        "reservas": {
+            "intentos": len(reservas),
+            "confirmadas": sum(1 for r in reservas if r["resultado"] == "confirmada"),
+            "choques": choques,
+            "tasa_choques": round(choques / len(reservas), 4) if reservas else 0.0,
+        },
+        "resultados": dict(resultados),
+        "p95_por_tipo_ms": {
+            tipo: round(percentil([r["latencia_ms"] for r in registros if r["tipo"] == tipo], 95), 1)
+            for tipo in sorted({r["tipo"] for r in registros})
+        },
+    }
+    return resumen
+
+def imprimir(resumen):
+    lat = resumen["latencia_ms"]
+    res = resumen["reservas"]
+    print(f"\n📨 {resumen['mensajes']} mensajes en {resumen['segundos']} s")
+    print(f"   throughput: {resumen['throughput']} msg/s (objetivo {resumen['tasa_objetivo']})")
+    print(f"   latencia:   p50 {lat['p50']} ms | p95 {lat['p95']} ms | p99 {lat['p99']} ms | max {lat['max']} ms")
+    print(f"   errores:    {resumen['tasa_errores']:.2%}")
+    print(f"   reservas:   {res['intentos']} intentos, {res['confirmadas']} confirmadas, "
+          f"{res['choques']} choques ({res['tasa_choques']:.1%})")
+    print(f"   p95 por tipo: {resumen['p95_por_tipo_ms']}")
+    print(f"   resultados: {resumen['resultados']}")
+
+# 5. CORRIDA
+async def correr(args, mensajes):
+    import httpx
+    limites = httpx.Limits(max_connections=args.max_en_vuelo)
+    if args.url:
+        async with httpx.AsyncClient(base_url=args.url, limits=limites) as cliente:
+            return await disparar(cliente, mensajes, args.tasa, args.numero, args.max_en_vuelo, args.timeout)
+
+    # En el proceso: arranque/apagado de la app (pool, bitácora...) como en uvicorn
+    import main
+    transporte = httpx.ASGITransport(app=main.app)
+    async with main.app.router.lifespan_context(main.app):
+        async with httpx.AsyncClient(transport=transporte, base_url="http://carga", limits=limites) as cliente:
+            return await disparar(cliente, mensajes, args.tasa, args.numero, args.max_en_vuelo, args.timeout)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tasa", type=float, default=20, help="Mensajes por segundo")
+    parser.add_argument("--duracion", type=float, default=10, help="Segundos de tráfico sintético")
+    parser.add_argument("--conversaciones", type=int, default=200)
+    parser.add_argument("--mezcla", default=MEZCLA_POR_DEFECTO)
+    parser.add_argument("--dias-reserva", type=int, default=2, help="Días en los que se concentran las reservas")
+    parser.add_argument("--trafico", help="JSONL con los mensajes a reproducir (From, Body y opcional tipo)")
+    parser.add_argument("--guardar-trafico", help="Guarda el tráfico generado para repetir la misma corrida")
+    parser.add_argument("--escala", default="pequena", help="Datos sintéticos de la base local")
+    parser.add_argument("--url", help="Servidor ya levantado (por defecto: la app en el proceso)")
+    parser.add_argument("--numero", help="Número de WhatsApp del negocio (campo To)")
+    parser.add_argument("--max-en-vuelo", type=int, default=200, help="Pedidos simultáneos como máximo")
+    parser.add_argument("--timeout", type=float, default=30)
+    parser.add_argument("--salida", help="Guarda el resumen en JSON")
+    parser.add_argument("--semilla", type=int, default=1)
+    args = parser.parse_args()
+
+    if not args.url:
+        # Base local descartable: database.py lee el entorno al importarse
+        temporal = tempfile.mkdtemp(prefix="carga_barberia_")
+        os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(temporal, 'carga.db')}"
+        os.environ.pop("ASYNC_DATABASE_URL", None)
+        os.environ["SESIONES_BACKEND"] = "memoria"
+        import database
+        from datos_sinteticos import ESCALAS, preparar_base, telefono_negocio
+        print(f"🌱 Datos locales: {preparar_base(database.engine, ESCALAS[args.escala])}")
+        args.numero = args.numero or telefono_negocio(1)
+    elif not args.numero:
+        sys.exit("❌ Con --url hace falta --numero (el número de WhatsApp del negocio)")
+
+    if args.trafico:
+        mensajes = leer_trafico(args.trafico)
+    else:
+        mensajes = trafico_sintetico(
+            int(args.tasa * args.duracion), args.conversaciones, leer_mezcla(args.mezcla),
+            semilla=args.semilla, dias_reserva=args.dias_reserva
+        )
+    if args.guardar_trafico:
+        guardar_trafico(args.guardar_trafico, mensajes)
+
+    print(f"🚀 {len(mensajes)} mensajes a {args.tasa} msg/s, {len({m['From'] for m in mensajes})} conversaciones")
+    registros, segundos = asyncio.run(correr(args, mensajes))
+    resumen = resumir(registros, segundos, args.tasa)
+    imprimir(resumen)
+    if args.salida:
+        with open(args.salida, "w", encoding="utf-8") as f:
+            json.dump(resumen, f, indent=2, ensure_ascii=False)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+"""Generador de datos sintéticos para los benchmarks.
+
+Llena una base vacía con N negocios, cada uno con su catálogo, barberos, clientes y una
+agenda de turnos sin solapamientos alrededor de hoy (pasado y futuro). Todo con INSERTs
+en bloque y una semilla fija: la misma escala genera siempre los mismos datos.
+
+    DATABASE_URL=sqlite:///./bench.db python benchmarks/datos_sinteticos.py [escala]
+
+OJO: borra y recrea las tablas de DATABASE_URL. Usar siempre una base descartable.
+"""
+import os
+import sys
+import random
+from dataclasses import dataclass
+from datetime import datetime, date, time, timedelta
+from sqlalchemy import select, func
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+@dataclass
+class Escala:
+    negocios: int
+    staff_por_negocio: int
+    clientes_por_negocio: int
+    turnos_por_staff: int
+
+ESCALAS = {
+    "pequena": Escala(negocios=1, staff_por_negocio=3, clientes_por_negocio=500, turnos_por_staff=300),
+    "mediana": Escala(negocios=5, staff_por_negocio=5, clientes_por_negocio=5000, turnos_por_staff=2000),
+    "grande": Escala(negocios=10, staff_por_negocio=8, clientes_por_negocio=20000, turnos_por_staff=5000),
+}
+
+SERVICIOS = [("Corte Clásico", 30, 50000), ("Barba", 15, 30000), ("Corte + Barba", 45, 70000)]
+APERTURA, CIERRE = time(8, 0), time(20, 0)
+ESTADOS = ["confirmado"] * 7 + ["pendiente"] * 2 + ["cancelado"]
+LOTE_INSERT = 5000
+
+def telefono_cliente(negocio_id, n):
+    return f"+5959{negocio_id:02d}{n:06d}"
+
+def telefono_negocio(negocio_id):
+    return f"+1555{negocio_id:07d}"
+
+def _insertar(conn, tabla, filas):
+    for i in range(0, len(filas), LOTE_INSERT):
+        conn.execute(tabla.insert(), filas[i:i + LOTE_INSERT])
+
+# La agenda de un barbero: días consecutivos desde `desde`, turnos uno detrás de otro
+# (a veces con un hueco) entre APERTURA y CIERRE, hasta completar `cantidad`.
+def _agenda(rnd, desde, cantidad, servicios):
+    dia = desde
+    while cantidad > 0:
+        cursor = datetime.combine(dia, APERTURA)
+        cierre = datetime.combine(dia, CIERRE)
+        while cantidad > 0:
+            cursor += timedelta(minutes=rnd.choice([0, 0, 0, 15, 30]))
+            servicio_id, duracion = rnd.choice(servicios)
+            fin = cursor + timedelta(minutes=duracion)
+            if fin > cierre:
+                break
+            yield servicio_id, cursor, fin
+            cursor = fin
+            cantidad -= 1
+        dia += timedelta(days=1)
+
+def generar(engine, escala: Escala, hoy: date = None, semilla: int = 42):
+    import models
+    import particiones
+
+    rnd = random.Random(semilla)
+    hoy = hoy or date.today()
+    totales = {"negocios": 0, "staff": 0, "clientes": 0, "turnos": 0}
+    with engine.begin() as conn:
+        for n in range(1, escala.negocios + 1):
+            negocio_id = conn.execute(models.Negocio.__table__.insert().values(
+                nombre=f"Barbería {n}", telefono_whatsapp=telefono_negocio(n), activo=True
+            ).returning(models.Negocio.id)).scalar()
+
+            servicios = []
+            for nombre, duracion, precio in SERVICIOS:
+                servicio_id = conn.execute(models.Servicio.__table__.insert().values(
+                    negocio_id=negocio_id, nombre=nombre, duracion_minutos=duracion, precio=precio, activo=True
+                ).returning(models.Servicio.id)).scalar()
+                servicios.append((servicio_id, duracion))
+
+            staff_ids = [conn.execute(models.Staff.__table__.insert().values(
+                negocio_id=negocio_id, nombre=f"Barbero {s}", telefono=f"+5959910{s:05d}", activo=True
+            ).returning(models.Staff.id)).scalar() for s in range(1, escala.staff_por_negocio + 1)]
+
+            _insertar(conn, models.Cliente.__table__, [
+                {"negocio_id": negocio_id, "nombre": f"Cliente {c}", "telefono_whatsapp": telefono_cliente(n, c),
+                 "telefono_normalizado": telefono_cliente(n, c), "fecha_registro": datetime(2024, 1, 1)}
+                for c in range(1, escala.clientes_por_negocio + 1)
+            ])
+            primer_cliente = conn.execute(select(func.min(models.Cliente.id)).where(
+                models.Cliente.negocio_id == negocio_id
+            )).scalar()
+
+            # Dos tercios de la agenda en el pasado, un tercio por delante
+            dias_atras = escala.turnos_por_staff * 2 // (3 * 14) + 1
+            turnos = []
+            for staff_id in staff_ids:
+                for servicio_id, inicio, fin in _agenda(rnd, hoy - timedelta(days=dias_atras), escala.turnos_por_staff, servicios):
+                    turnos.append({
+                        "negocio_id": negocio_id, "staff_id": staff_id, "servicio_id": servicio_id,
+                        "cliente_id": primer_cliente + rnd.randrange(escala.clientes_por_negocio),
+                        "fecha_hora_inicio": inicio, "fecha_hora_fin": fin,
+                        "estado": rnd.choice(ESTADOS), "origen": "bot_whatsapp", "created_at": inicio,
+                    })
+            # En Postgres particionado, cada mes de la agenda en su partición (no en la DEFAULT)
+            if particiones.es_particionada(conn):
+                for mes in sorted({particiones.inicio_mes(t["fecha_hora_inicio"]) for t in turnos}):
+                    particiones.crear_particion(conn, mes)
+            _insertar(conn, models.Turno.__table__, turnos)
+
+            totales["negocios"] += 1
+            totales["staff"] += len(staff_ids)
+            totales["clientes"] += escala.clientes_por_negocio
+            totales["turnos"] += len(turnos)
+    return totales
+
+# Crea las tablas desde cero (¡borra las que haya!) y las llena
+def preparar_base(engine, escala: Escala, hoy: date = None, semilla: int = 42):
+    from database import Base
+    import init_db
+
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    init_db.asegurar_indices_y_restricciones()
+    return generar(engine, escala, hoy, semilla)
+
+if __name__ == "__main__":
+    nombre = sys.argv[1] if len(sys.argv) > 1 else "pequena"
+    if nombre not in ESCALAS:
+        sys.exit(f"Escala desconocida: {nombre} (opciones: {', '.join(ESCALAS)})")
+    from database import engine
+    print(f"✅ {preparar_base(engine, ESCALAS[nombre])}")
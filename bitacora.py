@@ -0,0 +1,117 @@
+import os
+import asyncio
+import datetime
+from sqlalchemy import insert
+from database import AsyncSessionLocal
+import models
+
+# --- BITÁCORA DE WHATSAPP (write-behind) ---
+# El webhook no escribe en whatsapp_logs: deja el registro en una cola en memoria y
+# responde. Una tarea de fondo junta los registros y los guarda con un solo INSERT
+# por lote, cuando se llena el lote o pasa el intervalo, lo que ocurra primero.
+WHATSAPP_LOG_LOTE = int(os.getenv("WHATSAPP_LOG_LOTE", "100"))
+WHATSAPP_LOG_INTERVALO_S = float(os.getenv("WHATSAPP_LOG_INTERVALO_S", "2"))
+WHATSAPP_LOG_MAX_COLA = int(os.getenv("WHATSAPP_LOG_MAX_COLA", "10000"))
+# Reintentos de un lote si la base falla (ej: Neon despertando)
+WHATSAPP_LOG_REINTENTOS = 3
+
+class BitacoraWhatsApp:
+    def __init__(self, lote=WHATSAPP_LOG_LOTE, intervalo=WHATSAPP_LOG_INTERVALO_S, max_cola=WHATSAPP_LOG_MAX_COLA):
+        self.lote = lote
+        self.intervalo = intervalo
+        self.max_cola = max_cola
+        self._cola = asyncio.Queue(maxsize=max_cola)
+        self._tarea = None
+        self.guardados = 0
+        self.descartados = 0
+
+    # 1. Encolar (no bloquea ni toca la base)
+    def registrar(self, negocio_id, telefono, recibido, enviado, error=None):
+        fila = {
+            "negocio_id": negocio_id,
+            "cliente_telefono": telefono,
+            "mensaje_recibido": recibido,
+            "mensaje_enviado": enviado,
+            "error_log": error,
+            # La hora es la del mensaje, no la del momento en que se guarda el lote
+            "fecha": datetime.datetime.utcnow(),
+        }
+        try:
+            self._cola.put_nowait(fila)
+        except asyncio.QueueFull:
+            # Preferimos perder una línea de auditoría antes que frenar al webhook
+            self.descartados += 1
+
+    # 2. Juntar un lote: espera el primer registro y después completa hasta el tope o el intervalo.
+    # Devuelve (filas, seguir); None en la cola es la marca de cierre.
+    async def _juntar_lote(self):
+        primera = await self._cola.get()
+        if primera is None:
+            return [], False
+        filas = [primera]
+        limite = asyncio.get_running_loop().time() + self.intervalo
+        while len(filas) < self.lote:
+            restante = limite - asyncio.get_running_loop().time()
+            if restante <= 0:
+                break
+            try:
+                fila = await asyncio.wait_for(self._cola.get(), restante)
+            except asyncio.TimeoutError:
+                break
+            if fila is None:
+                return filas, False
+            filas.append(fila)
+        return filas, True
+
+    # 3. Guardar un lote en una sola sentencia (executemany)
+    async def _guardar(self, filas):
+        for intento in range(1, WHATSAPP_LOG_REINTENTOS + 1):
+            try:
+                async with AsyncSessionLocal() as db:
+                    await db.execute(insert(models.WhatsAppLog), filas)
+                    await db.commit()
+                self.guardados += len(filas)
+                return
+            except Exception as e:
+                if intento == WHATSAPP_LOG_REINTENTOS:
+                    self.descartados += len(filas)
+                    print(f"❌ Bitácora WhatsApp: se perdieron {len(filas)} registros: {e}")
+                    return
+                await asyncio.sleep(0.5 * intento)
+
+    async def _bucle(self):
+        seguir = True
+        while seguir:
+            filas, seguir = await self._juntar_lote()
+            if filas:
+                await self._guardar(filas)
+
+    # 4. Ciclo de vida: arrancar con la API y vaciar la cola al apagarla
+    def iniciar(self):
+        if self._tarea is None:
+            # La cola queda atada al event loop que la esperó: cada arranque usa una nueva
+            # (la app puede arrancar más de una vez en el mismo proceso, ej. en las pruebas)
+            anterior, self._cola = self._cola, asyncio.Queue(maxsize=self.max_cola)
+            while not anterior.empty():
+                self._cola.put_nowait(anterior.get_nowait())
+            self._tarea = asyncio.create_task(self._bucle())
+
+    async def detener(self):
+        if self._tarea is not None:
+            # La marca de cierre va al final: el bucle guarda todo lo anterior y termina solo
+            await self._cola.put(None)
+            await self._tarea
+            self._tarea = None
+        # Lo que llegó después de la marca (o si nunca se inició) se guarda acá
+        filas = []
+        while not self._cola.empty():
+            fila = self._cola.get_nowait()
+            if fila is not None:
+                filas.append(fila)
+        for i in range(0, len(filas), self.lote):
+            await self._guardar(filas[i:i + self.lote])
+
+    def estadisticas(self):
+        return {"en_cola": self._cola.qsize(), "guardados": self.guardados, "descartados": self.descartados}
+
+bitacora = BitacoraWhatsApp()
@@ -0,0 +1,222 @@
+from datetime import datetime, timedelta
+from sqlalchemy.ext.asyncio import AsyncSession
+import schemas, crud, disponibilidad, catalogo, sesiones
+from intenciones import Router, DESCONOCIDO
+
+# --- BOT DE WHATSAPP: un manejador por intención (ver intenciones.py) ---
+
+# Horarios alternativos que ofrece el bot cuando el pedido está ocupado
+MAX_ALTERNATIVAS = 3
+
+router = Router()
+
+# Lo que comparten los manejadores durante un mensaje
+class Contexto:
+    def __init__(self, db: AsyncSession, telefono: str, cliente, sesion, texto: str, negocio_id: int = 1):
+        self.db = db
+        self.telefono = telefono
+        self.cliente = cliente  # ClienteRef(id, nombre)
+        self.sesion = sesion
+        self.texto = texto
+        self.negocio_id = negocio_id
+        self.error_log = None
+
+# Punto de entrada: devuelve (respuesta, error_log)
+async def responder_mensaje(db: AsyncSession, Body: str, telefono: str, negocio_id: int = 1):
+    # Todo el acceso a datos es asíncrono: mientras esperamos a la base, el event loop atiende otros mensajes
+    # Un mismo teléfono puede hablar con dos barberías: la sesión es por negocio
+    clave_sesion = f"{negocio_id}:{telefono}"
+    # El cliente sale de la caché en cada mensaje (casi nunca consulta), no de la sesión: si lo
+    # renombran o le cambian el teléfono desde el panel, la próxima respuesta ya lo ve
+    cliente = await crud.resolver_cliente_async(db, telefono, negocio_id=negocio_id)
+    sesion = await sesiones.almacen.obtener(clave_sesion)
+    if sesion is None or sesion.cliente_id != cliente.id:
+        # Primer mensaje de la conversación (o el número ahora es de otro cliente)
+        sesion = sesiones.Sesion(cliente.id)
+    ctx = Contexto(db, telefono, cliente, sesion, Body, negocio_id)
+    respuesta = await router.despachar(ctx, Body)
+    await sesiones.almacen.guardar(clave_sesion, sesion)
+    return respuesta, ctx.error_log
+
+# Duración del servicio: de la última lista mostrada (sin consultas) o del catálogo
+async def duracion_servicio(ctx: Contexto, servicio_id: int):
+    if servicio_id in ctx.sesion.servicios:
+        return ctx.sesion.servicios[servicio_id][1]
+    servicios, _ = await catalogo.servicios.obtener_async(ctx.db, ctx.negocio_id)
+    servicio = next((s for s in servicios if s.id == servicio_id), None)
+    if servicio is None:
+        raise Exception("Servicio no encontrado")
+    return servicio.duracion_minutos
+
+# Reserva el primer barbero libre a esa hora, o deja ofrecidas las alternativas en la sesión
+async def reservar_horario(ctx: Contexto, servicio_id_elegido: int, fecha_obj: datetime):
+    db = ctx.db
+    duracion = await duracion_servicio(ctx, servicio_id_elegido)
+
+    # Antes de buscar: un pedido que ya pasó o fuera del horario de atención no es "ocupado"
+    desde, motivo = fecha_obj, None
+    ahora = datetime.now()
+    if fecha_obj < ahora:
+        desde, motivo = disponibilidad.proximo_bloque(ahora), "❌ Esa fecha ya pasó."
+    elif not disponibilidad.dentro_del_horario(fecha_obj, duracion):
+        motivo = f"❌ Ese horario está fuera de nuestro horario de atención " \
+                 f"({disponibilidad.HORA_APERTURA:%H:%M} a {disponibilidad.HORA_CIERRE:%H:%M})."
+
+    # Buscamos el primer horario libre desde el pedido con CUALQUIER barbero activo
+    barberos, _ = await catalogo.staff.obtener_async(db, ctx.negocio_id)
+    nombres_staff = {b.id: b.nombre for b in barberos}
+    # El motor de disponibilidad es síncrono: run_sync lo ejecuta sobre la conexión async
+    opciones = await db.run_sync(
+        disponibilidad.primeros_turnos_libres,
+        list(nombres_staff), desde, duracion, cantidad=MAX_ALTERNATIVAS + 1
+    )
+
+    resultado = None
+    if motivo is None and opciones and opciones[0][0] == fecha_obj:
+        # Alguien está libre justo a esa hora: reservamos con él
+        turno_nuevo = schemas.TurnoCreate(
+            negocio_id=ctx.negocio_id,
+            staff_id=opciones[0][1],
+            servicio_id=servicio_id_elegido,
+            telefono_cliente=ctx.telefono,
+            nombre_cliente=ctx.cliente.nombre,
+            fecha_hora_inicio=fecha_obj
+        )
+        resultado = await crud.create_turno_async(db, turno_nuevo)
+        opciones = opciones[1:]
+
+    if resultado:
+        ctx.sesion.reiniciar()
+        # Obtenemos los nombres reales para la respuesta
+        nom_servicio = resultado.servicio.nombre
+        nom_barbero = resultado.staff.nombre # <--- ¡AQUÍ RESCATAMOS AL BARBERO! 💈
+
+        return f"✅ *¡Reserva Confirmada!*\n\n" \
+               f"🗓 {fecha_obj.strftime('%Y-%m-%d %H:%M')}\n" \
+               f"✂ {nom_servicio}\n" \
+               f"💈 Profesional: {nom_barbero}\n\n" \
+               f"Te esperamos."
+
+    motivo = motivo or "❌ Ese horario ya está ocupado."
+    # Guardamos lo ofrecido: la próxima respuesta puede ser sólo el número de la opción
+    ctx.sesion.paso = sesiones.ELIGIENDO_HORARIO
+    ctx.sesion.servicio_id = servicio_id_elegido
+    ctx.sesion.opciones = opciones[:MAX_ALTERNATIVAS]
+    if opciones:
+        # Ofrecemos las alternativas más cercanas en la misma respuesta
+        lista_texto = ""
+        for n, (inicio, s_id) in enumerate(ctx.sesion.opciones, start=1):
+            lista_texto += f"{n}. *{servicio_id_elegido} {inicio.strftime('%Y-%m-%d %H:%M')}* con {nombres_staff[s_id]}\n"
+        return f"{motivo}\n\n" \
+               f"🕐 *Horarios libres más cercanos:*\n{lista_texto}\n" \
+               f"Para reservar, responde con el número de la opción o envíala tal cual."
+    return f"{motivo} Por favor elige otro."
+
+# 1. RESERVA: "ID FECHA HORA" (funciona desde cualquier paso)
+@router.manejador("reserva")
+async def reservar(ctx: Contexto, datos):
+    try:
+        fecha_obj = datetime.strptime(f"{datos['fecha']} {datos['hora']}", "%Y-%m-%d %H:%M")
+        return await reservar_horario(ctx, int(datos["servicio_id"]), fecha_obj)
+    except ValueError:
+        # Ej: 2026-02-30 tiene el formato pero no es una fecha válida
+        return await formato_incorrecto(ctx, datos)
+    except Exception as e:
+        ctx.error_log = repr(e)
+        return f"⚠ Error interno: {str(e)}"
+
+# 1b. Sólo la hora (o fecha y hora) para el servicio que ya eligió
+@router.manejador("horario")
+async def reservar_con_sesion(ctx: Contexto, datos):
+    if ctx.sesion.servicio_id is None:
+        return "⚠ Primero elige un servicio: envía *1* para ver la lista."
+    try:
+        hora = datetime.strptime(datos["hora_sola"], "%H:%M").time()
+        if datos["fecha_sola"]:
+            fecha_obj = datetime.combine(datetime.strptime(datos["fecha_sola"], "%Y-%m-%d").date(), hora)
+        else:
+            # Sólo la hora: hoy si todavía no pasó, si no mañana
+            ahora = datetime.now()
+            fecha_obj = datetime.combine(ahora.date(), hora)
+            if fecha_obj <= ahora:
+                fecha_obj += timedelta(days=1)
+        return await reservar_horario(ctx, ctx.sesion.servicio_id, fecha_obj)
+    except ValueError:
+        return await formato_incorrecto(ctx, datos)
+    except Exception as e:
+        ctx.error_log = repr(e)
+        return f"⚠ Error interno: {str(e)}"
+
+# 1c. Un número solo: su significado depende de en qué paso está la conversación
+@router.manejador("opcion")
+async def elegir_opcion(ctx: Contexto, datos):
+    sesion = ctx.sesion
+    numero = int(datos["numero"])
+
+    if sesion.paso == sesiones.ELIGIENDO_HORARIO and 1 <= numero <= len(sesion.opciones):
+        try:
+            return await reservar_horario(ctx, sesion.servicio_id, sesion.opciones[numero - 1][0])
+        except Exception as e:
+            ctx.error_log = repr(e)
+            return f"⚠ Error interno: {str(e)}"
+
+    if sesion.paso == sesiones.ELIGIENDO_SERVICIO and numero in sesion.servicios:
+        sesion.paso = sesiones.ELIGIENDO_HORARIO
+        sesion.servicio_id = numero
+        sesion.opciones = []
+        return f"✂ *{sesion.servicios[numero][0]}*\n\n" \
+               f"📅 ¿Para cuándo? Envía la fecha y hora (*2026-02-28 10:00*) " \
+               f"o sólo la hora (*10:00*) para el próximo horario."
+
+    # Fuera de un paso: es el menú principal
+    if numero == 1:
+        return await listar_servicios(ctx, datos)
+    if numero == 2:
+        return await mis_reservas(ctx, datos)
+    return await no_entendido(ctx, datos)
+
+# 2. Parece un intento de reserva pero no respeta el formato
+@router.manejador("reserva_invalida")
+async def formato_incorrecto(ctx: Contexto, datos):
+    return "⚠ *Formato incorrecto.*\nPara reservar envía: ID FECHA HORA\nEjemplo: 1 2026-02-28 10:00"
+
+# 3. MENÚ: Saludo
+@router.manejador("saludo")
+async def saludar(ctx: Contexto, datos):
+    ctx.sesion.reiniciar()
+    return f"¡Hola {ctx.cliente.nombre}! 👋 Bienvenido.\n" \
+           f"1️⃣ Ver Servicios\n" \
+           f"2️⃣ Mis Reservas"
+
+# 4. MENÚ: Servicios
+@router.manejador("servicios")
+async def listar_servicios(ctx: Contexto, datos):
+    servicios, _ = await catalogo.servicios.obtener_async(ctx.db, ctx.negocio_id)
+    lista_texto = ""
+    for s in servicios:
+        lista_texto += f"[{s.id}] *{s.nombre}*: {int(s.precio)} Gs ({s.duracion_minutos} min)\n"
+
+    # La lista queda en la sesión: el próximo número se resuelve sin volver al catálogo
+    ctx.sesion.reiniciar()
+    ctx.sesion.paso = sesiones.ELIGIENDO_SERVICIO
+    ctx.sesion.servicios = {s.id: (s.nombre, s.duracion_minutos) for s in servicios}
+    return f"✂ *NUESTROS SERVICIOS*\n\n{lista_texto}\n" \
+           f"📢 *Envía el número del servicio*, o el número y la fecha para reservar directo.\n" \
+           f"Ejemplo: *1 2026-02-28 10:00*"
+
+# 5. MENÚ: Mis Reservas
+@router.manejador("mis_reservas")
+async def mis_reservas(ctx: Contexto, datos):
+    turnos_cliente = await crud.get_turnos_confirmados_cliente_async(ctx.db, ctx.cliente.id)
+
+    if not turnos_cliente:
+        return "📂 No tienes reservas pendientes."
+    respuesta = "📂 *Tus Reservas Futuras:*\n"
+    for t in turnos_cliente:
+        respuesta += f"- {t.fecha_hora_inicio.strftime('%d/%m %H:%M')} ({t.servicio.nombre})\n"
+    return respuesta
+
+# 6. Cualquier otra cosa: puede ser una charla con el barbero, respondemos sutil
+@router.manejador(DESCONOCIDO)
+async def no_entendido(ctx: Contexto, datos):
+    return "🤖 Soy el asistente virtual. Para reservar usa el menú di 'Hola'.\nSi estás hablando con el barbero, espera un momento y te responderá."
@@ -0,0 +1,66 @@
+import os
+import json
+import time
+import hashlib
+import threading
+from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+import models, schemas
+
+# --- CACHÉ DEL CATÁLOGO (servicios y staff por negocio) ---
+# Estas tablas cambian pocas veces al mes: las guardamos en memoria y las invalidamos
+# desde los endpoints que las modifican. El TTL cubre a los otros procesos
+# (otros workers, la web de reservas) que no se enteran de la invalidación.
+CATALOGO_TTL_SEGUNDOS = int(os.getenv("CATALOGO_TTL_SEGUNDOS", "300"))
+
+class CacheCatalogo:
+    def __init__(self, modelo, esquema, ttl=CATALOGO_TTL_SEGUNDOS):
+        self.modelo = modelo
+        self.esquema = esquema
+        self.ttl = ttl
+        self._entradas = {}  # negocio_id -> (items, etag, expira)
+        self._versiones = {} # negocio_id -> contador de invalidaciones
+        self._lock = threading.Lock()
+
+    def _cargar(self, db: Session, negocio_id: int):
+        with self._lock:
+            version = self._versiones.get(negocio_id, 0)
+        filas = db.query(self.modelo).filter(
+            self.modelo.negocio_id == negocio_id,
+            self.modelo.activo == True
+        ).order_by(self.modelo.id).all()
+        items = [self.esquema.model_validate(f) for f in filas]
+        # El ETag es un hash del contenido: mismo catálogo => mismo ETag, aunque se recargue
+        cuerpo = json.dumps([i.model_dump(mode="json") for i in items], sort_keys=True)
+        etag = '"' + hashlib.sha1(cuerpo.encode()).hexdigest() + '"'
+        with self._lock:
+            # Si alguien invalidó mientras leíamos, no guardamos datos que pueden estar viejos
+            if self._versiones.get(negocio_id, 0) == version:
+                self._entradas[negocio_id] = (items, etag, time.monotonic() + self.ttl)
+        return items, etag
+
+    def _vigente(self, negocio_id: int):
+        with self._lock:
+            entrada = self._entradas.get(negocio_id)
+        if entrada and entrada[2] > time.monotonic():
+            return entrada[0], entrada[1]
+        return None
+
+    def obtener(self, db: Session, negocio_id: int):
+        return self._vigente(negocio_id) or self._cargar(db, negocio_id)
+
+    async def obtener_async(self, db: AsyncSession, negocio_id: int):
+        vigente = self._vigente(negocio_id)
+        if vigente:
+            return vigente
+        return await db.run_sync(self._cargar, negocio_id)
+
+    def invalidar(self, negocio_id=None):
+        with self._lock:
+            negocios = set(self._entradas) | set(self._versiones) if negocio_id is None else [negocio_id]
+            for n in negocios:
+                self._entradas.pop(n, None)
+                self._versiones[n] = self._versiones.get(n, 0) + 1
+
+servicios = CacheCatalogo(models.Servicio, schemas.Servicio)
+staff = CacheCatalogo(models.Staff, schemas.Staff)
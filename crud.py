@@ -1,28 +1,128 @@
-from sqlalchemy.orm import Session
-from sqlalchemy import and_
-from datetime import timedelta
+from sqlalchemy.orm import Session, selectinload, joinedload
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import and_, or_, select, func, distinct, tuple_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from collections import OrderedDict, namedtuple
+from datetime import datetime, timedelta
+import os
+import base64
+import bisect
+import threading
 import models, schemas
+from disponibilidad import unir_intervalos
+from telefonos import normalizar_telefono, prefijo_telefono
+from recurrencia import choca_con_series, ocupados_series, choques_serie_nueva
 
 # 1. FUNCIÓN AUXILIAR: BUSCAR O CREAR CLIENTE
+# Corre en cada mensaje de WhatsApp, así que va en tres escalones:
+# El teléfono se normaliza primero (telefonos.py): "0981..." y "+595981..." son el mismo cliente.
+#   a) caché LRU en memoria teléfono normalizado -> (id, nombre): el cliente que vuelve no toca la base
+#   b) SELECT por el índice único (negocio_id, telefono_normalizado)
+#   c) INSERT ... ON CONFLICT DO NOTHING RETURNING: si dos mensajes llegan a la vez, solo uno inserta
+ClienteRef = namedtuple("ClienteRef", ["id", "nombre"])
+
+CLIENTES_CACHE_MAX = int(os.getenv("CLIENTES_CACHE_MAX", "10000"))
+
+class CacheClientes:
+    def __init__(self, capacidad=CLIENTES_CACHE_MAX):
+        self.capacidad = capacidad
+        self._datos = OrderedDict()  # (negocio_id, telefono_normalizado) -> ClienteRef
+        self._claves_por_id = {}     # cliente_id -> (negocio_id, telefono_normalizado), para invalidar
+        self._lock = threading.Lock()
+
+    def obtener(self, negocio_id, telefono):
+        clave = (negocio_id, telefono)
+        with self._lock:
+            ref = self._datos.get(clave)
+            if ref is not None:
+                self._datos.move_to_end(clave)
+            return ref
+
+    def guardar(self, negocio_id, telefono, ref):
+        clave = (negocio_id, telefono)
+        with self._lock:
+            self._datos[clave] = ref
+            self._datos.move_to_end(clave)
+            self._claves_por_id[ref.id] = clave
+            while len(self._datos) > self.capacidad:
+                _, viejo = self._datos.popitem(last=False)
+                self._claves_por_id.pop(viejo.id, None)
+
+    def invalidar(self, cliente_id):
+        with self._lock:
+            clave = self._claves_por_id.pop(cliente_id, None)
+            if clave:
+                self._datos.pop(clave, None)
+
+    # Al cambiar un teléfono: lo que hubiera quedado guardado bajo ese número ya no vale
+    def invalidar_telefono(self, negocio_id, telefono):
+        with self._lock:
+            ref = self._datos.pop((negocio_id, telefono), None)
+            if ref is not None and self._claves_por_id.get(ref.id) == (negocio_id, telefono):
+                del self._claves_por_id[ref.id]
+
+cache_clientes = CacheClientes()
+
+def _select_cliente(normalizado, negocio_id):
+    return select(models.Cliente.id, models.Cliente.nombre).filter(
+        models.Cliente.negocio_id == negocio_id,
+        models.Cliente.telefono_normalizado == normalizado
+    ).limit(1)
+
+def _upsert_cliente(dialecto, telefono, normalizado, nombre, negocio_id):
+    insert = pg_insert if dialecto == "postgresql" else sqlite_insert
+    return insert(models.Cliente).values(
+        telefono_whatsapp=telefono,
+        telefono_normalizado=normalizado,
+        nombre=nombre,
+        negocio_id=negocio_id
+    ).on_conflict_do_nothing(
+        index_elements=["negocio_id", "telefono_normalizado"]
+    ).returning(models.Cliente.id, models.Cliente.nombre)
+
+def resolver_cliente(db: Session, telefono: str, nombre: str = "Estimado Cliente", negocio_id: int = 1):
+    normalizado = normalizar_telefono(telefono)
+    ref = cache_clientes.obtener(negocio_id, normalizado)
+    if ref:
+        return ref
+
+    fila = db.execute(_select_cliente(normalizado, negocio_id)).first()
+    if fila is None:
+        fila = db.execute(_upsert_cliente(db.get_bind().dialect.name, telefono, normalizado, nombre, negocio_id)).first()
+        db.commit()
+        if fila is None:
+            # Otro proceso lo insertó entre nuestro SELECT y el INSERT: lo leemos
+            fila = db.execute(_select_cliente(normalizado, negocio_id)).first()
+
+    ref = ClienteRef(fila.id, fila.nombre)
+    cache_clientes.guardar(negocio_id, normalizado, ref)
+    return ref
+
 # Si el cliente ya existe por su teléfono, lo devuelve. Si no, lo crea.
 def get_or_create_cliente(db: Session, telefono: str, nombre: str = "Estimado Cliente", negocio_id: int = 1):
-    cliente = db.query(models.Cliente).filter(
-        models.Cliente.telefono_whatsapp == telefono,
-        models.Cliente.negocio_id == negocio_id
-    ).first()
-    
-    if cliente:
-        return cliente
+    ref = resolver_cliente(db, telefono, nombre, negocio_id)
+    return db.get(models.Cliente, ref.id)
+
+# 1b. BÚSQUEDA DE CLIENTES (typeahead del panel)
+# Si parece un número: prefijo del teléfono normalizado (rango sobre el índice único) o parte de
+# los dígitos. Si no: parte del nombre. En Postgres los "contiene" usan los índices de trigramas.
+def buscar_clientes(db: Session, negocio_id: int, q: str, limite: int = 20):
+    q = q.strip()
+    consulta = db.query(models.Cliente).filter(models.Cliente.negocio_id == negocio_id)
+    prefijo = prefijo_telefono(q)
+    if prefijo:
+        digitos = "".join(c for c in q if c.isdigit()).lstrip("0")
+        siguiente = prefijo[:-1] + chr(ord(prefijo[-1]) + 1)
+        consulta = consulta.filter(or_(
+            and_(models.Cliente.telefono_normalizado >= prefijo, models.Cliente.telefono_normalizado < siguiente),
+            models.Cliente.telefono_normalizado.contains(digitos, autoescape=True)
+        ))
     else:
-        nuevo_cliente = models.Cliente(
-            telefono_whatsapp=telefono,
-            nombre=nombre,
-            negocio_id=negocio_id
-        )
-        db.add(nuevo_cliente)
-        db.commit()
-        db.refresh(nuevo_cliente)
-        return nuevo_cliente
+        consulta = consulta.filter(models.Cliente.nombre.icontains(q, autoescape=True))
+    return consulta.order_by(models.Cliente.nombre, models.Cliente.id).limit(limite).all()
 
 # 2. EL ALGORITMO DE DISPONIBILIDAD (Matemática pura)
 def check_disponibilidad(db: Session, staff_id: int, inicio, fin):
@@ -30,15 +130,19 @@ def check_disponibilidad(db: Session, staff_id: int, inicio, fin):
     # Lógica: Un turno choca si empieza antes de que el nuevo termine Y termina después de que el nuevo empiece.
     choque = db.query(models.Turno).filter(
         models.Turno.staff_id == staff_id,
-        models.Turno.estado.in_(['pendiente', 'confirmado']), # Ignoramos los cancelados
-        and_(
-            models.Turno.fecha_hora_inicio < fin,
-            models.Turno.fecha_hora_fin > inicio
-        )
+        models.Turno.estado.in_(models.ESTADOS_ACTIVOS), # Ignoramos los cancelados
+        models.turnos_que_solapan(inicio, fin)
     ).first()
     
     # Si choque existe, NO está disponible (False). Si es None, SÍ está disponible (True)
-    return choque is None
+    # Las series recurrentes no son filas de turnos: las revisamos aparte
+    return choque is None and not choca_con_series(db, staff_id, inicio, fin)
+
+def es_turno_solapado(error: IntegrityError):
+    # Postgres: exclusion_violation (23P01). SQLite: el trigger aborta con el nombre de la restricción.
+    if getattr(error.orig, "pgcode", None) == "23P01":
+        return True
+    return "excl_turnos_solapados" in str(error.orig)
 
 # 3. FUNCIÓN PRINCIPAL: CREAR TURNO
 def create_turno(db: Session, turno: schemas.TurnoCreate):
@@ -50,14 +154,16 @@ def create_turno(db: Session, turno: schemas.TurnoCreate):
         
     hora_fin = turno.fecha_hora_inicio + timedelta(minutes=servicio.duracion_minutos)
     
-    # B. Validamos Disponibilidad
-    if not check_disponibilidad(db, turno.staff_id, turno.fecha_hora_inicio, hora_fin):
-        return None # Retornamos vacío para indicar error
-        
-    # C. Gestionamos al Cliente
-    cliente = get_or_create_cliente(db, turno.telefono_cliente, turno.nombre_cliente, turno.negocio_id)
+    # La restricción de la base no conoce las series recurrentes: esas sí las chequeamos antes
+    if choca_con_series(db, turno.staff_id, turno.fecha_hora_inicio, hora_fin):
+        return None
+
+    # B. Gestionamos al Cliente
+    cliente = resolver_cliente(db, turno.telefono_cliente, turno.nombre_cliente, turno.negocio_id)
     
-    # D. Guardamos el Turno
+    # C. Guardamos el Turno
+    # No hay pre-chequeo: la base rechaza el INSERT si se solapa (exclusión en Postgres, trigger en SQLite),
+    # así dos webhooks simultáneos no pueden reservar el mismo horario.
     db_turno = models.Turno(
         negocio_id=turno.negocio_id,
         staff_id=turno.staff_id,
@@ -70,6 +176,338 @@ def create_turno(db: Session, turno: schemas.TurnoCreate):
     )
     
     db.add(db_turno)
+    try:
+        db.flush()
+        turno_id = db_turno.id
+        db.commit()
+    except IntegrityError as e:
+        db.rollback()
+        if es_turno_solapado(e):
+            return None # Retornamos vacío para indicar "horario ocupado"
+        raise
+    # Una sola consulta para la respuesta (turno + servicio + staff): refresh más dos lazy loads eran tres
+    return db.query(models.Turno).options(
+        joinedload(models.Turno.servicio),
+        joinedload(models.Turno.staff)
+    ).populate_existing().filter(models.Turno.id == turno_id).one()
+
+# 3b. CREAR MUCHOS TURNOS DE UNA VEZ (importar una agenda)
+# Todo por conjuntos: una consulta de servicios, una de turnos existentes, clientes en bloque
+# y un solo commit. Los choques se detectan en memoria con búsqueda binaria por barbero.
+class AgendaStaff:
+    # Intervalos ocupados de un barbero, ordenados y sin solaparse entre sí
+    def __init__(self, ocupados):
+        self.inicios = []
+        self.intervalos = []  # (inicio, fin, origen)
+        for inicio, fin in ocupados:
+            self.agregar(inicio, fin, "agenda")
+
+    def choque(self, inicio, fin):
+        # Solo puede chocar el último intervalo que empieza antes de "fin"
+        pos = bisect.bisect_left(self.inicios, fin)
+        if pos > 0 and self.intervalos[pos - 1][1] > inicio:
+            return self.intervalos[pos - 1][2]
+        return None
+
+    def agregar(self, inicio, fin, origen):
+        pos = bisect.bisect_left(self.inicios, inicio)
+        self.inicios.insert(pos, inicio)
+        self.intervalos.insert(pos, (inicio, fin, origen))
+
+def _resolver_clientes_lote(db: Session, claves):
+    # claves: {(negocio_id, telefono): nombre} -> {(negocio_id, telefono): ClienteRef}
+    # Internamente por teléfono normalizado: dos formatos del mismo número son un solo cliente
+    normalizados = {(n, t): (n, normalizar_telefono(t)) for n, t in claves}
+    refs = {}
+    faltantes = {}  # (negocio_id, normalizado) -> (telefono, nombre)
+    for (negocio_id, telefono), nombre in claves.items():
+        clave = normalizados[(negocio_id, telefono)]
+        ref = cache_clientes.obtener(*clave)
+        if ref:
+            refs[clave] = ref
+        else:
+            faltantes.setdefault(clave, (telefono, nombre))
+
+    def buscar(claves_buscar):
+        filas = db.execute(select(
+            models.Cliente.negocio_id, models.Cliente.telefono_normalizado, models.Cliente.id, models.Cliente.nombre
+        ).filter(
+            tuple_(models.Cliente.negocio_id, models.Cliente.telefono_normalizado).in_(list(claves_buscar))
+        )).all()
+        return {(f.negocio_id, f.telefono_normalizado): ClienteRef(f.id, f.nombre) for f in filas}
+
+    if faltantes:
+        encontrados = buscar(faltantes)
+        nuevos = [k for k in faltantes if k not in encontrados]
+        if nuevos:
+            insert = pg_insert if db.get_bind().dialect.name == "postgresql" else sqlite_insert
+            db.execute(insert(models.Cliente).values([
+                {"negocio_id": n, "telefono_whatsapp": faltantes[(n, norm)][0], "telefono_normalizado": norm,
+                 "nombre": faltantes[(n, norm)][1], "fecha_registro": datetime.utcnow()}
+                for n, norm in nuevos
+            ]).on_conflict_do_nothing(index_elements=["negocio_id", "telefono_normalizado"]))
+            encontrados.update(buscar(nuevos))
+        refs.update(encontrados)
+    return {clave: refs[norm] for clave, norm in normalizados.items()}
+
+def create_turnos_lote(db: Session, turnos, origen: str = "manual_admin"):
+    resultados = [schemas.ResultadoLoteItem(indice=i, aceptado=False) for i in range(len(turnos))]
+    if not turnos:
+        return resultados
+
+    # A. Servicios y barberos del lote en una consulta cada uno. Uno que no es del negocio
+    # (o está inactivo) rechaza sólo su ítem, no el lote entero.
+    ids_servicio = {t.servicio_id for t in turnos}
+    servicios = {s.id: s for s in db.query(models.Servicio).filter(
+        models.Servicio.id.in_(ids_servicio), models.Servicio.activo == True
+    )}
+    staff_negocio = dict(db.query(models.Staff.id, models.Staff.negocio_id).filter(
+        models.Staff.id.in_({t.staff_id for t in turnos}), models.Staff.activo == True
+    ).all())
+
+    candidatos = []  # (indice, turno, fin)
+    for i, t in enumerate(turnos):
+        servicio = servicios.get(t.servicio_id)
+        if servicio is None or servicio.negocio_id != t.negocio_id:
+            resultados[i].motivo = "Servicio no encontrado"
+            continue
+        if staff_negocio.get(t.staff_id) != t.negocio_id:
+            resultados[i].motivo = "Barbero no encontrado"
+            continue
+        candidatos.append((i, t, t.fecha_hora_inicio + timedelta(minutes=servicio.duracion_minutos)))
+    if not candidatos:
+        return resultados
+
+    # B. Turnos existentes de esos barberos en el rango del lote, en una consulta
+    staff_ids = {t.staff_id for _, t, _ in candidatos}
+    desde = min(t.fecha_hora_inicio for _, t, _ in candidatos)
+    hasta = max(fin for _, _, fin in candidatos)
+    existentes = {}
+    for staff_id, inicio, fin in db.query(
+        models.Turno.staff_id, models.Turno.fecha_hora_inicio, models.Turno.fecha_hora_fin
+    ).filter(
+        models.Turno.staff_id.in_(staff_ids),
+        models.Turno.estado.in_(models.ESTADOS_ACTIVOS),
+        models.turnos_que_solapan(desde, hasta)
+    ):
+        existentes.setdefault(staff_id, []).append((inicio, fin))
+
+    for staff_id, ocurrencias in ocupados_series(db, staff_ids, desde.date(), hasta.date()).items():
+        existentes.setdefault(staff_id, []).extend(ocurrencias)
+
+    # Los existentes pueden solaparse entre sí (datos viejos): los fusionamos antes de indexarlos
+    agendas = {s: AgendaStaff(unir_intervalos(existentes.get(s, []))) for s in staff_ids}
+
+    # C. Choques contra la agenda y dentro del lote (gana el que viene primero en la lista)
+    aceptados = []
+    for i, t, fin in candidatos:
+        agenda = agendas[t.staff_id]
+        choque = agenda.choque(t.fecha_hora_inicio, fin)
+        if choque == "agenda":
+            resultados[i].motivo = "Horario ocupado"
+        elif choque is not None:
+            resultados[i].motivo = f"Se solapa con el ítem {choque} del lote"
+        else:
+            agenda.agregar(t.fecha_hora_inicio, fin, i)
+            aceptados.append((i, t, fin))
+    if not aceptados:
+        return resultados
+
+    # D. Clientes en bloque y todos los turnos en una sola transacción
+    clientes = _resolver_clientes_lote(db, {
+        (t.negocio_id, t.telefono_cliente): t.nombre_cliente for _, t, _ in aceptados
+    })
+    nuevos = []
+    for i, t, fin in aceptados:
+        nuevos.append(models.Turno(
+            negocio_id=t.negocio_id,
+            staff_id=t.staff_id,
+            cliente_id=clientes[(t.negocio_id, t.telefono_cliente)].id,
+            servicio_id=t.servicio_id,
+            fecha_hora_inicio=t.fecha_hora_inicio,
+            fecha_hora_fin=fin,
+            estado="confirmado",
+            origen=origen
+        ))
+    db.add_all(nuevos)
+    try:
+        db.commit()
+    except IntegrityError:
+        # Alguien reservó en paralelo uno de estos horarios: no dejamos el lote a medias
+        db.rollback()
+        raise
+
+    # Recién ahora (con el commit hecho) los clientes nuevos existen de verdad: los cacheamos
+    # con la misma clave que resolver_cliente (teléfono normalizado), así invalidar los encuentra
+    for (negocio_id, telefono), ref in clientes.items():
+        cache_clientes.guardar(negocio_id, normalizar_telefono(telefono), ref)
+    for (i, _, _), turno in zip(aceptados, nuevos):
+        resultados[i].aceptado = True
+        resultados[i].turno_id = turno.id
+    return resultados
+
+# 3c. TURNOS RECURRENTES
+# Devuelve (serie, []) si se creó, o (None, fechas_en_conflicto) si choca con la agenda
+def create_serie(db: Session, datos: schemas.SerieCreate):
+    if datos.cada_semanas < 1:
+        raise ValueError("cada_semanas debe ser 1 o más")
+    if datos.fecha_fin and datos.fecha_fin < datos.fecha_inicio:
+        raise ValueError("fecha_fin no puede ser anterior a fecha_inicio")
+
+    servicio = db.query(models.Servicio).filter(models.Servicio.id == datos.servicio_id).first()
+    if not servicio:
+        raise Exception("Servicio no encontrado")
+
+    serie = models.SerieTurno(
+        negocio_id=datos.negocio_id,
+        staff_id=datos.staff_id,
+        servicio_id=datos.servicio_id,
+        fecha_inicio=datos.fecha_inicio,
+        fecha_fin=datos.fecha_fin,
+        hora_inicio=datos.hora_inicio,
+        duracion_minutos=servicio.duracion_minutos,
+        cada_semanas=datos.cada_semanas,
+        activa=True
+    )
+    choques = choques_serie_nueva(db, serie)
+    if choques:
+        return None, choques
+
+    serie.cliente_id = resolver_cliente(db, datos.telefono_cliente, datos.nombre_cliente, datos.negocio_id).id
+    db.add(serie)
     db.commit()
-    db.refresh(db_turno)
-    return db_turno
\ No newline at end of file
+    db.refresh(serie)
+    return serie, []
+
+# 4. LISTADO DE TURNOS PAGINADO (ADMIN)
+# Paginación por cursor (keyset) sobre (fecha_hora_inicio, id): cada página cuesta lo mismo
+# sin importar cuántas páginas haya antes, a diferencia de OFFSET.
+def codificar_cursor(inicio: datetime, turno_id: int):
+    return base64.urlsafe_b64encode(f"{inicio.isoformat()}|{turno_id}".encode()).decode()
+
+def decodificar_cursor(cursor: str):
+    try:
+        inicio, turno_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(inicio), int(turno_id)
+    except Exception:
+        raise ValueError("Cursor inválido")
+
+def listar_turnos(db: Session, negocio_id: int, desde=None, hasta=None, estados=None, staff_id=None, cursor=None, limite=50):
+    # joinedload: cliente, servicio y staff vienen en el mismo SELECT (sin N+1)
+    consulta = db.query(models.Turno).options(
+        joinedload(models.Turno.cliente),
+        joinedload(models.Turno.servicio),
+        joinedload(models.Turno.staff)
+    ).filter(models.Turno.negocio_id == negocio_id)
+
+    if desde:
+        consulta = consulta.filter(models.Turno.fecha_hora_inicio >= desde)
+    if hasta:
+        consulta = consulta.filter(models.Turno.fecha_hora_inicio < hasta)
+    if estados:
+        consulta = consulta.filter(models.Turno.estado.in_(estados))
+    if staff_id:
+        consulta = consulta.filter(models.Turno.staff_id == staff_id)
+    if cursor:
+        c_inicio, c_id = decodificar_cursor(cursor)
+        consulta = consulta.filter(or_(
+            models.Turno.fecha_hora_inicio > c_inicio,
+            and_(models.Turno.fecha_hora_inicio == c_inicio, models.Turno.id > c_id)
+        ))
+
+    # Pedimos uno de más para saber si hay otra página
+    turnos = consulta.order_by(models.Turno.fecha_hora_inicio, models.Turno.id).limit(limite + 1).all()
+    siguiente = None
+    if len(turnos) > limite:
+        turnos = turnos[:limite]
+        siguiente = codificar_cursor(turnos[-1].fecha_hora_inicio, turnos[-1].id)
+    return turnos, siguiente
+
+# 5. MÉTRICAS DEL DASHBOARD
+# Todo se cuenta en SQL con COUNT(...) FILTER: una fila (o una por grupo), nunca los turnos en memoria
+def _columnas_metricas():
+    return [
+        func.count(models.Turno.id).label("turnos"),
+        func.count(distinct(models.Turno.servicio_id)).label("servicios"),
+        func.count(models.Turno.id).filter(models.Turno.estado == "pendiente").label("pendientes"),
+        func.count(models.Turno.id).filter(models.Turno.estado == "confirmado").label("confirmados"),
+    ]
+
+def metricas_turnos(db: Session, negocio_id: int, desde=None, hasta=None, agrupar=None):
+    filtros = [models.Turno.negocio_id == negocio_id]
+    if desde:
+        filtros.append(models.Turno.fecha_hora_inicio >= desde)
+    if hasta:
+        filtros.append(models.Turno.fecha_hora_inicio < hasta)
+
+    total = db.query(*_columnas_metricas()).filter(*filtros).one()
+    resumen = {"total": total._asdict(), "por_grupo": []}
+
+    if agrupar:
+        columna = models.Turno.staff_id if agrupar == "staff" else models.Turno.servicio_id
+        filas = db.query(columna.label("id"), *_columnas_metricas()).filter(*filtros).group_by(columna).order_by(columna).all()
+        resumen["por_grupo"] = [f._asdict() for f in filas]
+    return resumen
+
+# --- VERSIONES ASÍNCRONAS (las usa el webhook para no bloquear el event loop) ---
+
+async def resolver_cliente_async(db: AsyncSession, telefono: str, nombre: str = "Estimado Cliente", negocio_id: int = 1):
+    normalizado = normalizar_telefono(telefono)
+    ref = cache_clientes.obtener(negocio_id, normalizado)
+    if ref:
+        return ref
+
+    fila = (await db.execute(_select_cliente(normalizado, negocio_id))).first()
+    if fila is None:
+        fila = (await db.execute(_upsert_cliente(db.bind.dialect.name, telefono, normalizado, nombre, negocio_id))).first()
+        await db.commit()
+        if fila is None:
+            fila = (await db.execute(_select_cliente(normalizado, negocio_id))).first()
+
+    ref = ClienteRef(fila.id, fila.nombre)
+    cache_clientes.guardar(negocio_id, normalizado, ref)
+    return ref
+
+async def create_turno_async(db: AsyncSession, turno: schemas.TurnoCreate):
+    servicio = await db.get(models.Servicio, turno.servicio_id)
+    if not servicio:
+        raise Exception("Servicio no encontrado")
+
+    hora_fin = turno.fecha_hora_inicio + timedelta(minutes=servicio.duracion_minutos)
+    if await db.run_sync(choca_con_series, turno.staff_id, turno.fecha_hora_inicio, hora_fin):
+        return None
+    cliente = await resolver_cliente_async(db, turno.telefono_cliente, turno.nombre_cliente, turno.negocio_id)
+
+    db_turno = models.Turno(
+        negocio_id=turno.negocio_id,
+        staff_id=turno.staff_id,
+        cliente_id=cliente.id,
+        servicio_id=turno.servicio_id,
+        fecha_hora_inicio=turno.fecha_hora_inicio,
+        fecha_hora_fin=hora_fin,
+        estado="confirmado",
+        origen="bot_whatsapp"
+    )
+    db.add(db_turno)
+    try:
+        await db.commit()
+    except IntegrityError as e:
+        await db.rollback()
+        if es_turno_solapado(e):
+            return None
+        raise
+    # En async no hay lazy loading: servicio ya está en la sesión y staff viene en un solo SELECT
+    set_committed_value(db_turno, "servicio", servicio)
+    set_committed_value(db_turno, "staff", await db.get(models.Staff, turno.staff_id))
+    return db_turno
+
+# Sólo los que vienen: con el filtro por fecha Postgres lee las particiones de este mes en adelante
+async def get_turnos_confirmados_cliente_async(db: AsyncSession, cliente_id: int):
+    resultado = await db.execute(select(models.Turno).options(
+        selectinload(models.Turno.servicio)
+    ).filter(
+        models.Turno.cliente_id == cliente_id,
+        models.Turno.estado == "confirmado",
+        models.Turno.fecha_hora_inicio >= datetime.now()
+    ).order_by(models.Turno.fecha_hora_inicio))
+    return resultado.scalars().all()
@@ -1,20 +1,159 @@
 import os
-from sqlalchemy import create_engine
+import sys
+import time
+import asyncio
+import threading
+import uuid
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from sqlalchemy import create_engine, event
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import QueuePool, AsyncAdaptedQueuePool
 from dotenv import load_dotenv
 
+try:
+    import greenlet  # viene con el motor async de SQLAlchemy
+except ImportError:
+    greenlet = None
+
 # 1. Cargar variables
 load_dotenv()
 
 # 2. Configurar URL
-DATABASE_URL = f"postgresql://{os.getenv('DB_USER')}:{os.getenv('DB_PASSWORD')}@{os.getenv('DB_HOST')}:{os.getenv('DB_PORT')}/{os.getenv('DB_NAME')}"
+# Si existe DATABASE_URL se usa tal cual (ej: sqlite:///./barberia.db para probar en local)
+DATABASE_URL = os.getenv("DATABASE_URL") or f"postgresql://{os.getenv('DB_USER')}:{os.getenv('DB_PASSWORD')}@{os.getenv('DB_HOST')}:{os.getenv('DB_PORT')}/{os.getenv('DB_NAME')}"
+ES_SQLITE = DATABASE_URL.startswith("sqlite")
+
+# 3. Configuración del pool (todo sale del entorno)
+def _env_bool(nombre, defecto):
+    valor = os.getenv(nombre)
+    if valor is None:
+        return defecto
+    return valor.strip().lower() in ("1", "true", "si", "sí", "yes", "on")
+
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", "30"))        # segundos esperando una conexión libre
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "240"))       # Neon corta las inactivas a los ~5 min
+DB_POOL_PRE_PING = _env_bool("DB_POOL_PRE_PING", True)           # detecta conexiones muertas antes de usarlas
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "0"))  # 0 = sin límite
+DB_POOL_WARMUP = int(os.getenv("DB_POOL_WARMUP", "0"))           # conexiones a abrir al arrancar la API
+# Detrás de PgBouncer en modo transacción no hay sesión fija: nada de prepared statements
+# ni parámetros de arranque (statement_timeout se configura en el rol de la base).
+DB_PGBOUNCER = _env_bool("DB_PGBOUNCER", False)
+
+# 4. Estadísticas del pool (checkouts y tiempo de espera por una conexión)
+class EstadisticasPool:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.espera_total_s = 0.0
+        self.espera_max_s = 0.0
+        self.conexiones_nuevas = 0
+        self.invalidadas = 0
+
+    def registrar_espera(self, segundos):
+        with self._lock:
+            self.checkouts += 1
+            self.espera_total_s += segundos
+            if segundos > self.espera_max_s:
+                self.espera_max_s = segundos
+
+    def como_dict(self, pool):
+        with self._lock:
+            return {
+                "tamano": pool.size(),
+                "en_uso": pool.checkedout(),
+                "libres": pool.checkedin(),
+                "overflow": pool.overflow(),
+                "checkouts": self.checkouts,
+                "espera_promedio_ms": round(1000 * self.espera_total_s / self.checkouts, 3) if self.checkouts else 0.0,
+                "espera_max_ms": round(1000 * self.espera_max_s, 3),
+                "conexiones_nuevas": self.conexiones_nuevas,
+                "invalidadas": self.invalidadas,
+            }
+
+class _PoolMedido:
+    # Las estadísticas viven en la clase para sobrevivir a engine.dispose() (que recrea el pool)
+    estadisticas = None
+
+    def _do_get(self):
+        inicio = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            self.estadisticas.registrar_espera(time.perf_counter() - inicio)
+
+class QueuePoolMedido(_PoolMedido, QueuePool):
+    estadisticas = EstadisticasPool()
+
+class AsyncQueuePoolMedido(_PoolMedido, AsyncAdaptedQueuePool):
+    estadisticas = EstadisticasPool()
+
+def _opciones_pool(poolclass):
+    return {
+        "poolclass": poolclass,
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+    }
 
-# 3. Crear motor
-engine = create_engine(DATABASE_URL)
+def _connect_args_sync():
+    if ES_SQLITE:
+        # SQLite necesita check_same_thread=False porque FastAPI usa varios hilos
+        return {"check_same_thread": False}
+    if DB_STATEMENT_TIMEOUT_MS and not DB_PGBOUNCER:
+        return {"options": f"-c statement_timeout={DB_STATEMENT_TIMEOUT_MS}"}
+    return {}
+
+def _connect_args_async():
+    if ES_SQLITE:
+        return {}
+    args = {}
+    if DB_PGBOUNCER:
+        # Sin caché de sentencias y con nombres únicos: PgBouncer puede cambiarnos de backend
+        args["statement_cache_size"] = 0
+        args["prepared_statement_cache_size"] = 0
+        args["prepared_statement_name_func"] = lambda: f"__asyncpg_{uuid.uuid4()}__"
+    elif DB_STATEMENT_TIMEOUT_MS:
+        args["server_settings"] = {"statement_timeout": str(DB_STATEMENT_TIMEOUT_MS)}
+    return args
+
+def _escuchar_estadisticas(engine_sync, poolclass):
+    @event.listens_for(engine_sync, "connect")
+    def _al_conectar(dbapi_conn, registro):
+        poolclass.estadisticas.conexiones_nuevas += 1
+
+    @event.listens_for(engine_sync, "invalidate")
+    def _al_invalidar(dbapi_conn, registro, error):
+        poolclass.estadisticas.invalidadas += 1
+
+# 5. Crear motor
+engine = create_engine(DATABASE_URL, connect_args=_connect_args_sync(), **_opciones_pool(QueuePoolMedido))
+_escuchar_estadisticas(engine, QueuePoolMedido)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
+# 6. Motor asíncrono (para el webhook: no bloquea el event loop mientras espera a la base)
+def url_async(url):
+    if url.startswith("postgresql://"):
+        # asyncpg usa "ssl" en lugar de "sslmode"
+        return "postgresql+asyncpg://" + url[len("postgresql://"):].replace("sslmode=", "ssl=")
+    if url.startswith("sqlite://"):
+        return "sqlite+aiosqlite://" + url[len("sqlite://"):]
+    return url
+
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL") or url_async(DATABASE_URL)
+async_engine = create_async_engine(ASYNC_DATABASE_URL, connect_args=_connect_args_async(), **_opciones_pool(AsyncQueuePoolMedido))
+_escuchar_estadisticas(async_engine.sync_engine, AsyncQueuePoolMedido)
+# expire_on_commit=False: tras el commit seguimos leyendo atributos sin volver a la base
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
 def get_db():
     db = SessionLocal()
     try:
@@ -22,9 +161,159 @@ def get_db():
     finally:
         db.close()
 
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+# 7. Calentamiento: abrir conexiones al arrancar para no pagar el handshake TLS en el primer mensaje
+def _calentar_sync(cantidad):
+    conexiones = [engine.connect() for _ in range(cantidad)]
+    for conexion in conexiones:
+        conexion.exec_driver_sql("SELECT 1")
+        conexion.close()
+
+async def _calentar_async(cantidad):
+    conexiones = await asyncio.gather(*[async_engine.connect() for _ in range(cantidad)])
+    for conexion in conexiones:
+        await conexion.exec_driver_sql("SELECT 1")
+        await conexion.close()
+
+async def calentar_pool(cantidad=DB_POOL_WARMUP):
+    cantidad = min(cantidad, DB_POOL_SIZE)
+    if cantidad <= 0:
+        return
+    await asyncio.gather(asyncio.to_thread(_calentar_sync, cantidad), _calentar_async(cantidad))
+
+def estadisticas_pool():
+    return {
+        "sync": QueuePoolMedido.estadisticas.como_dict(engine.pool),
+        "async": AsyncQueuePoolMedido.estadisticas.como_dict(async_engine.sync_engine.pool),
+    }
+
+# 8. Instrumentación de consultas
+# Cada pedido HTTP (middleware de observabilidad) o rerun del admin abre un "alcance": ahí se
+# cuentan las sentencias y su tiempo. Al cerrarlo se avisa de las que se repitieron idénticas
+# (el patrón de un lazy load por fila: N+1) y, si tiene presupuesto, se falla al pasarse.
+# Las lentas se registran siempre, con parámetros y el lugar del código que las disparó.
+DB_CONSULTA_LENTA_MS = int(os.getenv("DB_CONSULTA_LENTA_MS", "500"))       # 0 = no registrar
+DB_N1_REPETICIONES = int(os.getenv("DB_N1_REPETICIONES", "5"))             # misma sentencia N veces = sospecha
+# Para pruebas/CI: máximo de sentencias por pedido; pasarse levanta PresupuestoConsultasExcedido (0 = sin control)
+DB_PRESUPUESTO_CONSULTAS = int(os.getenv("DB_PRESUPUESTO_CONSULTAS", "0"))
+
+_DIR_APP = os.path.dirname(os.path.abspath(__file__))
+_ESTE_ARCHIVO = os.path.abspath(__file__)
+
+class PresupuestoConsultasExcedido(AssertionError):
+    pass
+
+# Primer frame de nuestro código (no SQLAlchemy, no este archivo) en la pila de la consulta.
+# En el motor async la sentencia corre en un greenlet hijo: la pila del código que hizo
+# el await está en el greenlet padre.
+def _sitio_llamada():
+    pilas = [sys._getframe(1)]
+    if greenlet is not None:
+        padre = greenlet.getcurrent().parent
+        if padre is not None and padre.gr_frame is not None:
+            pilas.append(padre.gr_frame)
+    for frame in pilas:
+        while frame is not None:
+            archivo = frame.f_code.co_filename
+            if archivo.startswith(_DIR_APP) and archivo != _ESTE_ARCHIVO and "site-packages" not in archivo:
+                return f"{os.path.relpath(archivo, _DIR_APP)}:{frame.f_lineno} ({frame.f_code.co_name})"
+            frame = frame.f_back
+    return "?"
+
+def _compactar(sentencia, largo=300):
+    texto = " ".join(sentencia.split())
+    return texto if len(texto) <= largo else texto[:largo] + "…"
+
+class AlcanceConsultas:
+    def __init__(self, nombre, presupuesto=0, padre=None):
+        self.nombre = nombre
+        self.presupuesto = presupuesto
+        self.padre = padre              # los alcances anidados también suman en el de afuera
+        self.total = 0
+        self.tiempo_s = 0.0
+        self.sentencias = Counter()
+        self.sitios = {}                # sentencia repetida -> dónde se repitió por primera vez
+        self._token = None
+
+    def registrar(self, sentencia, segundos):
+        alcance = self
+        while alcance is not None:
+            alcance.total += 1
+            alcance.tiempo_s += segundos
+            alcance.sentencias[sentencia] += 1
+            if alcance.sentencias[sentencia] == 2:
+                alcance.sitios[sentencia] = _sitio_llamada()
+            alcance = alcance.padre
+
+    def sospechas_n1(self):
+        return [(sentencia, veces) for sentencia, veces in self.sentencias.most_common()
+                if veces >= DB_N1_REPETICIONES]
+
+    def cerrar(self):
+        if self._token is not None:
+            try:
+                _alcance_actual.reset(self._token)
+            except ValueError:
+                pass  # se abrió en otro contexto (ej. el rerun anterior de Streamlit)
+            self._token = None
+        for sentencia, veces in self.sospechas_n1():
+            print(f"🔁 Posible N+1 en {self.nombre}: {veces}× desde {self.sitios.get(sentencia, '?')}: {_compactar(sentencia)}")
+
+    def verificar_presupuesto(self):
+        if self.presupuesto and self.total > self.presupuesto:
+            detalle = "\n".join(f"  {veces}× {_compactar(s, 150)}" for s, veces in self.sentencias.most_common(5))
+            raise PresupuestoConsultasExcedido(
+                f"{self.nombre}: {self.total} consultas (presupuesto {self.presupuesto})\n{detalle}"
+            )
+
+_alcance_actual = ContextVar("alcance_consultas", default=None)
+
+def alcance_actual():
+    return _alcance_actual.get()
+
+# Para código sin un punto de salida único (el script de Streamlit): hay que llamar a cerrar()
+def abrir_alcance(nombre, presupuesto=0):
+    alcance = AlcanceConsultas(nombre, presupuesto, padre=_alcance_actual.get())
+    alcance._token = _alcance_actual.set(alcance)
+    return alcance
+
+# with medir_consultas("importar agenda") as alcance: ... -> alcance.total, alcance.sospechas_n1()
+# Con presupuesto sirve de aserción en pruebas: with medir_consultas("reservar", presupuesto=6): ...
+@contextmanager
+def medir_consultas(nombre, presupuesto=0):
+    alcance = abrir_alcance(nombre, presupuesto)
+    try:
+        yield alcance
+    finally:
+        alcance.cerrar()
+    alcance.verificar_presupuesto()
+
+def _antes_de_ejecutar(conn, cursor, statement, parameters, context, executemany):
+    context._inicio_consulta = time.perf_counter()
+
+def _despues_de_ejecutar(conn, cursor, statement, parameters, context, executemany):
+    segundos = time.perf_counter() - context._inicio_consulta
+    alcance = _alcance_actual.get()
+    if alcance is not None:
+        alcance.registrar(statement, segundos)
+    if DB_CONSULTA_LENTA_MS and segundos * 1000 >= DB_CONSULTA_LENTA_MS:
+        parametros = repr(parameters)
+        if len(parametros) > 300:
+            parametros = parametros[:300] + "…"
+        donde = f" [{alcance.nombre}]" if alcance is not None else ""
+        print(f"🐢 Consulta lenta ({segundos * 1000:.0f} ms) desde {_sitio_llamada()}{donde}: "
+              f"{_compactar(statement)} | parámetros: {parametros}")
+
+for _motor in (engine, async_engine.sync_engine):
+    event.listen(_motor, "before_cursor_execute", _antes_de_ejecutar)
+    event.listen(_motor, "after_cursor_execute", _despues_de_ejecutar)
+
 if __name__ == "__main__":
     try:
         with engine.connect() as connection:
             print("✅ ¡Conexión EXITOSA a la Base de Datos!")
     except Exception as e:
-        print(f"❌ Error al conectar: {e}")
\ No newline at end of file
+        print(f"❌ Error al conectar: {e}")
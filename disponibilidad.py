@@ -0,0 +1,158 @@
+import heapq
+from datetime import datetime, timedelta, time
+from sqlalchemy.orm import Session
+import models
+from recurrencia import ocupados_series
+
+# --- MOTOR DE DISPONIBILIDAD (compartido por reservas.py y la API) ---
+
+# Horario laboral y separación entre turnos ofrecidos
+HORA_APERTURA = time(9, 0)
+HORA_CIERRE = time(20, 0)
+INTERVALO_MINUTOS = 30
+
+# 1. Traer solo los turnos del día pedido (usa el índice parcial staff/horario)
+def turnos_del_dia(db: Session, staff_id: int, fecha):
+    inicio_dia = datetime.combine(fecha, time.min)
+    fin_dia = inicio_dia + timedelta(days=1)
+    ocupados = db.query(models.Turno.fecha_hora_inicio, models.Turno.fecha_hora_fin).filter(
+        models.Turno.staff_id == staff_id,
+        models.Turno.estado.in_(models.ESTADOS_ACTIVOS),
+        models.turnos_que_solapan(inicio_dia, fin_dia)
+    ).all()
+    # Más las ocurrencias de turnos recurrentes de ese día (calculadas, no guardadas)
+    return ocupados + ocupados_series(db, [staff_id], fecha, fecha).get(staff_id, [])
+
+# 2. Ordenar y fusionar los intervalos ocupados (los que se tocan o pisan quedan en uno)
+def unir_intervalos(ocupados):
+    unidos = []
+    for inicio, fin in sorted(ocupados):
+        if unidos and inicio <= unidos[-1][1]:
+            if fin > unidos[-1][1]:
+                unidos[-1][1] = fin
+        else:
+            unidos.append([inicio, fin])
+    return unidos
+
+# 3. Barrido ordenado: bloques y ocupados avanzan juntos, O(bloques + turnos del día)
+def calcular_bloques_libres(fecha, duracion_servicio, ocupados):
+    duracion = timedelta(minutes=duracion_servicio)
+    paso = timedelta(minutes=INTERVALO_MINUTOS)
+    bloque = datetime.combine(fecha, HORA_APERTURA)
+    cierre = datetime.combine(fecha, HORA_CIERRE)
+
+    ocupados = unir_intervalos(ocupados)
+    i = 0
+    libres = []
+    while bloque + duracion <= cierre:
+        fin_bloque = bloque + duracion
+        # Descartamos los ocupados que ya terminaron antes de este bloque
+        while i < len(ocupados) and ocupados[i][1] <= bloque:
+            i += 1
+        # Libre si el próximo ocupado empieza cuando (o después de que) el bloque termina
+        if i == len(ocupados) or ocupados[i][0] >= fin_bloque:
+            libres.append(bloque)
+        bloque += paso
+    return libres
+
+# 4. Lo que usa la web: horarios libres de un barbero en un día, como "HH:MM"
+def obtener_horarios_disponibles(db: Session, fecha_elegida, staff_id, duracion_servicio):
+    ocupados = turnos_del_dia(db, staff_id, fecha_elegida)
+    bloques = calcular_bloques_libres(fecha_elegida, duracion_servicio, ocupados)
+    return [b.strftime("%H:%M") for b in bloques]
+
+# 5. Lote: una sola consulta para varios barberos y varios días
+def turnos_del_rango(db: Session, staff_ids, desde, hasta):
+    inicio_rango = datetime.combine(desde, time.min)
+    fin_rango = datetime.combine(hasta, time.min) + timedelta(days=1)
+    filas = db.query(
+        models.Turno.staff_id, models.Turno.fecha_hora_inicio, models.Turno.fecha_hora_fin
+    ).filter(
+        models.Turno.staff_id.in_(staff_ids),
+        models.Turno.estado.in_(models.ESTADOS_ACTIVOS),
+        models.turnos_que_solapan(inicio_rango, fin_rango)
+    ).all()
+
+    # Sumamos las ocurrencias de las series recurrentes dentro del rango
+    for staff_id, ocurrencias in ocupados_series(db, staff_ids, desde, hasta).items():
+        filas.extend((staff_id, inicio, fin) for inicio, fin in ocurrencias)
+
+    # Agrupamos por (staff, día); un turno que cruza la medianoche cuenta en ambos días
+    por_staff_dia = {}
+    for staff_id, inicio, fin in filas:
+        dia = inicio.date()
+        while dia <= fin.date():
+            por_staff_dia.setdefault((staff_id, dia), []).append((inicio, fin))
+            dia += timedelta(days=1)
+    return por_staff_dia
+
+def disponibilidad_por_lote(db: Session, staff_ids, desde, hasta, duracion_servicio):
+    ocupados = turnos_del_rango(db, staff_ids, desde, hasta)
+    resultado = []
+    for staff_id in staff_ids:
+        dia = desde
+        while dia <= hasta:
+            bloques = calcular_bloques_libres(dia, duracion_servicio, ocupados.get((staff_id, dia), []))
+            resultado.append((staff_id, dia, bloques))
+            dia += timedelta(days=1)
+    return resultado
+
+# 6. Huecos libres de un día: el complemento de los ocupados dentro del horario laboral
+def huecos_libres(fecha, ocupados):
+    cursor = datetime.combine(fecha, HORA_APERTURA)
+    cierre = datetime.combine(fecha, HORA_CIERRE)
+    for inicio, fin in unir_intervalos(ocupados):
+        if inicio > cursor:
+            yield cursor, min(inicio, cierre)
+        cursor = max(cursor, fin)
+        if cursor >= cierre:
+            return
+    if cursor < cierre:
+        yield cursor, cierre
+
+# Candidatos de un barbero en orden cronológico: el primer inicio posible de cada hueco
+# y luego los bloques de la grilla de INTERVALO_MINUTOS que todavía entran en él
+def candidatos_staff(staff_id, desde, dias, duracion_servicio, ocupados_por_dia):
+    duracion = timedelta(minutes=duracion_servicio)
+    paso = timedelta(minutes=INTERVALO_MINUTOS)
+    for d in range(dias):
+        fecha = desde.date() + timedelta(days=d)
+        apertura = datetime.combine(fecha, HORA_APERTURA)
+        for inicio_hueco, fin_hueco in huecos_libres(fecha, ocupados_por_dia.get((staff_id, fecha), [])):
+            inicio = max(inicio_hueco, desde)
+            while inicio + duracion <= fin_hueco:
+                yield inicio, staff_id
+                # Siguiente bloque de la grilla (09:00, 09:30, ...) posterior a "inicio"
+                inicio = apertura + ((inicio - apertura) // paso + 1) * paso
+
+# El turno entero cae dentro del horario laboral de su día
+def dentro_del_horario(inicio, duracion_servicio):
+    fin = inicio + timedelta(minutes=duracion_servicio)
+    return datetime.combine(inicio.date(), HORA_APERTURA) <= inicio and fin <= datetime.combine(inicio.date(), HORA_CIERRE)
+
+# Primer inicio de la grilla (09:00, 09:30, ...) a partir de "momento"
+def proximo_bloque(momento):
+    apertura = datetime.combine(momento.date(), HORA_APERTURA)
+    if momento <= apertura:
+        return apertura
+    paso = timedelta(minutes=INTERVALO_MINUTOS)
+    return apertura - ((apertura - momento) // paso) * paso
+
+# 7. Primeros horarios libres desde "desde" con cualquier barbero.
+# Cada barbero aporta una lista ordenada y perezosa; heapq.merge las mezcla y solo
+# calculamos los huecos necesarios para llegar a "cantidad" resultados.
+def primeros_turnos_libres(db: Session, staff_ids, desde, duracion_servicio, cantidad=3, dias=7):
+    if not staff_ids:
+        return []
+    ocupados = turnos_del_rango(db, staff_ids, desde.date(), desde.date() + timedelta(days=dias - 1))
+    flujos = [candidatos_staff(s, desde, dias, duracion_servicio, ocupados) for s in staff_ids]
+
+    resultado = []
+    for inicio, staff_id in heapq.merge(*flujos):
+        # Para ofrecer alternativas nos interesa un barbero por horario
+        if resultado and resultado[-1][0] == inicio:
+            continue
+        resultado.append((inicio, staff_id))
+        if len(resultado) == cantidad:
+            break
+    return resultado
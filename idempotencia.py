@@ -0,0 +1,141 @@
+import os
+import time
+import asyncio
+import datetime
+import threading
+from collections import OrderedDict
+from sqlalchemy import select, update, delete
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+import models
+
+# --- IDEMPOTENCIA DEL WEBHOOK (MessageSid de Twilio) ---
+# Twilio reintenta el webhook si tardamos en responder. Cada mensaje trae un MessageSid
+# único: si ya lo atendimos, devolvemos el mismo TwiML sin volver a procesarlo.
+#   1) caché en memoria con TTL (un reintento cuesta un diccionario)
+#   2) si hay un pedido en curso con ese SID en este proceso, esperamos su respuesta
+#   3) tabla mensajes_procesados: sobrevive a reinicios y la comparten los workers
+MENSAJES_CACHE_MAX = int(os.getenv("MENSAJES_CACHE_MAX", "5000"))
+MENSAJES_TTL_SEGUNDOS = int(os.getenv("MENSAJES_TTL_SEGUNDOS", "3600"))
+# Días que se guardan en la tabla (Twilio deja de reintentar mucho antes)
+MENSAJES_RETENCION_DIAS = int(os.getenv("MENSAJES_RETENCION_DIAS", "7"))
+# Cuánto esperamos a que otro worker termine el mismo mensaje antes de responder vacío
+ESPERA_OTRO_WORKER_S = 5.0
+
+# Respuesta vacía: Twilio no envía nada (la respuesta real la manda quien lo procesa)
+TWIML_VACIO = '<?xml version="1.0" encoding="UTF-8"?><Response></Response>'
+
+class CacheMensajes:
+    def __init__(self, maximo=MENSAJES_CACHE_MAX, ttl=MENSAJES_TTL_SEGUNDOS):
+        self.maximo = maximo
+        self.ttl = ttl
+        self._datos = OrderedDict()  # sid -> (respuesta, expira)
+        self._lock = threading.Lock()
+
+    def obtener(self, sid):
+        with self._lock:
+            entrada = self._datos.get(sid)
+            if entrada is None:
+                return None
+            if entrada[1] <= time.monotonic():
+                del self._datos[sid]
+                return None
+            self._datos.move_to_end(sid)
+            return entrada[0]
+
+    def guardar(self, sid, respuesta):
+        with self._lock:
+            self._datos[sid] = (respuesta, time.monotonic() + self.ttl)
+            self._datos.move_to_end(sid)
+            while len(self._datos) > self.maximo:
+                self._datos.popitem(last=False)
+
+cache_mensajes = CacheMensajes()
+# Pedidos en curso en este proceso: sid -> Future con el TwiML
+_en_curso = {}
+
+def _reclamar(dialecto, sid):
+    insert = pg_insert if dialecto == "postgresql" else sqlite_insert
+    return insert(models.MensajeProcesado).values(
+        message_sid=sid
+    ).on_conflict_do_nothing(
+        index_elements=["message_sid"]
+    ).returning(models.MensajeProcesado.message_sid)
+
+async def _respuesta_guardada(db: AsyncSession, sid):
+    return (await db.execute(
+        select(models.MensajeProcesado.respuesta).where(models.MensajeProcesado.message_sid == sid)
+    )).scalar_one_or_none()
+
+async def _esperar_otro_worker(db: AsyncSession, sid):
+    limite = time.monotonic() + ESPERA_OTRO_WORKER_S
+    while time.monotonic() < limite:
+        respuesta = await _respuesta_guardada(db, sid)
+        if respuesta is not None:
+            return respuesta
+        await db.rollback()  # soltamos la foto de la transacción para ver el commit ajeno
+        await asyncio.sleep(0.2)
+    return None
+
+# Ejecuta procesar() una sola vez por MessageSid y devuelve el TwiML (el original en los reintentos).
+# Devuelve (twiml, es_reintento).
+async def atender_una_vez(db: AsyncSession, sid, procesar):
+    if not sid:
+        return await procesar(), False
+
+    # 1. Memoria
+    respuesta = cache_mensajes.obtener(sid)
+    if respuesta is not None:
+        return respuesta, True
+
+    # 2. Mismo proceso, todavía respondiendo al intento anterior
+    pendiente = _en_curso.get(sid)
+    if pendiente is not None:
+        return await asyncio.shield(pendiente), True
+
+    futuro = asyncio.get_running_loop().create_future()
+    _en_curso[sid] = futuro
+    try:
+        # 3. Reclamamos el SID en la base: sólo un worker gana el INSERT
+        reclamado = (await db.execute(_reclamar(db.bind.dialect.name, sid))).first()
+        await db.commit()
+        if reclamado is None:
+            respuesta = await _esperar_otro_worker(db, sid)
+            if respuesta is None:
+                # Sigue en proceso en otro worker (o se cayó): no lo repetimos
+                futuro.set_result(TWIML_VACIO)
+                return TWIML_VACIO, True
+            cache_mensajes.guardar(sid, respuesta)
+            futuro.set_result(respuesta)
+            return respuesta, True
+
+        try:
+            respuesta = await procesar()
+        except BaseException:
+            # Liberamos el SID para que el reintento de Twilio pueda procesarlo
+            await db.rollback()
+            await db.execute(delete(models.MensajeProcesado).where(models.MensajeProcesado.message_sid == sid))
+            await db.commit()
+            raise
+
+        await db.execute(
+            update(models.MensajeProcesado).where(models.MensajeProcesado.message_sid == sid).values(respuesta=respuesta)
+        )
+        await db.commit()
+        cache_mensajes.guardar(sid, respuesta)
+        futuro.set_result(respuesta)
+        return respuesta, False
+    except BaseException as e:
+        if not futuro.done():
+            futuro.set_exception(e)
+            futuro.exception()  # marcada como vista si nadie más la esperaba
+        raise
+    finally:
+        _en_curso.pop(sid, None)
+
+# Limpieza de SIDs viejos (se llama al arrancar la API)
+async def purgar_antiguos(db: AsyncSession, dias=MENSAJES_RETENCION_DIAS):
+    limite = datetime.datetime.utcnow() - datetime.timedelta(days=dias)
+    await db.execute(delete(models.MensajeProcesado).where(models.MensajeProcesado.fecha < limite))
+    await db.commit()
@@ -1,11 +1,64 @@
+from sqlalchemy import DDL, text, inspect
+from sqlalchemy.schema import CreateColumn
 from database import engine, Base, SessionLocal
 from models import Usuario, Negocio, Staff, Servicio, Cliente
 import models 
+import particiones
+import telefonos
+
+def agregar_columnas_faltantes(conn):
+    # Columnas nuevas (siempre opcionales) en tablas que ya existían
+    inspector = inspect(conn)
+    for tabla in Base.metadata.sorted_tables:
+        if not inspector.has_table(tabla.name):
+            continue
+        existentes = {c["name"] for c in inspector.get_columns(tabla.name)}
+        for columna in tabla.columns:
+            if columna.name not in existentes and columna.nullable:
+                print(f"➕ Agregando columna {tabla.name}.{columna.name}...")
+                definicion = CreateColumn(columna).compile(dialect=conn.dialect)
+                conn.execute(text(f"ALTER TABLE {tabla.name} ADD COLUMN {definicion}"))
+
+def asegurar_indices_y_restricciones():
+    # create_all() no toca tablas que ya existen: agregamos a mano columnas, índices y restricciones nuevas
+    with engine.begin() as conn:
+        agregar_columnas_faltantes(conn)
+        # Clientes anteriores a telefono_normalizado: se completa (y se unifican duplicados)
+        # antes de crear el índice único nuevo; el índice viejo era sobre el teléfono sin normalizar
+        if telefonos.completar_telefonos_normalizados(conn):
+            print("📞 Teléfonos de clientes normalizados")
+        conn.execute(text("DROP INDEX IF EXISTS uq_clientes_negocio_telefono"))
+        if conn.dialect.name == "postgresql":
+            conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+        for tabla in Base.metadata.sorted_tables:
+            for indice in tabla.indexes:
+                indice.create(bind=conn, checkfirst=True)
+
+        if conn.dialect.name == "postgresql":
+            conn.execute(text("CREATE EXTENSION IF NOT EXISTS btree_gist"))
+            if particiones.es_particionada(conn):
+                # Particiones del mes actual en adelante (cada una con su restricción anti-solapamiento)
+                particiones.asegurar_particiones(conn)
+            else:
+                # Tabla creada antes de particionar: mantenemos la restricción en la tabla entera
+                existentes = set(conn.execute(text(
+                    "SELECT conname FROM pg_constraint WHERE conrelid = 'turnos'::regclass"
+                )).scalars())
+                if "excl_turnos_solapados" not in existentes:
+                    print("🔒 Agregando restricción anti-solapamiento de turnos...")
+                    conn.execute(text(
+                        f"ALTER TABLE turnos ADD CONSTRAINT excl_turnos_solapados {models.EXCLUSION_SOLAPAMIENTO_SQL}"
+                    ))
+                print("ℹ La tabla turnos no está particionada: corré 'python particiones.py migrar' para particionarla por mes.")
+        elif conn.dialect.name == "sqlite":
+            for sql in models.TRIGGERS_SOLAPAMIENTO_SQLITE:
+                conn.execute(DDL(sql))
 
 def inicializar_sistema():
     print("🏗️ Creando tablas en Neon Postgres...")
     # Esto crea las tablas si no existen
     Base.metadata.create_all(bind=engine)
+    asegurar_indices_y_restricciones()
     
     db = SessionLocal()
     
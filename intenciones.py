@@ -0,0 +1,149 @@
+import re
+from types import MappingProxyType
+from collections import namedtuple
+
+# --- ROUTER DE INTENCIONES DEL BOT ---
+# Tres niveles, todos armados una sola vez al importar:
+#   1) diccionario de mensajes exactos ("hola", "servicios", "mis reservas", "2"...): la mayoría del tráfico, O(1)
+#   2) expresiones regulares ancladas al inicio y al final para las formas con fecha/hora o número.
+#      Sólo se prueban si el mensaje empieza con un dígito.
+#   3) fechas/horas mal escritas y, si no, una sola pasada por las palabras del mensaje buscando
+#      cada una en un diccionario de palabras clave (saludos, "servicios", "mis reservas").
+#      Gana la intención de mayor prioridad que aparezca en cualquier parte del mensaje.
+
+SALUDOS = ["hola", "buenas", "buen dia", "buen día", "buenos dias", "buenos días", "buenas tardes",
+           "buenas noches", "que tal", "qué tal", "como le va", "cómo le va", "mbaeteko", "hi", "inicio", "menu", "menú"]
+
+# Mensajes que son sólo un comando del menú (texto completo, en minúsculas).
+# Los números solos van por la regla "opcion": su significado depende de la sesión.
+COMANDOS = {
+    "servicios": ["1️⃣", "servicios", "ver servicios"],
+    "mis_reservas": ["2️⃣", "reservas", "mis reservas"],
+    "saludo": SALUDOS,
+}
+
+# (nombre, patrón) para las formas con fecha/hora o número: el mensaje entero, en este orden
+REGLAS = [
+    # "1 2026-02-28 10:00" => servicio, fecha y hora
+    ("reserva", r"(?P<servicio_id>\d+)\s+(?P<fecha>\d{4}-\d{1,2}-\d{1,2})\s+(?P<hora>\d{1,2}:\d{2})$"),
+    # Un número solo: opción del menú, servicio de la lista o horario ofrecido (depende de la sesión)
+    ("opcion", r"(?P<numero>\d{1,4})[.!?]*$"),
+    # Sólo hora (o fecha y hora) para el servicio ya elegido: "10:30", "10:30hs", "2026-02-28 10:30"
+    # (sin fecha, fecha_sola llega en None)
+    ("horario", r"(?:(?P<fecha_sola>\d{4}-\d{1,2}-\d{1,2})\s+)?(?P<hora_sola>\d{1,2}:\d{2})\s*(?:hs?)?[.!?]*$"),
+]
+
+# Si no es ninguna de las anteriores: palabras clave en cualquier parte del mensaje, como palabra
+# completa ("hi" no es "chicos"), en orden de prioridad como la cadena de if/elif de antes del router
+RESERVA_INVALIDA = "reserva_invalida"  # tiene una fecha o una hora pero no respeta el formato
+PALABRAS_CLAVE = [
+    ("saludo", SALUDOS),
+    ("servicios", ["servicios"]),  # "servicios por favor", "quiero ver los servicios"
+    ("mis_reservas", ["mis reservas"]),
+]
+
+DESCONOCIDO = "desconocido"
+# Espacios y signos de los extremos que no cambian el comando: "Hola!" es "hola"
+_SIGNOS = " \t\r\n.,;!?¡¿"
+
+Intencion = namedtuple("Intencion", ["nombre", "datos"])
+
+def compilar(reglas):
+    return [(nombre, re.compile(patron, re.DOTALL)) for nombre, patron in reglas]
+
+# Signos que pueden venir pegados a una palabra clave ("hola,", "¿servicios?"): sus variantes van
+# al índice al importar, así alcanza con str.split() y no hay que limpiar palabra por palabra
+_PEGADOS = [("", s) for s in ("", ".", ",", ";", ":", "!", "?", "!!", "??", "...")] + \
+           [("¿", "?"), ("¡", "!"), ("¿", ""), ("¡", "")]
+
+def variantes(palabra):
+    return frozenset(antes + palabra + despues for antes, despues in _PEGADOS)
+
+# palabra (con sus variantes) -> [(variantes de cada palabra que sigue, prioridad)]
+# "buenas" y "buenas tardes" comparten entrada; "buen día" y "buen dia" son una sola
+def indexar_palabras(palabras_clave):
+    indice = {}
+    for prioridad, (_, frases) in enumerate(palabras_clave):
+        for frase in frases:
+            primera, *resto = frase.split()
+            resto = tuple(map(variantes, resto))
+            for variante in variantes(primera):
+                entradas = indice.setdefault(variante, [])
+                igual = next((n for n, (r, p) in enumerate(entradas) if p == prioridad and len(r) == len(resto)), None)
+                if igual is None:
+                    entradas.append((resto, prioridad))
+                else:
+                    entradas[igual] = (tuple(map(frozenset.union, entradas[igual][0], resto)), prioridad)
+    return indice
+
+_PATRONES = compilar(REGLAS)
+_INDICE = indexar_palabras(PALABRAS_CLAVE)
+_CLAVES = frozenset(_INDICE)
+_SIN_CLAVE = len(PALABRAS_CLAVE)
+# Las intenciones sin datos se arman una vez (crear la namedtuple cuesta más que clasificar)
+_SIN_DATOS = {nombre: Intencion(nombre, MappingProxyType({}))
+              for nombre in [*COMANDOS, RESERVA_INVALIDA, *(n for n, _ in PALABRAS_CLAVE), DESCONOCIDO]}
+# Mensaje completo -> intención ya armada. Los números chicos ("1", "2": la respuesta más común
+# en un menú) también, con el mismo resultado que daría la regla "opcion".
+_EXACTOS = {texto: _SIN_DATOS[nombre] for nombre, textos in COMANDOS.items() for texto in textos}
+_EXACTOS.update({str(n): Intencion("opcion", MappingProxyType({"numero": str(n)})) for n in range(100)})
+# Fecha u hora con otro formato ("28/02", "10-30", "a las 10:00"): sólo se busca si hay "-", "/" o ":"
+_FECHA_HORA = re.compile(r"\d(?:\s*[-/]\s*\d|:\d\d)")
+
+# Una sola pasada: split() y la intersección con las claves corren en C; en Python sólo se
+# recorren las palabras clave que aparecieron (las frases miran además las palabras siguientes)
+def _por_palabras(texto):
+    if ("-" in texto or "/" in texto or ":" in texto) and _FECHA_HORA.search(texto):
+        return RESERVA_INVALIDA  # la de mayor prioridad
+    palabras = texto.split()
+    if _CLAVES.isdisjoint(palabras):  # lo más común: no arma ningún conjunto
+        return DESCONOCIDO
+    mejor = _SIN_CLAVE
+    for clave in _CLAVES.intersection(palabras):
+        for resto, prioridad in _INDICE[clave]:
+            if prioridad < mejor and (not resto or _sigue(palabras, clave, resto)):
+                mejor = prioridad
+    return PALABRAS_CLAVE[mejor][0] if mejor < _SIN_CLAVE else DESCONOCIDO
+
+# ¿Alguna aparición de la primera palabra va seguida del resto de la frase?
+def _sigue(palabras, clave, resto):
+    i = palabras.index(clave)
+    while True:
+        siguientes = palabras[i + 1:i + 1 + len(resto)]
+        if len(siguientes) == len(resto) and all(map(frozenset.__contains__, resto, siguientes)):
+            return True
+        try:
+            i = palabras.index(clave, i + 1)
+        except ValueError:
+            return False
+
+# 1. Clasificar: primero el diccionario, después las reglas ancladas y por último las palabras
+def clasificar(texto: str) -> Intencion:
+    texto = texto.lower().strip(_SIGNOS)
+    exacta = _EXACTOS.get(texto)
+    if exacta:
+        return exacta
+    # Las reglas ancladas empiezan todas con un dígito
+    if texto[:1].isdigit():
+        for nombre, patron in _PATRONES:
+            m = patron.match(texto)
+            if m:
+                return Intencion(nombre, m.groupdict())
+    return _SIN_DATOS[_por_palabras(texto)]
+
+# 2. Registro de manejadores: cada intención apunta a una corrutina
+class Router:
+    def __init__(self):
+        self._manejadores = {}
+
+    def manejador(self, *nombres):
+        def registrar(funcion):
+            for nombre in nombres:
+                self._manejadores[nombre] = funcion
+            return funcion
+        return registrar
+
+    async def despachar(self, ctx, texto: str):
+        intencion = clasificar(texto)
+        funcion = self._manejadores.get(intencion.nombre) or self._manejadores[DESCONOCIDO]
+        return await funcion(ctx, intencion.datos)
@@ -1,45 +1,314 @@
-from fastapi import FastAPI, Depends, HTTPException, Form, Request
-from fastapi.responses import Response
+from fastapi import FastAPI, Depends, HTTPException, Form, Request, Query
+from fastapi.responses import Response, StreamingResponse
 from sqlalchemy.orm import Session
-from typing import List
-from datetime import datetime
-from database import get_db
-import models, schemas, crud
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional, Literal
+from datetime import datetime, date
+from database import get_db, get_async_db
+from tenants import negocio_actual
+from telefonos import normalizar_telefono
+import asyncio
+import bisect
+import database, models, schemas, crud, disponibilidad, catalogo, idempotencia, bot, tenants, particiones, observabilidad
+from bitacora import bitacora
+
+# Máximo de días que se pueden pedir de una sola vez en /disponibilidad/
+MAX_DIAS_DISPONIBILIDAD = 31
+# Tope de turnos por llamada a /reservar/lote
+MAX_TURNOS_LOTE = 2000
+# Filas por tanda al transmitir un listado completo en NDJSON
+LOTE_NDJSON = 500
 
 app = FastAPI(title="Barbería API", version="1.0")
+# Latencia, códigos de estado y tiempo en la base por ruta (se leen en /metrics)
+app.add_middleware(observabilidad.MiddlewareMetricas)
+
+# --- ARRANQUE: calentamos el pool (DB_POOL_WARMUP), arrancamos la bitácora, limpiamos MessageSid viejos
+# y dejamos creadas las particiones mensuales de turnos que vienen (Postgres) ---
+@app.on_event("startup")
+async def calentar_conexiones():
+    await database.calentar_pool()
+    bitacora.iniciar()
+    async with database.AsyncSessionLocal() as db:
+        await idempotencia.purgar_antiguos(db)
+    if not database.ES_SQLITE:
+        await asyncio.to_thread(particiones.asegurar_particiones)
+    observabilidad.marcar_arranque()
+
+# --- APAGADO: guardamos lo que quedó en la cola de la bitácora de WhatsApp ---
+@app.on_event("shutdown")
+async def vaciar_bitacora():
+    await bitacora.detener()
 
 # --- RUTA DE INICIO ---
 @app.get("/")
 def read_root():
     return {"mensaje": "API de Reservas Funcionando 🚀"}
 
+# --- SALUD: uso y espera del pool de conexiones (para dimensionar DB_POOL_SIZE) ---
+@app.get("/salud/pool")
+def estado_pool():
+    return database.estadisticas_pool()
+
+# --- MÉTRICAS en formato Prometheus (por proceso: cada worker expone las suyas) ---
+@app.get("/metrics", include_in_schema=False)
+def metricas():
+    return Response(observabilidad.exponer(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
 # --- RUTAS DE CONSULTA (GET) ---
 
-# 1. Listar Servicios
+# Respuesta de catálogo con ETag: si el cliente ya tiene esta versión, 304 sin cuerpo
+def responder_catalogo(request: Request, response: Response, items, etag):
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers={"ETag": etag})
+    response.headers["ETag"] = etag
+    return items
+
+# --- LISTADOS PAGINADOS ---
+# Paginación por id (keyset): "cursor" es el id del último elemento recibido y el cursor de la
+# página siguiente viaja en el header X-Siguiente-Cursor (no hay header => no hay más).
+# Con formato=ndjson se manda todo lo que sigue al cursor, un objeto JSON por línea, a medida que se lee.
+def pagina_por_id(items, response: Response, cursor: Optional[int], limite: int):
+    inicio = bisect.bisect_right(items, cursor, key=lambda i: i.id) if cursor else 0
+    pagina = items[inicio:inicio + limite]
+    if inicio + limite < len(items):
+        response.headers["X-Siguiente-Cursor"] = str(pagina[-1].id)
+    return pagina
+
+def respuesta_ndjson(items, esquema):
+    def lineas():
+        lote = []
+        for item in items:
+            lote.append(esquema.model_validate(item).model_dump_json())
+            if len(lote) == LOTE_NDJSON:
+                yield "\n".join(lote) + "\n"
+                lote = []
+        if lote:
+            yield "\n".join(lote) + "\n"
+    return StreamingResponse(lineas(), media_type="application/x-ndjson")
+
+# Los turnos que llegan por la API son del negocio del pedido, con barbero y servicio de ese negocio
+# (se valida contra el catálogo en memoria, sin consultas)
+def del_negocio(db: Session, negocio_id: int, datos):
+    servicios, _ = catalogo.servicios.obtener(db, negocio_id)
+    staff, _ = catalogo.staff.obtener(db, negocio_id)
+    if datos.servicio_id not in {s.id for s in servicios}:
+        raise HTTPException(status_code=404, detail="Servicio no encontrado")
+    if datos.staff_id not in {b.id for b in staff}:
+        raise HTTPException(status_code=404, detail="Barbero no encontrado")
+    return datos.model_copy(update={"negocio_id": negocio_id})
+
+# 1. Listar Servicios (sale del catálogo en memoria; se pagina sobre esa lista ordenada por id)
 @app.get("/servicios/", response_model=List[schemas.Servicio])
-def listar_servicios(db: Session = Depends(get_db)):
-    return db.query(models.Servicio).filter(models.Servicio.activo == True).all()
+def listar_servicios(
+    request: Request, response: Response,
+    negocio_id: int = Depends(negocio_actual),
+    cursor: Optional[int] = None,
+    limite: int = Query(100, ge=1, le=1000),
+    formato: Literal["json", "ndjson"] = "json",
+    db: Session = Depends(get_db)
+):
+    servicios, etag = catalogo.servicios.obtener(db, negocio_id)
+    if formato == "ndjson":
+        return respuesta_ndjson(pagina_por_id(servicios, response, cursor, len(servicios)), schemas.Servicio)
+    return responder_catalogo(request, response, pagina_por_id(servicios, response, cursor, limite), etag)
 
 # 2. Listar Barberos
 @app.get("/staff/", response_model=List[schemas.Staff])
-def listar_staff(db: Session = Depends(get_db)):
-    return db.query(models.Staff).filter(models.Staff.activo == True).all()
+def listar_staff(
+    request: Request, response: Response,
+    negocio_id: int = Depends(negocio_actual),
+    cursor: Optional[int] = None,
+    limite: int = Query(100, ge=1, le=1000),
+    formato: Literal["json", "ndjson"] = "json",
+    db: Session = Depends(get_db)
+):
+    staff, etag = catalogo.staff.obtener(db, negocio_id)
+    if formato == "ndjson":
+        return respuesta_ndjson(pagina_por_id(staff, response, cursor, len(staff)), schemas.Staff)
+    return responder_catalogo(request, response, pagina_por_id(staff, response, cursor, limite), etag)
+
+# 2b. Disponibilidad de varios barberos y días en una sola llamada
+@app.get("/disponibilidad/", response_model=List[schemas.DisponibilidadStaffDia])
+def consultar_disponibilidad(
+    servicio_id: int,
+    desde: date,
+    hasta: date,
+    staff_ids: Optional[List[int]] = Query(None),
+    negocio_id: int = Depends(negocio_actual),
+    db: Session = Depends(get_db)
+):
+    if hasta < desde:
+        raise HTTPException(status_code=400, detail="La fecha 'hasta' no puede ser anterior a 'desde'")
+    if (hasta - desde).days + 1 > MAX_DIAS_DISPONIBILIDAD:
+        raise HTTPException(status_code=400, detail=f"Máximo {MAX_DIAS_DISPONIBILIDAD} días por consulta")
+
+    servicio = db.query(models.Servicio).filter(
+        models.Servicio.id == servicio_id,
+        models.Servicio.negocio_id == negocio_id
+    ).first()
+    if servicio is None:
+        raise HTTPException(status_code=404, detail="Servicio no encontrado")
+
+    consulta_staff = db.query(models.Staff.id, models.Staff.nombre).filter(
+        models.Staff.negocio_id == negocio_id,
+        models.Staff.activo == True
+    )
+    if staff_ids:
+        consulta_staff = consulta_staff.filter(models.Staff.id.in_(staff_ids))
+    nombres = dict(consulta_staff.order_by(models.Staff.id).all())
+
+    # Una sola consulta de turnos para todo el rango y todos los barberos
+    lote = disponibilidad.disponibilidad_por_lote(db, list(nombres), desde, hasta, servicio.duracion_minutos)
+    return [
+        schemas.DisponibilidadStaffDia(
+            staff_id=staff_id,
+            staff_nombre=nombres[staff_id],
+            fecha=dia,
+            horarios=[b.strftime("%H:%M") for b in bloques]
+        )
+        for staff_id, dia, bloques in lote
+    ]
+
+# 2c. Listado de turnos para el admin (filtros + paginación por cursor)
+@app.get("/turnos/", response_model=schemas.PaginaTurnos)
+def listar_turnos(
+    negocio_id: int = Depends(negocio_actual),
+    desde: Optional[datetime] = None,
+    hasta: Optional[datetime] = None,
+    estado: Optional[List[str]] = Query(None),
+    staff_id: Optional[int] = None,
+    cursor: Optional[str] = None,
+    limite: int = Query(50, ge=1, le=500),
+    db: Session = Depends(get_db)
+):
+    try:
+        turnos, siguiente = crud.listar_turnos(db, negocio_id, desde, hasta, estado, staff_id, cursor, limite)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"items": turnos, "siguiente_cursor": siguiente}
+
+# 2c-bis. Turnos archivados en Parquet (meses más viejos que ARCHIVO_MESES), misma paginación que /turnos/
+@app.get("/turnos/archivo", response_model=schemas.PaginaTurnos)
+def listar_turnos_archivados(
+    negocio_id: int = Depends(negocio_actual),
+    desde: Optional[datetime] = None,
+    hasta: Optional[datetime] = None,
+    cursor: Optional[str] = None,
+    limite: int = Query(50, ge=1, le=500)
+):
+    try:
+        turnos, siguiente = particiones.leer_archivo(negocio_id, desde, hasta, cursor, limite)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except RuntimeError as e:
+        raise HTTPException(status_code=501, detail=str(e))
+    return {"items": turnos, "siguiente_cursor": siguiente}
+
+# 2d. Métricas del dashboard calculadas en la base
+@app.get("/metricas/", response_model=schemas.ResumenMetricas)
+def obtener_metricas(
+    negocio_id: int = Depends(negocio_actual),
+    desde: Optional[datetime] = None,
+    hasta: Optional[datetime] = None,
+    agrupar: Optional[Literal["staff", "servicio"]] = None,
+    db: Session = Depends(get_db)
+):
+    return crud.metricas_turnos(db, negocio_id, desde, hasta, agrupar)
 
 # --- RUTAS DE ACCIÓN (POST) - ADMIN ---
 
 # 3. CREAR UNA RESERVA (Vía API/Web)
 @app.post("/reservar/", response_model=schemas.Turno)
-def crear_reserva(turno: schemas.TurnoCreate, db: Session = Depends(get_db)):
+def crear_reserva(turno: schemas.TurnoCreate, negocio_id: int = Depends(negocio_actual), db: Session = Depends(get_db)):
+    turno = del_negocio(db, negocio_id, turno)
     resultado = crud.create_turno(db=db, turno=turno)
     if resultado is None:
-        raise HTTPException(status_code=400, detail="❌ Lo sentimos, ese horario ya está ocupado.")
+        # Conflicto con otro turno (o una serie) ya guardado: el mismo código que el resto de los choques
+        raise HTTPException(status_code=409, detail="❌ Lo sentimos, ese horario ya está ocupado.")
     return resultado
 
+# 3a. CONFIRMAR / CANCELAR UN TURNO (panel). Con negocio y fecha de inicio en el filtro: no toca
+# turnos de otra barbería y la búsqueda por la clave (id, fecha_hora_inicio) va a una sola partición
+@app.patch("/turnos/{turno_id}", response_model=schemas.Turno)
+def cambiar_estado_turno(turno_id: int, cambio: schemas.TurnoEstado, negocio_id: int = Depends(negocio_actual), db: Session = Depends(get_db)):
+    db_turno = db.query(models.Turno).filter(
+        models.Turno.id == turno_id,
+        models.Turno.negocio_id == negocio_id,
+        models.Turno.fecha_hora_inicio == cambio.fecha_hora_inicio
+    ).first()
+    if db_turno is None:
+        raise HTTPException(status_code=404, detail="Turno no encontrado")
+    ocupado = HTTPException(status_code=409, detail="❌ Ese horario ya lo ocupa otro turno.")
+    # Reactivar un cancelado vuelve a ocupar el horario: las series no están en la restricción de la base
+    if (cambio.estado in models.ESTADOS_ACTIVOS and db_turno.estado not in models.ESTADOS_ACTIVOS
+            and crud.choca_con_series(db, db_turno.staff_id, db_turno.fecha_hora_inicio, db_turno.fecha_hora_fin)):
+        raise ocupado
+    db_turno.estado = cambio.estado
+    try:
+        db.commit()
+    except IntegrityError as e:
+        db.rollback()
+        if crud.es_turno_solapado(e):
+            raise ocupado
+        raise
+    db.refresh(db_turno)
+    return db_turno
+
+# 3b. CREAR MUCHAS RESERVAS (importar una agenda en papel o la semana de un barbero)
+@app.post("/reservar/lote", response_model=schemas.ResultadoLote)
+def crear_reservas_lote(lote: schemas.LoteTurnos, negocio_id: int = Depends(negocio_actual), db: Session = Depends(get_db)):
+    if len(lote.turnos) > MAX_TURNOS_LOTE:
+        raise HTTPException(status_code=400, detail=f"Máximo {MAX_TURNOS_LOTE} turnos por lote")
+    # Servicio y barbero se validan ítem por ítem en crud: uno ajeno al negocio se rechaza solo
+    turnos = [t.model_copy(update={"negocio_id": negocio_id}) for t in lote.turnos]
+    try:
+        items = crud.create_turnos_lote(db, turnos)
+    except IntegrityError:
+        raise HTTPException(status_code=409, detail="Otro turno ocupó uno de estos horarios mientras se guardaba el lote. Vuelve a enviarlo.")
+    aceptados = sum(1 for i in items if i.aceptado)
+    return schemas.ResultadoLote(aceptados=aceptados, rechazados=len(items) - aceptados, items=items)
+
+# 3c. TURNOS RECURRENTES (el cliente que viene todas las semanas)
+@app.post("/series/", response_model=schemas.Serie)
+def crear_serie(datos: schemas.SerieCreate, negocio_id: int = Depends(negocio_actual), db: Session = Depends(get_db)):
+    datos = del_negocio(db, negocio_id, datos)
+    try:
+        serie, choques = crud.create_serie(db, datos)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if serie is None:
+        fechas = ", ".join(f.strftime("%d/%m/%Y") for f in choques[:10])
+        raise HTTPException(status_code=409, detail=f"❌ La serie choca con la agenda en: {fechas}")
+    return serie
+
+# Saltar una fecha puntual de la serie (ej: el cliente avisa que esa semana no viene)
+@app.post("/series/{serie_id}/excepciones")
+def agregar_excepcion_serie(serie_id: int, excepcion: schemas.ExcepcionSerieCreate, negocio_id: int = Depends(negocio_actual), db: Session = Depends(get_db)):
+    db_serie = db.query(models.SerieTurno).filter(models.SerieTurno.id == serie_id, models.SerieTurno.negocio_id == negocio_id).first()
+    if db_serie is None:
+        raise HTTPException(status_code=404, detail="Serie no encontrada")
+    if excepcion.fecha not in {e.fecha for e in db_serie.excepciones}:
+        db_serie.excepciones.append(models.ExcepcionSerie(fecha=excepcion.fecha))
+        db.commit()
+    return {"mensaje": "Fecha liberada"}
+
+# Terminar una serie (no se borra para conservar el historial)
+@app.delete("/series/{serie_id}")
+def eliminar_serie(serie_id: int, negocio_id: int = Depends(negocio_actual), db: Session = Depends(get_db)):
+    db_serie = db.query(models.SerieTurno).filter(models.SerieTurno.id == serie_id, models.SerieTurno.negocio_id == negocio_id).first()
+    if db_serie is None:
+        raise HTTPException(status_code=404, detail="Serie no encontrada")
+    db_serie.activa = False
+    db.commit()
+    return {"mensaje": "Serie finalizada"}
+
 # 4. CREAR SERVICIO
 @app.post("/servicios/", response_model=schemas.Servicio)
-def crear_servicio(servicio: schemas.ServicioCreate, db: Session = Depends(get_db)):
+def crear_servicio(servicio: schemas.ServicioCreate, negocio_id: int = Depends(negocio_actual), db: Session = Depends(get_db)):
     nuevo_servicio = models.Servicio(
-        negocio_id=1,
+        negocio_id=negocio_id,
         nombre=servicio.nombre,
         duracion_minutos=servicio.duracion_minutos,
         precio=servicio.precio,
@@ -48,13 +317,14 @@ def crear_servicio(servicio: schemas.ServicioCreate, db: Session = Depends(get_d
     db.add(nuevo_servicio)
     db.commit()
     db.refresh(nuevo_servicio)
+    catalogo.servicios.invalidar(nuevo_servicio.negocio_id)
     return nuevo_servicio
 
 # 5. CREAR STAFF
 @app.post("/staff/", response_model=schemas.Staff)
-def crear_staff(staff: schemas.StaffCreate, db: Session = Depends(get_db)):
+def crear_staff(staff: schemas.StaffCreate, negocio_id: int = Depends(negocio_actual), db: Session = Depends(get_db)):
     nuevo_staff = models.Staff(
-        negocio_id=1,
+        negocio_id=negocio_id,
         nombre=staff.nombre,
         telefono=staff.telefono,
         activo=True
@@ -62,6 +332,7 @@ def crear_staff(staff: schemas.StaffCreate, db: Session = Depends(get_db)):
     db.add(nuevo_staff)
     db.commit()
     db.refresh(nuevo_staff)
+    catalogo.staff.invalidar(nuevo_staff.negocio_id)
     return nuevo_staff
 
 # --- WHATSAPP (WEBHOOK REAL PARA TWILIO) ---
@@ -73,108 +344,38 @@ async def recibir_mensaje(
     request: Request,
     Body: str = Form(...),
     From: str = Form(...),
-    db: Session = Depends(get_db)
+    To: Optional[str] = Form(None),
+    MessageSid: Optional[str] = Form(None),
+    db: AsyncSession = Depends(get_async_db)
 ):
     telefono = From.replace("whatsapp:", "")
-    texto_usuario = Body.lower().strip()
-    cliente = crud.get_or_create_cliente(db, telefono)
-    
-    # 1. PRIORITY CHECK: ¿Está intentando reservar? (Detectamos formato "ID FECHA")
-    if "-" in texto_usuario and ":" in texto_usuario:
-        try:
-            # Esperamos algo como: "1 2026-02-28 10:00"
-            partes = texto_usuario.split(" ", 1)
-            
-            if len(partes) < 2:
-                raise ValueError("Faltan datos")
-                
-            servicio_id_elegido = int(partes[0])
-            fecha_texto = partes[1].strip()
-            
-            fecha_obj = datetime.strptime(fecha_texto, "%Y-%m-%d %H:%M")
-            
-            # Intentamos crear el turno (Staff ID 1 por defecto)
-            turno_nuevo = schemas.TurnoCreate(
-                negocio_id=1,
-                staff_id=1, 
-                servicio_id=servicio_id_elegido,
-                telefono_cliente=telefono,
-                nombre_cliente=cliente.nombre,
-                fecha_hora_inicio=fecha_obj
-            )
-            
-            resultado = crud.create_turno(db, turno_nuevo)
-            
-            if resultado:
-                # Obtenemos los nombres reales para la respuesta
-                nom_servicio = resultado.servicio.nombre 
-                nom_barbero = resultado.staff.nombre # <--- ¡AQUÍ RESCATAMOS AL BARBERO! 💈
-                
-                respuesta = f"✅ *¡Reserva Confirmada!*\n\n" \
-                            f"🗓 {fecha_texto}\n" \
-                            f"✂ {nom_servicio}\n" \
-                            f"💈 Profesional: {nom_barbero}\n\n" \
-                            f"Te esperamos."
-            else:
-                respuesta = "❌ Ese horario ya está ocupado. Por favor elige otro."
-                
-        except ValueError:
-            respuesta = "⚠ *Formato incorrecto.*\nPara reservar envía: ID FECHA HORA\nEjemplo: 1 2026-02-28 10:00"
-        except Exception as e:
-            respuesta = f"⚠ Error interno: {str(e)}"
-
-    # 2. MENÚ: Saludo
-    elif any(x in texto_usuario for x in ["hola", "buenas", "que tal", "qué tal", "como le va", "mbaeteko", "hi", "inicio"]):
-        respuesta = f"¡Hola {cliente.nombre}! 👋 Bienvenido.\n" \
-                    f"1️⃣ Ver Servicios\n" \
-                    f"2️⃣ Mis Reservas"
-
-    # 3. MENÚ: Servicios
-    elif "1" in texto_usuario or "servicios" in texto_usuario:
-        servicios = db.query(models.Servicio).filter(models.Servicio.activo == True).all()
-        lista_texto = ""
-        for s in servicios:
-            lista_texto += f"[{s.id}] *{s.nombre}*: {int(s.precio)} Gs ({s.duracion_minutos} min)\n"
-            
-        respuesta = f"✂ *NUESTROS SERVICIOS*\n\n{lista_texto}\n" \
-                    f"📢 *Para reservar, envía el número del servicio y la fecha.*\n" \
-                    f"Ejemplo: *1 2026-02-28 10:00*"
-    
-    # 4. MENÚ: Mis Reservas
-    elif "2" in texto_usuario or "mis reservas" in texto_usuario:
-        # Lógica simple para ver reservas futuras del cliente
-        turnos_cliente = db.query(models.Turno).filter(
-            models.Turno.cliente_id == cliente.id,
-            models.Turno.estado == "confirmado"
-        ).all()
-        
-        if turnos_cliente:
-            respuesta = "📂 *Tus Reservas Futuras:*\n"
-            for t in turnos_cliente:
-                respuesta += f"- {t.fecha_hora_inicio.strftime('%d/%m %H:%M')} ({t.servicio.nombre})\n"
-        else:
-            respuesta = "📂 No tienes reservas pendientes."
-
-    else:
-        # Solo responde el error si el mensaje parece un intento de comando fallido
-        # Pero si es una charla normal, tratamos de ignorar o ser sutiles.
-        
-        # Para este MVP, te sugiero dejarlo así o poner:
-        respuesta = "🤖 Soy el asistente virtual. Para reservar usa el menú di 'Hola'.\nSi estás hablando con el barbero, espera un momento y te responderá."
-
-    # RESPUESTA TWILIO
-    xml_response = f"""<?xml version="1.0" encoding="UTF-8"?>
+
+    async def procesar():
+        # El negocio sale del número al que escribieron (en caché: casi nunca consulta)
+        negocio_id = await tenants.negocio_por_whatsapp(db, To)
+        if negocio_id is None:
+            return idempotencia.TWIML_VACIO
+        respuesta, error_log = await bot.responder_mensaje(db, Body, telefono, negocio_id)
+        # Auditoría: se encola y se guarda en lote en segundo plano (no suma latencia)
+        bitacora.registrar(negocio_id, telefono, Body, respuesta, error_log)
+        return armar_twiml(respuesta)
+
+    # Si Twilio reintenta (mismo MessageSid) devolvemos la respuesta original sin reprocesar
+    xml_response, _ = await idempotencia.atender_una_vez(db, MessageSid, procesar)
+    return Response(content=xml_response, media_type="application/xml")
+
+def armar_twiml(respuesta):
+    return f"""<?xml version="1.0" encoding="UTF-8"?>
     <Response>
         <Message>{respuesta}</Message>
     </Response>"""
-    return Response(content=xml_response, media_type="application/xml")
 
     # --- EN MAIN.PY (Agregar al final) ---
 
 # 6. ACTUALIZAR SERVICIO (PUT)
 @app.put("/servicios/{servicio_id}")
-def actualizar_servicio(servicio_id: int, servicio_actualizado: schemas.ServicioCreate, db: Session = Depends(get_db)):
-    db_servicio = db.query(models.Servicio).filter(models.Servicio.id == servicio_id).first()
+def actualizar_servicio(servicio_id: int, servicio_actualizado: schemas.ServicioCreate, negocio_id: int = Depends(negocio_actual), db: Session = Depends(get_db)):
+    db_servicio = db.query(models.Servicio).filter(models.Servicio.id == servicio_id, models.Servicio.negocio_id == negocio_id).first()
     
     if db_servicio is None:
         raise HTTPException(status_code=404, detail="Servicio no encontrado")
@@ -186,12 +387,13 @@ def actualizar_servicio(servicio_id: int, servicio_actualizado: schemas.Servicio
     
     db.commit()
     db.refresh(db_servicio)
+    catalogo.servicios.invalidar(db_servicio.negocio_id)
     return db_servicio
 
 # 7. ELIMINAR SERVICIO (DELETE)
 @app.delete("/servicios/{servicio_id}")
-def eliminar_servicio(servicio_id: int, db: Session = Depends(get_db)):
-    db_servicio = db.query(models.Servicio).filter(models.Servicio.id == servicio_id).first()
+def eliminar_servicio(servicio_id: int, negocio_id: int = Depends(negocio_actual), db: Session = Depends(get_db)):
+    db_servicio = db.query(models.Servicio).filter(models.Servicio.id == servicio_id, models.Servicio.negocio_id == negocio_id).first()
     
     if db_servicio is None:
         raise HTTPException(status_code=404, detail="Servicio no encontrado")
@@ -200,6 +402,7 @@ def eliminar_servicio(servicio_id: int, db: Session = Depends(get_db)):
     # Pero como es un MVP y queremos borrar el error del precio, lo borramos de verdad:
     db.delete(db_servicio)
     db.commit()
+    catalogo.servicios.invalidar(db_servicio.negocio_id)
     return {"mensaje": "Servicio eliminado"}
 
 
@@ -207,8 +410,8 @@ def eliminar_servicio(servicio_id: int, db: Session = Depends(get_db)):
 
 # 8. ACTUALIZAR STAFF (PUT)
 @app.put("/staff/{staff_id}")
-def actualizar_staff(staff_id: int, staff_actualizado: schemas.StaffCreate, db: Session = Depends(get_db)):
-    db_staff = db.query(models.Staff).filter(models.Staff.id == staff_id).first()
+def actualizar_staff(staff_id: int, staff_actualizado: schemas.StaffCreate, negocio_id: int = Depends(negocio_actual), db: Session = Depends(get_db)):
+    db_staff = db.query(models.Staff).filter(models.Staff.id == staff_id, models.Staff.negocio_id == negocio_id).first()
     
     if db_staff is None:
         raise HTTPException(status_code=404, detail="Staff no encontrado")
@@ -219,12 +422,13 @@ def actualizar_staff(staff_id: int, staff_actualizado: schemas.StaffCreate, db:
     
     db.commit()
     db.refresh(db_staff)
+    catalogo.staff.invalidar(db_staff.negocio_id)
     return db_staff
 
 # 9. ELIMINAR STAFF (DELETE)
 @app.delete("/staff/{staff_id}")
-def eliminar_staff(staff_id: int, db: Session = Depends(get_db)):
-    db_staff = db.query(models.Staff).filter(models.Staff.id == staff_id).first()
+def eliminar_staff(staff_id: int, negocio_id: int = Depends(negocio_actual), db: Session = Depends(get_db)):
+    db_staff = db.query(models.Staff).filter(models.Staff.id == staff_id, models.Staff.negocio_id == negocio_id).first()
     
     if db_staff is None:
         raise HTTPException(status_code=404, detail="Staff no encontrado")
@@ -232,26 +436,76 @@ def eliminar_staff(staff_id: int, db: Session = Depends(get_db)):
     # Borrado físico
     db.delete(db_staff)
     db.commit()
+    catalogo.staff.invalidar(db_staff.negocio_id)
     return {"mensaje": "Staff eliminado"}
 
 # --- EN MAIN.PY (Agregar al final) ---
 
-# 10. LISTAR CLIENTES
+# 10. LISTAR CLIENTES (keyset sobre el índice (negocio_id, id): cada página cuesta lo mismo)
 @app.get("/clientes/", response_model=List[schemas.Cliente])
-def listar_clientes(db: Session = Depends(get_db)):
-    return db.query(models.Cliente).all()
+def listar_clientes(
+    response: Response,
+    negocio_id: int = Depends(negocio_actual),
+    cursor: Optional[int] = None,
+    limite: int = Query(100, ge=1, le=1000),
+    formato: Literal["json", "ndjson"] = "json",
+    db: Session = Depends(get_db)
+):
+    if formato == "ndjson":
+        return respuesta_ndjson(iterar_clientes(negocio_id, cursor), schemas.Cliente)
+    consulta = db.query(models.Cliente).filter(models.Cliente.negocio_id == negocio_id)
+    if cursor:
+        consulta = consulta.filter(models.Cliente.id > cursor)
+    # Pedimos uno de más para saber si hay otra página
+    clientes = consulta.order_by(models.Cliente.id).limit(limite + 1).all()
+    if len(clientes) > limite:
+        clientes = clientes[:limite]
+        response.headers["X-Siguiente-Cursor"] = str(clientes[-1].id)
+    return clientes
+
+# 10b. BUSCAR CLIENTES POR NOMBRE O TELÉFONO (en cualquier formato: "0981 123", "+595981...", "Juan")
+@app.get("/clientes/buscar", response_model=List[schemas.Cliente])
+def buscar_clientes(
+    q: str = Query(..., min_length=3),
+    limite: int = Query(20, ge=1, le=100),
+    negocio_id: int = Depends(negocio_actual),
+    db: Session = Depends(get_db)
+):
+    return crud.buscar_clientes(db, negocio_id, q, limite)
+
+# La respuesta en streaming sigue después de que termina el endpoint (y se cierra la sesión de
+# get_db): usa su propia sesión y un cursor del lado del servidor que trae LOTE_NDJSON filas por vez
+def iterar_clientes(negocio_id: int, cursor: Optional[int]):
+    db = database.SessionLocal()
+    try:
+        consulta = db.query(models.Cliente).filter(models.Cliente.negocio_id == negocio_id)
+        if cursor:
+            consulta = consulta.filter(models.Cliente.id > cursor)
+        yield from consulta.order_by(models.Cliente.id).yield_per(LOTE_NDJSON)
+    finally:
+        db.close()
 
 # 11. ACTUALIZAR CLIENTE (Para ponerle nombre real)
 @app.put("/clientes/{cliente_id}")
-def actualizar_cliente(cliente_id: int, cliente_data: schemas.ClienteCreate, db: Session = Depends(get_db)):
-    db_cliente = db.query(models.Cliente).filter(models.Cliente.id == cliente_id).first()
+def actualizar_cliente(cliente_id: int, cliente_data: schemas.ClienteCreate, negocio_id: int = Depends(negocio_actual), db: Session = Depends(get_db)):
+    db_cliente = db.query(models.Cliente).filter(models.Cliente.id == cliente_id, models.Cliente.negocio_id == negocio_id).first()
     if db_cliente is None:
         raise HTTPException(status_code=404, detail="Cliente no encontrado")
     
+    telefono_anterior = db_cliente.telefono_normalizado
     db_cliente.nombre = cliente_data.nombre
-    db_cliente.telefono = cliente_data.telefono_whatsapp
+    db_cliente.telefono_whatsapp = cliente_data.telefono_whatsapp
+    # La búsqueda y el bot lo encuentran por el normalizado: se recalcula con el teléfono
+    db_cliente.telefono_normalizado = normalizar_telefono(cliente_data.telefono_whatsapp)
     # email opcional si lo tienes en el esquema, por ahora nombre y telefono bastan
-    
-    db.commit()
+
+    try:
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        raise HTTPException(status_code=409, detail="Ya hay otro cliente con ese teléfono")
     db.refresh(db_cliente)
+    crud.cache_clientes.invalidar(cliente_id)
+    for telefono in (telefono_anterior, db_cliente.telefono_normalizado):
+        crud.cache_clientes.invalidar_telefono(negocio_id, telefono)
     return db_cliente
@@ -1,8 +1,16 @@
-from sqlalchemy import Column, Integer, String, Boolean, ForeignKey, DateTime, DECIMAL, Text
+from sqlalchemy import and_, Column, Integer, String, Boolean, ForeignKey, DateTime, Date, Time, DECIMAL, Text, Index, DDL, event
 from sqlalchemy.orm import relationship
+from sqlalchemy.schema import PrimaryKeyConstraint
+from sqlalchemy.ext.compiler import compiles
 from database import Base
 import datetime
 
+# Estados que ocupan la agenda (los cancelados/realizados no bloquean horarios)
+ESTADOS_ACTIVOS = ('pendiente', 'confirmado', 'bloqueado')
+_ESTADOS_ACTIVOS_SQL = ", ".join(f"'{e}'" for e in ESTADOS_ACTIVOS)
+# Ningún turno dura más que esto (los servicios se validan contra este tope)
+DURACION_MAXIMA_TURNO = datetime.timedelta(days=1)
+
 # 1. Modelo de Negocio
 class Negocio(Base):
     __tablename__ = "negocios"
@@ -13,6 +21,14 @@ class Negocio(Base):
     plan_suscripcion = Column(String(20), default='basico')    # Agregado
     activo = Column(Boolean, default=True)
     fecha_creacion = Column(DateTime, default=datetime.datetime.utcnow) # Agregado
+    # Resolución del negocio en cada pedido (ver tenants.py)
+    telefono_whatsapp = Column(String(20))  # número de Twilio al que escriben los clientes ("To")
+    api_key_hash = Column(String(64))       # sha256 de la API key del panel (la key no se guarda)
+
+    __table_args__ = (
+        Index("uq_negocios_telefono_whatsapp", telefono_whatsapp, unique=True),
+        Index("uq_negocios_api_key_hash", api_key_hash, unique=True),
+    )
 
 class Usuario(Base):
     __tablename__ = "usuarios"
@@ -33,6 +49,11 @@ class Servicio(Base):
     precio = Column(DECIMAL(10, 2), nullable=False)
     activo = Column(Boolean, default=True)
 
+    __table_args__ = (
+        # Todo listado es por negocio: el índice empieza por negocio_id
+        Index("ix_servicios_negocio_id", negocio_id, id),
+    )
+
 # 3. Modelo de Staff (Barberos)
 class Staff(Base):
     __tablename__ = "staff"
@@ -42,15 +63,43 @@ class Staff(Base):
     telefono = Column(String(20))
     activo = Column(Boolean, default=True)
 
+    __table_args__ = (
+        Index("ix_staff_negocio_id", negocio_id, id),
+    )
+
 # 4. Modelo de Cliente
 class Cliente(Base):
     __tablename__ = "clientes"
     id = Column(Integer, primary_key=True, index=True)
     negocio_id = Column(Integer, ForeignKey("negocios.id", ondelete="CASCADE"))
     nombre = Column(String(100))
-    telefono_whatsapp = Column(String(20), nullable=False)
+    telefono_whatsapp = Column(String(20), nullable=False)      # como lo cargó el cliente / Twilio
+    telefono_normalizado = Column(String(20))                   # "+595981123456" (ver telefonos.py)
     fecha_registro = Column(DateTime, default=datetime.datetime.utcnow)
 
+    __table_args__ = (
+        # Un teléfono es un solo cliente por negocio, en cualquier formato que llegue
+        # (base del upsert en crud.resolver_cliente y de la búsqueda por prefijo)
+        Index("uq_clientes_negocio_telefono_norm", negocio_id, telefono_normalizado, unique=True),
+        # Listado de clientes del negocio en orden de alta
+        Index("ix_clientes_negocio_id", negocio_id, id),
+        # Búsqueda por parte del nombre o del número (ILIKE '%...%') con trigramas de pg_trgm
+        Index(
+            "ix_clientes_nombre_trgm", nombre,
+            postgresql_using="gin", postgresql_ops={"nombre": "gin_trgm_ops"},
+        ).ddl_if(dialect="postgresql"),
+        Index(
+            "ix_clientes_telefono_trgm", telefono_normalizado,
+            postgresql_using="gin", postgresql_ops={"telefono_normalizado": "gin_trgm_ops"},
+        ).ddl_if(dialect="postgresql"),
+    )
+
+# Los índices de trigramas necesitan la extensión pg_trgm
+event.listen(
+    Cliente.__table__, "before_create",
+    DDL("CREATE EXTENSION IF NOT EXISTS pg_trgm").execute_if(dialect="postgresql"),
+)
+
 # 5. Modelo de Turno
 class Turno(Base):
     __tablename__ = "turnos"
@@ -71,6 +120,118 @@ class Turno(Base):
     servicio = relationship("Servicio")
     staff = relationship("Staff")
 
+    __table_args__ = (
+        # Listados del admin: filtro por negocio y paginación por (fecha, id)
+        Index("ix_turnos_negocio_inicio_id", negocio_id, fecha_hora_inicio, id),
+        # Índice parcial para la búsqueda de solapamientos (solo turnos activos)
+        Index(
+            "ix_turnos_staff_horario_activos",
+            staff_id, fecha_hora_inicio, fecha_hora_fin,
+            postgresql_where=estado.in_(ESTADOS_ACTIVOS),
+            sqlite_where=estado.in_(ESTADOS_ACTIVOS),
+        ),
+        # Recordatorios: recorrido por fecha de los confirmados que se vienen
+        Index(
+            "ix_turnos_confirmados_inicio",
+            fecha_hora_inicio, id,
+            postgresql_where=estado == "confirmado",
+            sqlite_where=estado == "confirmado",
+        ),
+        # Postgres: una partición por mes de fecha_hora_inicio (ver particiones.py)
+        {"postgresql_partition_by": "RANGE (fecha_hora_inicio)"},
+    )
+
+# Turnos que pisan [inicio, fin): empiezan antes de fin y terminan después de inicio. La cota
+# inferior de fecha_hora_inicio no cambia el resultado (ninguno dura más de DURACION_MAXIMA_TURNO),
+# pero acota el rango del índice (staff_id, fecha_hora_inicio, ...) y en Postgres deja podar
+# las particiones de los meses anteriores: sin ella se recorre toda la historia del barbero.
+def turnos_que_solapan(inicio, fin):
+    return and_(
+        Turno.fecha_hora_inicio >= inicio - DURACION_MAXIMA_TURNO,
+        Turno.fecha_hora_inicio < fin,
+        Turno.fecha_hora_fin > inicio
+    )
+
+# En una tabla particionada la PK tiene que incluir la columna de partición. Sólo cambia el DDL
+# de Postgres: para el ORM la identidad sigue siendo el id (que sale de una secuencia única).
+@compiles(PrimaryKeyConstraint, "postgresql")
+def _pk_turnos_particionada(constraint, compiler, **kw):
+    ddl = compiler.visit_primary_key_constraint(constraint, **kw)
+    if constraint.table is not None and constraint.table.name == "turnos":
+        ddl = ddl.replace("PRIMARY KEY (id)", "PRIMARY KEY (id, fecha_hora_inicio)")
+    return ddl
+
+# En Postgres la propia base rechaza dos turnos activos solapados del mismo barbero.
+# Una tabla particionada no admite EXCLUDE en la tabla madre: particiones.py la agrega
+# a cada partición con este SQL (el nombre siempre empieza con "excl_turnos_solapados").
+EXCLUSION_SOLAPAMIENTO_SQL = (
+    "EXCLUDE USING gist (staff_id WITH =, tsrange(fecha_hora_inicio, fecha_hora_fin) WITH &&) "
+    f"WHERE (estado IN ({_ESTADOS_ACTIVOS_SQL}))"
+)
+
+# La restricción de exclusión necesita btree_gist para combinar "=" (entero) con "&&" (rango)
+event.listen(
+    Turno.__table__, "before_create",
+    DDL("CREATE EXTENSION IF NOT EXISTS btree_gist").execute_if(dialect="postgresql"),
+)
+
+# Respaldo para SQLite (pruebas locales): triggers que imitan la restricción de exclusión
+TRIGGERS_SOLAPAMIENTO_SQLITE = [
+    f"""
+    CREATE TRIGGER IF NOT EXISTS trg_turnos_sin_solape_{operacion.lower()}
+    BEFORE {operacion} ON turnos
+    WHEN NEW.estado IN ({_ESTADOS_ACTIVOS_SQL}) AND EXISTS (
+        SELECT 1 FROM turnos t
+        WHERE t.staff_id = NEW.staff_id
+          AND t.id IS NOT NEW.id
+          AND t.estado IN ({_ESTADOS_ACTIVOS_SQL})
+          AND t.fecha_hora_inicio < NEW.fecha_hora_fin
+          AND t.fecha_hora_fin > NEW.fecha_hora_inicio
+    )
+    BEGIN
+        SELECT RAISE(ABORT, 'excl_turnos_solapados');
+    END
+    """
+    for operacion in ("INSERT", "UPDATE")
+]
+for _sql in TRIGGERS_SOLAPAMIENTO_SQLITE:
+    event.listen(Turno.__table__, "after_create", DDL(_sql).execute_if(dialect="sqlite"))
+
+# 5b. Turnos recurrentes (el corte de todas las semanas)
+# Se guarda la regla, no cada turno: las ocurrencias se calculan solo para la ventana consultada
+# (ver recurrencia.py). Una excepción anula la ocurrencia de esa fecha.
+class SerieTurno(Base):
+    __tablename__ = "series_turnos"
+    id = Column(Integer, primary_key=True, index=True)
+    negocio_id = Column(Integer, ForeignKey("negocios.id", ondelete="CASCADE"))
+    staff_id = Column(Integer, ForeignKey("staff.id"))
+    cliente_id = Column(Integer, ForeignKey("clientes.id"))
+    servicio_id = Column(Integer, ForeignKey("servicios.id"))
+
+    fecha_inicio = Column(Date, nullable=False)   # primera ocurrencia
+    fecha_fin = Column(Date)                      # última fecha posible (None = sin fin)
+    hora_inicio = Column(Time, nullable=False)
+    duracion_minutos = Column(Integer, nullable=False)
+    cada_semanas = Column(Integer, nullable=False, default=1)  # 1 = semanal, 2 = quincenal...
+    activa = Column(Boolean, default=True)
+    created_at = Column(DateTime, default=datetime.datetime.utcnow)
+
+    excepciones = relationship("ExcepcionSerie", cascade="all, delete-orphan")
+
+    __table_args__ = (
+        Index("ix_series_staff_vigencia", staff_id, fecha_inicio, fecha_fin),
+    )
+
+class ExcepcionSerie(Base):
+    __tablename__ = "excepciones_serie"
+    id = Column(Integer, primary_key=True, index=True)
+    serie_id = Column(Integer, ForeignKey("series_turnos.id", ondelete="CASCADE"), nullable=False)
+    fecha = Column(Date, nullable=False)
+
+    __table_args__ = (
+        Index("uq_excepciones_serie_fecha", serie_id, fecha, unique=True),
+    )
+
 # 6. Modelo de Logs de WhatsApp (Nuevo)
 class WhatsAppLog(Base):
     __tablename__ = "whatsapp_logs"
@@ -80,4 +241,27 @@ class WhatsAppLog(Base):
     mensaje_enviado = Column(Text)
     mensaje_recibido = Column(Text)
     error_log = Column(Text)
-    fecha = Column(DateTime, default=datetime.datetime.utcnow)
\ No newline at end of file
+    fecha = Column(DateTime, default=datetime.datetime.utcnow)
+
+# 7. Mensajes de Twilio ya atendidos (para no procesar dos veces un reintento)
+class MensajeProcesado(Base):
+    __tablename__ = "mensajes_procesados"
+    message_sid = Column(String(64), primary_key=True)
+    # NULL mientras el mensaje se está procesando; después, el TwiML que respondimos
+    respuesta = Column(Text)
+    fecha = Column(DateTime, default=datetime.datetime.utcnow, nullable=False)
+
+    __table_args__ = (
+        Index("ix_mensajes_procesados_fecha", fecha),
+    )
+
+
+# 8. Recordatorios ya enviados (uno por turno, nunca dos)
+# Sin FK a turnos: la fila se reclama antes de enviar y queda como registro aunque el turno cambie.
+class RecordatorioEnviado(Base):
+    __tablename__ = "recordatorios_enviados"
+    turno_id = Column(Integer, primary_key=True)
+    estado = Column(String(20), nullable=False, default="enviando") # enviando, enviado, fallido
+    intentos = Column(Integer, nullable=False, default=0)
+    error = Column(Text)
+    fecha = Column(DateTime, default=datetime.datetime.utcnow, nullable=False)
@@ -0,0 +1,140 @@
+import time
+import bisect
+from collections import defaultdict
+import database
+
+# --- MÉTRICAS DE LA API (formato de texto de Prometheus en /metrics) ---
+# Por ruta (la plantilla, ej. "/series/{serie_id}", nunca la URL con ids):
+#   - histograma de latencia y de tiempo en la base por pedido
+#   - pedidos por código de estado
+# Más: pedidos en curso, arranque del proceso y estado del pool de conexiones.
+# El middleware es ASGI puro (sin BaseHTTPMiddleware: no copia el cuerpo ni crea tareas) y
+# todo se actualiza en el hilo del event loop, sin locks. Los números son por proceso:
+# con varios workers cada uno expone los suyos.
+BUCKETS_SEGUNDOS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+RUTA_DESCONOCIDA = "<sin_ruta>"  # 404 y similares: una sola serie, no una por URL inventada
+
+INICIO_PROCESO = time.time()
+
+class Histograma:
+    __slots__ = ("cuentas", "suma", "total")
+
+    def __init__(self):
+        self.cuentas = [0] * (len(BUCKETS_SEGUNDOS) + 1)  # el último es +Inf
+        self.suma = 0.0
+        self.total = 0
+
+    def observar(self, segundos):
+        self.cuentas[bisect.bisect_left(BUCKETS_SEGUNDOS, segundos)] += 1
+        self.suma += segundos
+        self.total += 1
+
+class Metricas:
+    def __init__(self):
+        self.latencia = defaultdict(Histograma)   # (metodo, ruta) -> Histograma
+        self.tiempo_db = defaultdict(Histograma)  # (metodo, ruta) -> Histograma
+        self.consultas = defaultdict(int)         # (metodo, ruta) -> sentencias SQL
+        self.estados = defaultdict(int)           # (metodo, ruta, codigo) -> pedidos
+        self.en_curso = 0
+        self.arranque_segundos = None             # desde que se importó la app hasta terminar el startup
+
+metricas = Metricas()
+
+# 1. MIDDLEWARE
+# El tiempo en la base sale del alcance de consultas que se abre por pedido en database
+# (los endpoints sync corren en el threadpool con una copia del contexto: cuentan en el mismo).
+class MiddlewareMetricas:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        estado = [500]  # si la app explota antes de responder, cuenta como 500
+
+        async def send_con_estado(mensaje):
+            if mensaje["type"] == "http.response.start":
+                estado[0] = mensaje["status"]
+            await send(mensaje)
+
+        alcance = database.abrir_alcance(f"{scope['method']} {scope['path']}", database.DB_PRESUPUESTO_CONSULTAS)
+        metricas.en_curso += 1
+        inicio = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_con_estado)
+        finally:
+            duracion = time.perf_counter() - inicio
+            metricas.en_curso -= 1
+            # El router de Starlette deja en el scope la ruta que atendió el pedido
+            ruta = getattr(scope.get("route"), "path", RUTA_DESCONOCIDA)
+            clave = (scope["method"], ruta)
+            metricas.latencia[clave].observar(duracion)
+            metricas.tiempo_db[clave].observar(alcance.tiempo_s)
+            metricas.consultas[clave] += alcance.total
+            metricas.estados[clave + (estado[0],)] += 1
+            if ruta != RUTA_DESCONOCIDA:
+                alcance.nombre = f"{scope['method']} {ruta}"
+            alcance.cerrar()
+        # Modo prueba (DB_PRESUPUESTO_CONSULTAS): el pedido que se pasa falla
+        alcance.verificar_presupuesto()
+
+def marcar_arranque():
+    metricas.arranque_segundos = time.time() - INICIO_PROCESO
+
+# 2. EXPOSICIÓN (text/plain; version=0.0.4)
+def _etiquetas(**valores):
+    pares = ",".join(f'{k}="{str(v).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"' for k, v in valores.items())
+    return "{" + pares + "}"
+
+def _histograma(lineas, nombre, ayuda, series):
+    lineas.append(f"# HELP {nombre} {ayuda}")
+    lineas.append(f"# TYPE {nombre} histogram")
+    for (metodo, ruta), h in sorted(series.items()):
+        acumulado = 0
+        for limite, cuenta in zip(BUCKETS_SEGUNDOS + ("+Inf",), h.cuentas):
+            acumulado += cuenta
+            lineas.append(f"{nombre}_bucket{_etiquetas(method=metodo, route=ruta, le=limite)} {acumulado}")
+        lineas.append(f"{nombre}_sum{_etiquetas(method=metodo, route=ruta)} {h.suma:.6f}")
+        lineas.append(f"{nombre}_count{_etiquetas(method=metodo, route=ruta)} {h.total}")
+
+def _simple(lineas, nombre, tipo, ayuda, valores):
+    lineas.append(f"# HELP {nombre} {ayuda}")
+    lineas.append(f"# TYPE {nombre} {tipo}")
+    for etiquetas, valor in valores:
+        lineas.append(f"{nombre}{_etiquetas(**etiquetas) if etiquetas else ''} {valor}")
+
+def exponer():
+    lineas = []
+    _histograma(lineas, "http_request_duration_seconds", "Latencia de los pedidos por ruta.", metricas.latencia)
+    _histograma(lineas, "http_request_db_seconds", "Tiempo en la base de datos por pedido.", metricas.tiempo_db)
+    _simple(lineas, "http_request_db_queries_total", "counter", "Sentencias SQL ejecutadas por ruta.",
+            [({"method": m, "route": r}, n) for (m, r), n in sorted(metricas.consultas.items())])
+    _simple(lineas, "http_requests_total", "counter", "Pedidos atendidos por ruta y código de estado.",
+            [({"method": m, "route": r, "status": s}, n) for (m, r, s), n in sorted(metricas.estados.items())])
+    _simple(lineas, "http_requests_in_progress", "gauge", "Pedidos en curso.", [(None, metricas.en_curso)])
+    _simple(lineas, "process_start_time_seconds", "gauge", "Inicio del proceso (epoch).", [(None, f"{INICIO_PROCESO:.3f}")])
+    if metricas.arranque_segundos is not None:
+        _simple(lineas, "app_startup_duration_seconds", "gauge", "Desde el inicio del proceso hasta terminar el startup (arranque en frío).",
+                [(None, f"{metricas.arranque_segundos:.3f}")])
+
+    # Pool de conexiones (lo mismo que /salud/pool)
+    pools = [
+        ("sync", database.QueuePoolMedido.estadisticas, database.engine.pool),
+        ("async", database.AsyncQueuePoolMedido.estadisticas, database.async_engine.sync_engine.pool),
+    ]
+    datos = [(nombre, est, est.como_dict(pool)) for nombre, est, pool in pools]
+    for clave, nombre, ayuda in (("tamano", "db_pool_size", "Tamaño del pool."),
+                                 ("en_uso", "db_pool_checked_out", "Conexiones en uso."),
+                                 ("libres", "db_pool_checked_in", "Conexiones libres en el pool."),
+                                 ("overflow", "db_pool_overflow", "Conexiones por encima de pool_size.")):
+        _simple(lineas, nombre, "gauge", ayuda, [({"pool": p}, d[clave]) for p, _, d in datos])
+    _simple(lineas, "db_pool_checkouts_total", "counter", "Conexiones pedidas al pool.",
+            [({"pool": p}, d["checkouts"]) for p, _, d in datos])
+    _simple(lineas, "db_pool_wait_seconds_total", "counter", "Tiempo total esperando una conexión libre.",
+            [({"pool": p}, f"{est.espera_total_s:.6f}") for p, est, _ in datos])
+    _simple(lineas, "db_pool_connections_created_total", "counter", "Conexiones nuevas abiertas.",
+            [({"pool": p}, d["conexiones_nuevas"]) for p, _, d in datos])
+    _simple(lineas, "db_pool_invalidated_total", "counter", "Conexiones descartadas por error.",
+            [({"pool": p}, d["invalidadas"]) for p, _, d in datos])
+    return "\n".join(lineas) + "\n"
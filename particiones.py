@@ -0,0 +1,342 @@
+import os
+import sys
+from datetime import datetime
+from sqlalchemy import text, select, delete, func
+from database import engine
+import models
+from crud import codificar_cursor, decodificar_cursor
+
+# --- PARTICIONES MENSUALES DE TURNOS Y ARCHIVO HISTÓRICO ---
+# En Postgres "turnos" está particionada por RANGE (fecha_hora_inicio), una partición por mes
+# (turnos_p2026_03, ...) más una DEFAULT para lo que caiga fuera. Las consultas que filtran por
+# fecha (agenda, disponibilidad, recordatorios, "Mis Reservas") sólo leen los meses que tocan.
+# Los meses más viejos que ARCHIVO_MESES se pasan a Parquet (uno por mes, zstd) y se borran de
+# la base: el panel los sigue viendo en "historial completo" vía /turnos/archivo.
+# En SQLite no hay particiones: crear/migrar no hacen nada y archivar borra las filas que volcó.
+PARTICIONES_MESES_FUTUROS = int(os.getenv("PARTICIONES_MESES_FUTUROS", "12"))
+ARCHIVO_MESES = int(os.getenv("ARCHIVO_MESES", "24"))  # meses que quedan en la base
+ARCHIVO_DIR = os.getenv("ARCHIVO_DIR", "archivo")
+ARCHIVO_LOTE = 5000  # filas por tanda al volcar un mes (nunca el mes entero en memoria)
+
+PARTICION_DEFAULT = "turnos_pdefault"
+# Varios procesos (workers de uvicorn, cron) pueden crear particiones a la vez
+_LOCK_PARTICIONES = 727001
+
+# 1. FECHAS Y NOMBRES
+def inicio_mes(fecha):
+    return datetime(fecha.year, fecha.month, 1)
+
+def sumar_meses(mes, n):
+    total = mes.year * 12 + mes.month - 1 + n
+    return datetime(total // 12, total % 12 + 1, 1)
+
+def nombre_particion(mes):
+    return f"turnos_p{mes.year}_{mes.month:02d}"
+
+def nombre_archivo(mes, directorio=ARCHIVO_DIR):
+    return os.path.join(directorio, f"turnos_{mes.year}_{mes.month:02d}.parquet")
+
+def es_particionada(conn):
+    if conn.dialect.name != "postgresql":
+        return False
+    return conn.execute(text(
+        "SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass('turnos')"
+    )).first() is not None
+
+def _existe_tabla(conn, nombre):
+    return conn.execute(text("SELECT to_regclass(:n)"), {"n": nombre}).scalar() is not None
+
+# Postgres no admite EXCLUDE en la tabla madre: cada partición lleva la suya
+# (con el prefijo "excl_turnos_solapados", que es lo que busca crud.es_turno_solapado)
+def _agregar_exclusion(conn, particion):
+    restriccion = "excl_turnos_solapados_" + particion.removeprefix("turnos_")
+    existe = conn.execute(text("SELECT 1 FROM pg_constraint WHERE conname = :n"), {"n": restriccion}).first()
+    if not existe:
+        conn.execute(text(f"ALTER TABLE {particion} ADD CONSTRAINT {restriccion} {models.EXCLUSION_SOLAPAMIENTO_SQL}"))
+
+# 2. CREAR PARTICIONES
+def crear_particion(conn, mes):
+    particion = nombre_particion(mes)
+    if _existe_tabla(conn, particion):
+        return False
+    desde, hasta = mes, sumar_meses(mes, 1)
+    rango = {"desde": desde, "hasta": hasta}
+    # Si la DEFAULT ya tiene turnos de ese mes, Postgres no deja crear la partición:
+    # los sacamos, creamos la partición y los volvemos a insertar (ahora caen en su mes)
+    mover = _existe_tabla(conn, PARTICION_DEFAULT) and conn.execute(text(
+        f"SELECT 1 FROM {PARTICION_DEFAULT} WHERE fecha_hora_inicio >= :desde AND fecha_hora_inicio < :hasta LIMIT 1"
+    ), rango).first() is not None
+    if mover:
+        conn.execute(text(
+            f"CREATE TEMP TABLE turnos_a_mover ON COMMIT DROP AS SELECT * FROM {PARTICION_DEFAULT} "
+            f"WHERE fecha_hora_inicio >= :desde AND fecha_hora_inicio < :hasta"
+        ), rango)
+        conn.execute(text(
+            f"DELETE FROM {PARTICION_DEFAULT} WHERE fecha_hora_inicio >= :desde AND fecha_hora_inicio < :hasta"
+        ), rango)
+    conn.execute(text(
+        f"CREATE TABLE {particion} PARTITION OF turnos "
+        f"FOR VALUES FROM ('{desde:%Y-%m-%d}') TO ('{hasta:%Y-%m-%d}')"
+    ))
+    _agregar_exclusion(conn, particion)
+    if mover:
+        conn.execute(text("INSERT INTO turnos SELECT * FROM turnos_a_mover"))
+        conn.execute(text("DROP TABLE turnos_a_mover"))
+    return True
+
+# Mes actual + PARTICIONES_MESES_FUTUROS (y la DEFAULT). Idempotente: se llama al arrancar
+# la API, en init_db y desde cron. No hace nada en SQLite o si la tabla todavía no está particionada.
+def asegurar_particiones(conn=None, meses_futuros=PARTICIONES_MESES_FUTUROS, ahora=None):
+    if conn is None:
+        with engine.begin() as conn:
+            return asegurar_particiones(conn, meses_futuros, ahora)
+    if not es_particionada(conn):
+        return []
+    conn.execute(text("SELECT pg_advisory_xact_lock(:k)"), {"k": _LOCK_PARTICIONES})
+    if not _existe_tabla(conn, PARTICION_DEFAULT):
+        conn.execute(text(f"CREATE TABLE {PARTICION_DEFAULT} PARTITION OF turnos DEFAULT"))
+        _agregar_exclusion(conn, PARTICION_DEFAULT)
+    actual = inicio_mes(ahora or datetime.now())
+    meses = [sumar_meses(actual, n) for n in range(meses_futuros + 1)]
+    creadas = [nombre_particion(m) for m in meses if crear_particion(conn, m)]
+    for particion in creadas:
+        print(f"🗂 Partición creada: {particion}")
+    return creadas
+
+# 3. MIGRAR UNA TABLA "turnos" COMÚN A PARTICIONADA (una vez, en una sola transacción)
+def migrar_a_particiones(conn):
+    if conn.dialect.name != "postgresql" or es_particionada(conn):
+        print("ℹ Nada que migrar: la tabla ya está particionada (o no es Postgres).")
+        return False
+    tabla = models.Turno.__table__
+    columnas = ", ".join(c.name for c in tabla.columns)
+    conn.execute(text("LOCK TABLE turnos IN ACCESS EXCLUSIVE MODE"))
+    conn.execute(text("ALTER TABLE turnos RENAME TO turnos_sin_particionar"))
+    conn.execute(text("ALTER SEQUENCE IF EXISTS turnos_id_seq RENAME TO turnos_sin_particionar_id_seq"))
+    # Los nombres de índices son globales al esquema: liberamos los de la tabla vieja
+    conn.execute(text("ALTER TABLE turnos_sin_particionar DROP CONSTRAINT IF EXISTS excl_turnos_solapados"))
+    conn.execute(text("ALTER TABLE turnos_sin_particionar DROP CONSTRAINT IF EXISTS turnos_pkey"))
+    for indice in tabla.indexes:
+        conn.execute(text(f"DROP INDEX IF EXISTS {indice.name}"))
+
+    tabla.create(bind=conn)
+    minimo, maximo = conn.execute(text(
+        "SELECT min(fecha_hora_inicio), max(fecha_hora_inicio) FROM turnos_sin_particionar"
+    )).one()
+    asegurar_particiones(conn)
+    if minimo:
+        mes = inicio_mes(minimo)
+        while mes <= maximo:
+            crear_particion(conn, mes)
+            mes = sumar_meses(mes, 1)
+
+    conn.execute(text(f"INSERT INTO turnos ({columnas}) SELECT {columnas} FROM turnos_sin_particionar"))
+    conn.execute(text(
+        "SELECT setval(pg_get_serial_sequence('turnos', 'id'), COALESCE((SELECT max(id) FROM turnos), 0) + 1, false)"
+    ))
+    conn.execute(text("DROP TABLE turnos_sin_particionar"))
+    return True
+
+# 4. ARCHIVAR MESES VIEJOS A PARQUET
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise RuntimeError("Falta pyarrow (pip install pyarrow) para leer o escribir el archivo histórico")
+    return pyarrow
+
+def _esquema_archivo(pa):
+    return pa.schema([
+        ("id", pa.int64()),
+        ("negocio_id", pa.int64()),
+        ("staff_id", pa.int64()),
+        ("cliente_id", pa.int64()),
+        ("servicio_id", pa.int64()),
+        ("fecha_hora_inicio", pa.timestamp("us")),
+        ("fecha_hora_fin", pa.timestamp("us")),
+        ("estado", pa.string()),
+        ("origen", pa.string()),
+        ("notas", pa.string()),
+        ("created_at", pa.timestamp("us")),
+        # Desnormalizado: el archivo se lee sin la base (y sobrevive a servicios o barberos borrados)
+        ("cliente_nombre", pa.string()),
+        ("cliente_telefono", pa.string()),
+        ("servicio_nombre", pa.string()),
+        ("servicio_duracion", pa.int64()),
+        ("servicio_precio", pa.float64()),
+        ("staff_nombre", pa.string()),
+    ])
+
+def _consulta_archivo(desde, hasta):
+    t = models.Turno
+    return select(
+        t.id, t.negocio_id, t.staff_id, t.cliente_id, t.servicio_id,
+        t.fecha_hora_inicio, t.fecha_hora_fin, t.estado, t.origen, t.notas, t.created_at,
+        models.Cliente.nombre.label("cliente_nombre"),
+        models.Cliente.telefono_whatsapp.label("cliente_telefono"),
+        models.Servicio.nombre.label("servicio_nombre"),
+        models.Servicio.duracion_minutos.label("servicio_duracion"),
+        models.Servicio.precio.label("servicio_precio"),
+        models.Staff.nombre.label("staff_nombre"),
+    ).outerjoin(models.Cliente, t.cliente_id == models.Cliente.id
+    ).outerjoin(models.Servicio, t.servicio_id == models.Servicio.id
+    ).outerjoin(models.Staff, t.staff_id == models.Staff.id
+    ).where(t.fecha_hora_inicio >= desde, t.fecha_hora_inicio < hasta
+    ).order_by(t.negocio_id, t.fecha_hora_inicio, t.id)
+
+# Vuelca un mes a Parquet y recién después lo saca de la base. Devuelve las filas archivadas.
+# Lo que se borra es exactamente lo que quedó en el archivo: un turno que se inserta o cambia de
+# estado mientras se vuelca el mes no puede perderse.
+def archivar_mes(mes, directorio=ARCHIVO_DIR):
+    pa = _pyarrow()
+    esquema = _esquema_archivo(pa)
+    desde, hasta = mes, sumar_meses(mes, 1)
+    en_rango = (models.Turno.fecha_hora_inicio >= desde, models.Turno.fecha_hora_inicio < hasta)
+    destino = nombre_archivo(mes, directorio)
+    if os.path.exists(destino):
+        raise RuntimeError(f"{destino} ya existe: no se sobreescribe un mes archivado")
+    os.makedirs(directorio, exist_ok=True)
+    temporal = destino + ".tmp"
+
+    total = 0
+    archivados = []  # ids volcados al Parquet (fuera de una partición propia, sólo esos se borran)
+    with engine.begin() as conn:
+        particion = nombre_particion(mes)
+        con_particion = es_particionada(conn) and _existe_tabla(conn, particion)
+        if con_particion:
+            # Nadie escribe en el mes hasta que se suelte la partición: se lee y se tira lo mismo
+            conn.execute(text(f"LOCK TABLE {particion} IN SHARE MODE"))
+        elif conn.dialect.name == "postgresql":
+            # Sin partición propia (DEFAULT o tabla sin particionar): bloqueamos las filas del mes,
+            # sin frenar las reservas del resto de la tabla
+            conn.execute(select(models.Turno.id).where(*en_rango).with_for_update())
+
+        escritor = pa.parquet.ParquetWriter(temporal, esquema, compression="zstd")
+        try:
+            # stream_results + yield_per: cursor del lado del servidor, de a ARCHIVO_LOTE filas
+            filas = conn.execution_options(stream_results=True, yield_per=ARCHIVO_LOTE).execute(
+                _consulta_archivo(desde, hasta)
+            )
+            for lote in filas.partitions():
+                datos = [f._asdict() for f in lote]
+                for d in datos:
+                    d["servicio_precio"] = float(d["servicio_precio"]) if d["servicio_precio"] is not None else None
+                escritor.write_table(pa.Table.from_pylist(datos, schema=esquema))
+                archivados.extend(d["id"] for d in datos)
+                total += len(datos)
+        finally:
+            escritor.close()
+        # El archivo queda completo en disco antes de borrar nada en la base
+        os.replace(temporal, destino)
+
+        if con_particion:
+            # Con la partición del mes, la DEFAULT no puede tener filas de ese rango
+            conn.execute(text(f"ALTER TABLE turnos DETACH PARTITION {particion}"))
+            conn.execute(text(f"DROP TABLE {particion}"))
+        else:
+            # DEFAULT, SQLite o sin particiones: sólo lo que se escribió (lo nuevo queda para la próxima)
+            for i in range(0, len(archivados), ARCHIVO_LOTE):
+                conn.execute(delete(models.Turno).where(
+                    *en_rango, models.Turno.id.in_(archivados[i:i + ARCHIVO_LOTE])
+                ))
+    if total == 0:
+        os.remove(destino)
+    return total
+
+def archivar(meses=ARCHIVO_MESES, ahora=None, directorio=ARCHIVO_DIR):
+    limite = sumar_meses(inicio_mes(ahora or datetime.now()), -meses)
+    with engine.connect() as conn:
+        primero = conn.execute(select(func.min(models.Turno.fecha_hora_inicio))).scalar()
+    resumen = []
+    if primero is None:
+        return resumen
+    mes = inicio_mes(primero)
+    while mes < limite:
+        resumen.append((mes, archivar_mes(mes, directorio)))
+        mes = sumar_meses(mes, 1)
+    return resumen
+
+# 5. LEER EL ARCHIVO (historial del panel)
+# Recorre los meses archivados en orden, lee sólo las filas del negocio y del rango (filtros
+# sobre las estadísticas de Parquet) y pagina con el mismo cursor (fecha, id) que /turnos/.
+# Devuelve dicts con la forma de schemas.TurnoDetalle.
+def meses_archivados(directorio=ARCHIVO_DIR):
+    if not os.path.isdir(directorio):
+        return []
+    meses = []
+    for nombre in os.listdir(directorio):
+        if nombre.startswith("turnos_") and nombre.endswith(".parquet"):
+            anio, mes = nombre[len("turnos_"):-len(".parquet")].split("_")
+            meses.append(datetime(int(anio), int(mes), 1))
+    return sorted(meses)
+
+def _a_detalle(fila):
+    return {
+        "id": fila["id"],
+        "fecha_hora_inicio": fila["fecha_hora_inicio"],
+        "fecha_hora_fin": fila["fecha_hora_fin"],
+        "estado": fila["estado"],
+        "origen": fila["origen"],
+        "cliente": {
+            "id": fila["cliente_id"], "nombre": fila["cliente_nombre"], "telefono_whatsapp": fila["cliente_telefono"]
+        } if fila["cliente_telefono"] is not None else None,
+        "servicio": {
+            "id": fila["servicio_id"], "negocio_id": fila["negocio_id"], "nombre": fila["servicio_nombre"],
+            "duracion_minutos": fila["servicio_duracion"], "precio": fila["servicio_precio"]
+        } if fila["servicio_nombre"] is not None else None,
+        "staff": {"id": fila["staff_id"], "nombre": fila["staff_nombre"]} if fila["staff_nombre"] is not None else None,
+    }
+
+def leer_archivo(negocio_id, desde=None, hasta=None, cursor=None, limite=50, directorio=ARCHIVO_DIR):
+    meses = meses_archivados(directorio)
+    if not meses:
+        return [], None
+    pa = _pyarrow()
+    despues_de = decodificar_cursor(cursor) if cursor else None
+    # Con cursor, lo anterior a él ya se mostró: es el nuevo "desde"
+    piso = desde
+    if despues_de and (piso is None or despues_de[0] > piso):
+        piso = despues_de[0]
+
+    items = []
+    for mes in meses:
+        # Meses enteros fuera del rango pedido ni se abren
+        if (piso and sumar_meses(mes, 1) <= piso) or (hasta and mes >= hasta):
+            continue
+        filtros = [("negocio_id", "=", negocio_id)]
+        if piso:
+            filtros.append(("fecha_hora_inicio", ">=", piso))
+        if hasta:
+            filtros.append(("fecha_hora_inicio", "<", hasta))
+        tabla = pa.parquet.read_table(nombre_archivo(mes, directorio), filters=filtros)
+        tabla = tabla.sort_by([("fecha_hora_inicio", "ascending"), ("id", "ascending")])
+        for fila in tabla.to_pylist():
+            if despues_de and (fila["fecha_hora_inicio"], fila["id"]) <= despues_de:
+                continue
+            items.append(_a_detalle(fila))
+            # Uno de más para saber si hay otra página
+            if len(items) > limite:
+                ultimo = items[limite - 1]
+                return items[:limite], codificar_cursor(ultimo["fecha_hora_inicio"], ultimo["id"])
+    return items, None
+
+# Uso:
+#   python particiones.py crear      -> particiones del mes actual + PARTICIONES_MESES_FUTUROS (para cron)
+#   python particiones.py migrar     -> convierte una tabla turnos existente en particionada (una vez)
+#   python particiones.py archivar   -> pasa a Parquet los meses anteriores a ARCHIVO_MESES
+if __name__ == "__main__":
+    accion = sys.argv[1] if len(sys.argv) > 1 else ""
+    if accion == "crear":
+        creadas = asegurar_particiones()
+        print(f"✅ Particiones al día ({len(creadas)} nuevas)")
+    elif accion == "migrar":
+        with engine.begin() as conn:
+            if migrar_a_particiones(conn):
+                print("✅ turnos ahora está particionada por mes")
+    elif accion == "archivar":
+        for mes, filas in archivar():
+            print(f"🗄 {mes:%Y-%m}: {filas} turnos archivados")
+        print("✅ Archivo al día")
+    else:
+        sys.exit("Uso: python particiones.py crear | migrar | archivar")
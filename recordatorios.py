@@ -0,0 +1,228 @@
+import os
+import time
+import asyncio
+import argparse
+import datetime
+import httpx
+from sqlalchemy import select, update, and_, or_, exists
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from database import AsyncSessionLocal
+import models
+
+# --- RECORDATORIOS DE TURNOS (WhatsApp saliente) ---
+# Recorre los turnos confirmados que empiezan dentro de la ventana, de a lotes y en orden
+# (fecha_hora_inicio, id) sobre un índice parcial: nunca hay más de un lote en memoria.
+# Cada turno se reclama en recordatorios_enviados ANTES de enviar, así dos corridas
+# simultáneas (o una repetida) no le mandan dos recordatorios al mismo cliente.
+RECORDATORIO_ANTICIPACION_HORAS = int(os.getenv("RECORDATORIO_ANTICIPACION_HORAS", "24"))
+RECORDATORIOS_LOTE = int(os.getenv("RECORDATORIOS_LOTE", "200"))
+RECORDATORIOS_CONCURRENCIA = int(os.getenv("RECORDATORIOS_CONCURRENCIA", "10"))
+RECORDATORIOS_POR_SEGUNDO = float(os.getenv("RECORDATORIOS_POR_SEGUNDO", "10"))
+RECORDATORIOS_REINTENTOS = int(os.getenv("RECORDATORIOS_REINTENTOS", "3"))
+
+TWILIO_ACCOUNT_SID = os.getenv("TWILIO_ACCOUNT_SID")
+TWILIO_AUTH_TOKEN = os.getenv("TWILIO_AUTH_TOKEN")
+TWILIO_WHATSAPP_FROM = os.getenv("TWILIO_WHATSAPP_FROM")  # ej: +14155238886
+
+# 1. ENVIADORES: cualquier objeto con "async enviar(telefono, texto, remitente=None)"
+class ErrorEnvio(Exception):
+    def __init__(self, mensaje, temporal=True):
+        super().__init__(mensaje)
+        self.temporal = temporal  # temporal => vale la pena reintentar
+
+class EnviadorFalso:
+    """Para pruebas locales: guarda los mensajes en memoria en lugar de enviarlos."""
+    def __init__(self, fallar_telefonos=()):
+        self.enviados = []
+        self.fallar_telefonos = set(fallar_telefonos)
+
+    async def enviar(self, telefono, texto, remitente=None):
+        if telefono in self.fallar_telefonos:
+            raise ErrorEnvio(f"Número rechazado: {telefono}", temporal=False)
+        self.enviados.append((telefono, texto))
+
+class EnviadorTwilio:
+    def __init__(self, account_sid=TWILIO_ACCOUNT_SID, auth_token=TWILIO_AUTH_TOKEN, remitente=TWILIO_WHATSAPP_FROM):
+        if not (account_sid and auth_token and remitente):
+            raise RuntimeError("Faltan TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN o TWILIO_WHATSAPP_FROM")
+        self.url = f"https://api.twilio.com/2010-04-01/Accounts/{account_sid}/Messages.json"
+        self.remitente = remitente
+        # Un solo cliente HTTP: reutiliza las conexiones TLS entre envíos
+        self._cliente = httpx.AsyncClient(auth=(account_sid, auth_token), timeout=10)
+
+    # remitente: el número de WhatsApp del negocio (si no tiene, el de TWILIO_WHATSAPP_FROM)
+    async def enviar(self, telefono, texto, remitente=None):
+        try:
+            r = await self._cliente.post(self.url, data={
+                "From": f"whatsapp:{remitente or self.remitente}",
+                "To": f"whatsapp:{telefono}",
+                "Body": texto,
+            })
+        except httpx.HTTPError as e:
+            raise ErrorEnvio(str(e))
+        if r.status_code == 429 or r.status_code >= 500:
+            raise ErrorEnvio(f"Twilio {r.status_code}: {r.text[:200]}")
+        if r.status_code >= 400:
+            raise ErrorEnvio(f"Twilio {r.status_code}: {r.text[:200]}", temporal=False)
+
+    async def cerrar(self):
+        await self._cliente.aclose()
+
+# 2. LÍMITE GLOBAL DE ENVÍOS (token bucket compartido por todas las tareas)
+class LimitadorTasa:
+    def __init__(self, por_segundo=RECORDATORIOS_POR_SEGUNDO, rafaga=None):
+        self.por_segundo = por_segundo
+        self.capacidad = rafaga or max(1.0, por_segundo)
+        self._fichas = self.capacidad
+        self._ultimo = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def esperar(self):
+        async with self._lock:
+            while True:
+                ahora = time.monotonic()
+                self._fichas = min(self.capacidad, self._fichas + (ahora - self._ultimo) * self.por_segundo)
+                self._ultimo = ahora
+                if self._fichas >= 1:
+                    self._fichas -= 1
+                    return
+                await asyncio.sleep((1 - self._fichas) / self.por_segundo)
+
+# 3. TEXTO
+def armar_mensaje(fila):
+    return f"⏰ *Recordatorio*\n\n" \
+           f"Hola {fila.cliente}! Te esperamos el {fila.fecha_hora_inicio.strftime('%d/%m')} " \
+           f"a las {fila.fecha_hora_inicio.strftime('%H:%M')}.\n" \
+           f"✂ {fila.servicio}\n" \
+           f"💈 Profesional: {fila.staff}"
+
+# 4. LECTURA POR LOTES (keyset sobre el índice parcial de confirmados)
+def _consulta_lote(desde, hasta, despues_de, limite):
+    consulta = select(
+        models.Turno.id,
+        models.Turno.fecha_hora_inicio,
+        models.Cliente.nombre.label("cliente"),
+        models.Cliente.telefono_normalizado.label("telefono"),
+        models.Servicio.nombre.label("servicio"),
+        models.Staff.nombre.label("staff"),
+        models.Negocio.telefono_whatsapp.label("remitente"),
+    ).join(models.Cliente, models.Turno.cliente_id == models.Cliente.id
+    ).join(models.Servicio, models.Turno.servicio_id == models.Servicio.id
+    ).join(models.Staff, models.Turno.staff_id == models.Staff.id
+    ).join(models.Negocio, models.Turno.negocio_id == models.Negocio.id
+    ).where(
+        models.Turno.estado == "confirmado",
+        models.Turno.fecha_hora_inicio >= desde,
+        models.Turno.fecha_hora_inicio < hasta,
+        # Los que ya tienen recordatorio (enviado, fallido o en curso) ni se leen
+        ~exists().where(models.RecordatorioEnviado.turno_id == models.Turno.id),
+    )
+    if despues_de:
+        d_inicio, d_id = despues_de
+        consulta = consulta.where(or_(
+            models.Turno.fecha_hora_inicio > d_inicio,
+            and_(models.Turno.fecha_hora_inicio == d_inicio, models.Turno.id > d_id)
+        ))
+    return consulta.order_by(models.Turno.fecha_hora_inicio, models.Turno.id).limit(limite)
+
+# Reclama los turnos del lote; devuelve los ids que ganó ESTA corrida
+async def _reclamar(db, ids):
+    insert = pg_insert if db.bind.dialect.name == "postgresql" else sqlite_insert
+    filas = await db.execute(
+        insert(models.RecordatorioEnviado).values(
+            [{"turno_id": i, "estado": "enviando", "intentos": 0} for i in ids]
+        ).on_conflict_do_nothing(index_elements=["turno_id"]).returning(models.RecordatorioEnviado.turno_id)
+    )
+    ganados = {f[0] for f in filas}
+    await db.commit()
+    return ganados
+
+# 5. ENVÍO CON REINTENTOS
+async def _enviar_uno(enviador, limitador, semaforo, fila):
+    async with semaforo:
+        for intento in range(1, RECORDATORIOS_REINTENTOS + 1):
+            await limitador.esperar()
+            try:
+                await enviador.enviar(fila.telefono, armar_mensaje(fila), fila.remitente)
+                return fila.id, "enviado", intento, None
+            except ErrorEnvio as e:
+                if not e.temporal or intento == RECORDATORIOS_REINTENTOS:
+                    return fila.id, "fallido", intento, str(e)
+                await asyncio.sleep(0.5 * 2 ** (intento - 1))
+            except Exception as e:
+                return fila.id, "fallido", intento, repr(e)
+
+async def _registrar_resultados(db, resultados):
+    enviados = [turno_id for turno_id, estado, _, _ in resultados if estado == "enviado"]
+    if enviados:
+        # Los exitosos en una sola sentencia
+        await db.execute(
+            update(models.RecordatorioEnviado)
+            .where(models.RecordatorioEnviado.turno_id.in_(enviados))
+            .values(estado="enviado", intentos=1, fecha=datetime.datetime.utcnow())
+        )
+    for turno_id, estado, intentos, error in resultados:
+        if estado == "enviado" and intentos == 1:
+            continue
+        await db.execute(
+            update(models.RecordatorioEnviado)
+            .where(models.RecordatorioEnviado.turno_id == turno_id)
+            .values(estado=estado, intentos=intentos, error=error, fecha=datetime.datetime.utcnow())
+        )
+    await db.commit()
+
+# 6. UNA CORRIDA COMPLETA
+# registrar=False es un ensayo: no reclama ni marca nada (los turnos siguen pendientes de recordatorio)
+async def enviar_recordatorios(enviador, ahora=None, horas=RECORDATORIO_ANTICIPACION_HORAS, lote=RECORDATORIOS_LOTE,
+                               concurrencia=RECORDATORIOS_CONCURRENCIA, por_segundo=RECORDATORIOS_POR_SEGUNDO,
+                               registrar=True):
+    desde = ahora or datetime.datetime.now()
+    hasta = desde + datetime.timedelta(hours=horas)
+    limitador = LimitadorTasa(por_segundo)
+    semaforo = asyncio.Semaphore(concurrencia)
+    resumen = {"enviados": 0, "fallidos": 0, "omitidos": 0}
+
+    despues_de = None
+    async with AsyncSessionLocal() as db:
+        while True:
+            filas = (await db.execute(_consulta_lote(desde, hasta, despues_de, lote))).all()
+            if not filas:
+                break
+            despues_de = (filas[-1].fecha_hora_inicio, filas[-1].id)
+
+            ids = [f.id for f in filas]
+            ganados = await _reclamar(db, ids) if registrar else set(ids)
+            resumen["omitidos"] += len(filas) - len(ganados)
+            resultados = await asyncio.gather(*[
+                _enviar_uno(enviador, limitador, semaforo, f) for f in filas if f.id in ganados
+            ])
+            if registrar:
+                await _registrar_resultados(db, resultados)
+            for _, estado, _, _ in resultados:
+                resumen["enviados" if estado == "enviado" else "fallidos"] += 1
+
+            if len(filas) < lote:
+                break
+    return resumen
+
+# Uso: python recordatorios.py [--horas 24] [--falso]   (programarlo con cron cada 15-30 min)
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Envía recordatorios de los turnos confirmados que se vienen.")
+    parser.add_argument("--horas", type=int, default=RECORDATORIO_ANTICIPACION_HORAS)
+    parser.add_argument("--falso", action="store_true", help="Ensayo: no envía ni registra nada, sólo muestra los mensajes")
+    args = parser.parse_args()
+
+    async def correr():
+        enviador = EnviadorFalso() if args.falso else EnviadorTwilio()
+        try:
+            resumen = await enviar_recordatorios(enviador, horas=args.horas, registrar=not args.falso)
+        finally:
+            if isinstance(enviador, EnviadorTwilio):
+                await enviador.cerrar()
+        if args.falso:
+            for telefono, texto in enviador.enviados:
+                print(f"--- {telefono}\n{texto}")
+        print(f"✅ Recordatorios: {resumen}")
+
+    asyncio.run(correr())
@@ -0,0 +1,78 @@
+import bisect
+from datetime import datetime, timedelta, date
+from sqlalchemy import or_
+from sqlalchemy.orm import Session, selectinload
+import models
+
+# --- TURNOS RECURRENTES: expansión perezosa de series ---
+
+# Hasta dónde revisamos choques al crear una serie sin fecha de fin
+HORIZONTE_SERIES_DIAS = 365
+
+# 1. Ocurrencias de una serie dentro de [desde, hasta] (fechas), sin materializar nada
+def ocurrencias(serie, desde: date, hasta: date):
+    periodo = timedelta(weeks=serie.cada_semanas or 1)
+    duracion = timedelta(minutes=serie.duracion_minutos)
+    ultima = min(hasta, serie.fecha_fin) if serie.fecha_fin else hasta
+
+    # Saltamos directo a la primera ocurrencia >= desde (sin recorrer las anteriores)
+    fecha = serie.fecha_inicio
+    if desde > fecha:
+        saltos = -(-(desde - fecha).days // periodo.days)
+        fecha = fecha + saltos * periodo
+
+    excepciones = {e.fecha for e in serie.excepciones}
+    while fecha <= ultima:
+        if fecha not in excepciones:
+            inicio = datetime.combine(fecha, serie.hora_inicio)
+            yield inicio, inicio + duracion
+        fecha += periodo
+
+# 2. Series activas de esos barberos que tocan la ventana (con sus excepciones en una consulta más)
+def series_en_rango(db: Session, staff_ids, desde: date, hasta: date):
+    return db.query(models.SerieTurno).options(
+        selectinload(models.SerieTurno.excepciones)
+    ).filter(
+        models.SerieTurno.staff_id.in_(staff_ids),
+        models.SerieTurno.activa == True,
+        models.SerieTurno.fecha_inicio <= hasta,
+        or_(models.SerieTurno.fecha_fin == None, models.SerieTurno.fecha_fin >= desde)
+    ).all()
+
+# 3. Ocupación por barbero que aportan las series en la ventana: {staff_id: [(inicio, fin), ...]}
+def ocupados_series(db: Session, staff_ids, desde: date, hasta: date):
+    ocupados = {}
+    for serie in series_en_rango(db, staff_ids, desde, hasta):
+        ocupados.setdefault(serie.staff_id, []).extend(ocurrencias(serie, desde, hasta))
+    return ocupados
+
+# 4. ¿Un turno puntual pisa alguna ocurrencia? (la restricción de la base no ve las series)
+def choca_con_series(db: Session, staff_id: int, inicio: datetime, fin: datetime):
+    # Miramos desde el día anterior por si alguna ocurrencia cruza la medianoche
+    for o_inicio, o_fin in ocupados_series(db, [staff_id], inicio.date() - timedelta(days=1), fin.date()).get(staff_id, []):
+        if o_inicio < fin and o_fin > inicio:
+            return True
+    return False
+
+# 5. Choques de una serie nueva contra la agenda del barbero en todo su horizonte.
+# Una consulta por rango para los turnos, otra para las series; la comparación es
+# una búsqueda binaria de cada turno sobre las ocurrencias ordenadas.
+def choques_serie_nueva(db: Session, serie):
+    horizonte = serie.fecha_fin or serie.fecha_inicio + timedelta(days=HORIZONTE_SERIES_DIAS)
+    propias = list(ocurrencias(serie, serie.fecha_inicio, horizonte))
+    if not propias:
+        return []
+    inicios = [i for i, _ in propias]
+
+    def pisa(inicio, fin):
+        pos = bisect.bisect_left(inicios, fin)
+        return pos > 0 and propias[pos - 1][1] > inicio
+
+    ocupados = db.query(models.Turno.fecha_hora_inicio, models.Turno.fecha_hora_fin).filter(
+        models.Turno.staff_id == serie.staff_id,
+        models.Turno.estado.in_(models.ESTADOS_ACTIVOS),
+        models.turnos_que_solapan(propias[0][0], propias[-1][1])
+    ).all()
+    ocupados += ocupados_series(db, [serie.staff_id], serie.fecha_inicio, horizonte).get(serie.staff_id, [])
+
+    return sorted({inicio.date() for inicio, fin in ocupados if pisa(inicio, fin)})
@@ -1,6 +1,6 @@
-from pydantic import BaseModel
-from typing import List, Optional
-from datetime import datetime
+from pydantic import BaseModel, Field
+from typing import List, Optional, Literal
+from datetime import datetime, date, time
 
 # --- ESQUEMAS PARA SERVICIOS ---
 class ServicioBase(BaseModel):
@@ -36,7 +36,7 @@ class Staff(StaffBase):
 
 # 1. Lo que recibimos cuando alguien quiere crear un turno
 class TurnoCreate(BaseModel):
-    negocio_id: int
+    negocio_id: Optional[int] = None # Por la API lo completa el servidor (negocio del pedido)
     staff_id: int
     servicio_id: int
     telefono_cliente: str
@@ -57,6 +57,12 @@ class Turno(BaseModel):
     class Config:
         from_attributes = True
 
+# 2b. Cambio de estado desde el panel (confirmar / cancelar). La fecha de inicio viaja con el id:
+# es parte de la clave de turnos (particionada por mes) y la búsqueda lee una sola partición
+class TurnoEstado(BaseModel):
+    estado: Literal["pendiente", "confirmado", "cancelado", "realizado"]
+    fecha_hora_inicio: datetime
+
         # --- ESQUEMA PARA EL CHAT ---
 class MensajeWhatsApp(BaseModel):
     telefono: str
@@ -64,7 +70,8 @@ class MensajeWhatsApp(BaseModel):
 
     # ---  Este ya lo usamos para recibir datos (Input)
 class ServicioCreate(ServicioBase):
-    pass
+    # Hasta un día: las búsquedas de solapamiento cuentan con ese tope (models.DURACION_MAXIMA_TURNO)
+    duracion_minutos: int = Field(gt=0, le=24 * 60)
 
 # --- AGREGAR EN SCHEMAS.PY (Para arreglar el error de Cliente) ---
 
@@ -78,7 +85,108 @@ class ClienteCreate(ClienteBase):
 
 class Cliente(ClienteBase):
     id: int
+    nombre: Optional[str] = None  # los que llegan por la web sin nombre quedan en NULL
+    telefono_normalizado: Optional[str] = None
     # fecha_registro: datetime  <-- Opcional si la tienes en models.py
 
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+# --- ESQUEMA PARA DISPONIBILIDAD ---
+class DisponibilidadStaffDia(BaseModel):
+    staff_id: int
+    staff_nombre: str
+    fecha: date
+    horarios: List[str] # "HH:MM" libres para el servicio pedido
+
+# --- ESQUEMAS PARA EL LISTADO DE TURNOS (ADMIN) ---
+class ClienteResumen(BaseModel):
+    id: int
+    nombre: Optional[str] = None
+    telefono_whatsapp: str
+
+    class Config:
+        from_attributes = True
+
+class StaffResumen(BaseModel):
+    id: int
+    nombre: str
+
+    class Config:
+        from_attributes = True
+
+class TurnoDetalle(BaseModel):
+    id: int
+    fecha_hora_inicio: datetime
+    fecha_hora_fin: datetime
+    estado: Optional[str] = None
+    origen: Optional[str] = None
+    cliente: Optional[ClienteResumen] = None
+    servicio: Optional[Servicio] = None
+    staff: Optional[StaffResumen] = None
+
+    class Config:
+        from_attributes = True
+
+class PaginaTurnos(BaseModel):
+    items: List[TurnoDetalle]
+    siguiente_cursor: Optional[str] = None # None = no hay más páginas
+
+# --- ESQUEMAS PARA LAS MÉTRICAS DEL DASHBOARD ---
+class MetricasTurnos(BaseModel):
+    turnos: int
+    servicios: int   # servicios distintos
+    pendientes: int
+    confirmados: int
+
+class MetricasGrupo(MetricasTurnos):
+    id: Optional[int] = None # staff_id o servicio_id según "agrupar"
+
+class ResumenMetricas(BaseModel):
+    total: MetricasTurnos
+    por_grupo: List[MetricasGrupo] = []
+
+# --- ESQUEMAS PARA RESERVAS EN LOTE (importación de agendas) ---
+class LoteTurnos(BaseModel):
+    turnos: List[TurnoCreate]
+
+class ResultadoLoteItem(BaseModel):
+    indice: int                     # posición en la lista enviada
+    aceptado: bool
+    turno_id: Optional[int] = None
+    motivo: Optional[str] = None    # por qué se rechazó
+
+class ResultadoLote(BaseModel):
+    aceptados: int
+    rechazados: int
+    items: List[ResultadoLoteItem]
+
+# --- ESQUEMAS PARA TURNOS RECURRENTES ---
+class SerieCreate(BaseModel):
+    negocio_id: Optional[int] = None
+    staff_id: int
+    servicio_id: int
+    telefono_cliente: str
+    nombre_cliente: Optional[str] = None
+    fecha_inicio: date           # primera ocurrencia
+    hora_inicio: time
+    cada_semanas: int = 1
+    fecha_fin: Optional[date] = None
+
+class Serie(BaseModel):
+    id: int
+    staff_id: int
+    servicio_id: int
+    cliente_id: int
+    fecha_inicio: date
+    fecha_fin: Optional[date] = None
+    hora_inicio: time
+    duracion_minutos: int
+    cada_semanas: int
+    activa: bool
+
+    class Config:
+        from_attributes = True
+
+class ExcepcionSerieCreate(BaseModel):
+    fecha: date
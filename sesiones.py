@@ -0,0 +1,140 @@
+import os
+import json
+import time
+import asyncio
+import sqlite3
+import threading
+from collections import OrderedDict
+from datetime import datetime
+
+# --- SESIONES DE CONVERSACIÓN (por teléfono) ---
+# Guardamos dónde está cada cliente en el menú para que "2" o "10:30" se entiendan
+# sin volver a consultar el catálogo:
+#   - id del cliente (el nombre no: se lee en cada mensaje de crud.cache_clientes)
+#   - última lista de servicios que le mostramos
+#   - reserva a medio armar (servicio elegido, horarios ofrecidos)
+# Backend "memoria" (un worker) o "sqlite" (archivo compartido por varios workers en la misma máquina).
+SESIONES_BACKEND = os.getenv("SESIONES_BACKEND", "memoria")
+SESIONES_SQLITE_RUTA = os.getenv("SESIONES_SQLITE_RUTA", "sesiones.db")
+SESIONES_TTL_SEGUNDOS = int(os.getenv("SESIONES_TTL_SEGUNDOS", "1800"))
+SESIONES_MAX = int(os.getenv("SESIONES_MAX", "10000"))
+
+# Pasos de la conversación
+MENU = "menu"
+ELIGIENDO_SERVICIO = "eligiendo_servicio"
+ELIGIENDO_HORARIO = "eligiendo_horario"
+
+class Sesion:
+    def __init__(self, cliente_id, paso=MENU, servicios=None, servicio_id=None, opciones=None):
+        self.cliente_id = cliente_id
+        self.paso = paso
+        self.servicios = servicios or {}    # id -> (nombre, duracion_minutos) de la última lista mostrada
+        self.servicio_id = servicio_id      # servicio elegido para la reserva en curso
+        self.opciones = opciones or []      # [(inicio, staff_id)] horarios ofrecidos, en el orden mostrado
+
+    def reiniciar(self):
+        self.paso = MENU
+        self.servicio_id = None
+        self.opciones = []
+
+    def como_dict(self):
+        return {
+            "cliente_id": self.cliente_id,
+            "paso": self.paso,
+            "servicios": {str(k): list(v) for k, v in self.servicios.items()},
+            "servicio_id": self.servicio_id,
+            "opciones": [[inicio.isoformat(), staff_id] for inicio, staff_id in self.opciones],
+        }
+
+    @classmethod
+    def desde_dict(cls, d):
+        return cls(
+            # Las guardadas con el formato anterior traían [id, nombre] (vencen solas con el TTL)
+            d["cliente_id"] if "cliente_id" in d else d["cliente"][0],
+            d["paso"],
+            {int(k): tuple(v) for k, v in d["servicios"].items()},
+            d["servicio_id"],
+            [(datetime.fromisoformat(inicio), staff_id) for inicio, staff_id in d["opciones"]],
+        )
+
+# 1. En memoria: LRU con vencimiento
+class AlmacenMemoria:
+    def __init__(self, maximo=SESIONES_MAX, ttl=SESIONES_TTL_SEGUNDOS):
+        self.maximo = maximo
+        self.ttl = ttl
+        self._datos = OrderedDict()  # telefono -> (Sesion, expira)
+        self._lock = threading.Lock()
+
+    async def obtener(self, telefono):
+        with self._lock:
+            entrada = self._datos.get(telefono)
+            if entrada is None:
+                return None
+            if entrada[1] <= time.monotonic():
+                del self._datos[telefono]
+                return None
+            self._datos.move_to_end(telefono)
+            return entrada[0]
+
+    async def guardar(self, telefono, sesion):
+        with self._lock:
+            self._datos[telefono] = (sesion, time.monotonic() + self.ttl)
+            self._datos.move_to_end(telefono)
+            while len(self._datos) > self.maximo:
+                self._datos.popitem(last=False)
+
+    async def borrar(self, telefono):
+        with self._lock:
+            self._datos.pop(telefono, None)
+
+# 2. En SQLite: un archivo local que ven todos los workers (la sesión viaja como JSON)
+class AlmacenSQLite:
+    def __init__(self, ruta=SESIONES_SQLITE_RUTA, ttl=SESIONES_TTL_SEGUNDOS):
+        self.ttl = ttl
+        self._conexion = sqlite3.connect(ruta, check_same_thread=False, isolation_level=None)
+        self._conexion.execute("PRAGMA journal_mode=WAL")
+        self._conexion.execute(
+            "CREATE TABLE IF NOT EXISTS sesiones (telefono TEXT PRIMARY KEY, datos TEXT NOT NULL, expira REAL NOT NULL)"
+        )
+        self._lock = threading.Lock()
+        self._escrituras = 0
+
+    def _obtener(self, telefono):
+        with self._lock:
+            fila = self._conexion.execute(
+                "SELECT datos FROM sesiones WHERE telefono = ? AND expira > ?", (telefono, time.time())
+            ).fetchone()
+        return Sesion.desde_dict(json.loads(fila[0])) if fila else None
+
+    def _guardar(self, telefono, sesion):
+        with self._lock:
+            self._conexion.execute(
+                "INSERT INTO sesiones (telefono, datos, expira) VALUES (?, ?, ?) "
+                "ON CONFLICT(telefono) DO UPDATE SET datos = excluded.datos, expira = excluded.expira",
+                (telefono, json.dumps(sesion.como_dict()), time.time() + self.ttl)
+            )
+            # De vez en cuando borramos las vencidas (no vale la pena un índice por expira)
+            self._escrituras += 1
+            if self._escrituras % 500 == 0:
+                self._conexion.execute("DELETE FROM sesiones WHERE expira < ?", (time.time(),))
+
+    def _borrar(self, telefono):
+        with self._lock:
+            self._conexion.execute("DELETE FROM sesiones WHERE telefono = ?", (telefono,))
+
+    # sqlite3 bloquea: lo corremos en un hilo para no frenar el event loop
+    async def obtener(self, telefono):
+        return await asyncio.to_thread(self._obtener, telefono)
+
+    async def guardar(self, telefono, sesion):
+        await asyncio.to_thread(self._guardar, telefono, sesion)
+
+    async def borrar(self, telefono):
+        await asyncio.to_thread(self._borrar, telefono)
+
+def crear_almacen(backend=SESIONES_BACKEND):
+    if backend == "sqlite":
+        return AlmacenSQLite()
+    return AlmacenMemoria()
+
+almacen = crear_almacen()
@@ -0,0 +1,83 @@
+import os
+import re
+from sqlalchemy import select, update, delete, bindparam, tuple_
+import models
+
+# --- TELÉFONOS EN FORMATO ÚNICO (E.164: "+595981123456") ---
+# Los números llegan como "+595 981 123-456", "0981123456", "981123456" o el "From" crudo
+# de Twilio ("whatsapp:+595981123456"). El cliente se identifica por la forma normalizada
+# (columna telefono_normalizado, índice único por negocio); telefono_whatsapp queda como se cargó.
+CODIGO_PAIS = os.getenv("CODIGO_PAIS", "595")  # Paraguay
+# Hasta este largo (sin el 0 inicial) es un número nacional: 981123456
+LARGO_NACIONAL = int(os.getenv("TELEFONO_LARGO_NACIONAL", "9"))
+
+_NO_DIGITOS = re.compile(r"\D")
+
+def normalizar_telefono(telefono: str, codigo_pais: str = CODIGO_PAIS):
+    if not telefono:
+        return ""
+    crudo = telefono.strip().lower().replace("whatsapp:", "").strip()
+    digitos = _NO_DIGITOS.sub("", crudo)
+    if not digitos:
+        return ""
+    if crudo.startswith("+"):
+        pass
+    elif digitos.startswith("00"):
+        digitos = digitos[2:]                            # 00595981... (prefijo internacional)
+    elif digitos.startswith("0"):
+        digitos = codigo_pais + digitos.lstrip("0")      # 0981... (nacional)
+    elif len(digitos) <= LARGO_NACIONAL:
+        digitos = codigo_pais + digitos                  # 981... (nacional sin el 0)
+    return "+" + digitos
+
+# Para la búsqueda: lo que el usuario tipeó, si parece un teléfono (al menos 3 dígitos y
+# nada más que dígitos y separadores), como prefijo normalizado. Si no, None.
+_PARECE_TELEFONO = re.compile(r"^[\s+()\-./\d]*\d{3}[\s+()\-./\d]*$")
+
+def prefijo_telefono(texto: str, codigo_pais: str = CODIGO_PAIS):
+    if not _PARECE_TELEFONO.match(texto or ""):
+        return None
+    return normalizar_telefono(texto, codigo_pais)
+
+# Completa telefono_normalizado en clientes viejos. Si dos clientes del mismo negocio resultan
+# ser el mismo número ("0981..." y "+595981..."), queda el más antiguo y los turnos y series
+# del otro pasan a él. Lo llama init_db antes de crear el índice único.
+def completar_telefonos_normalizados(conn):
+    pendientes = conn.execute(select(
+        models.Cliente.id, models.Cliente.negocio_id, models.Cliente.telefono_whatsapp
+    ).where(models.Cliente.telefono_normalizado.is_(None)).order_by(models.Cliente.id)).all()
+    if not pendientes:
+        return 0
+
+    claves = {(f.negocio_id, normalizar_telefono(f.telefono_whatsapp)) for f in pendientes}
+    # Los que ya estaban normalizados (de una corrida anterior) ganan
+    existentes = {}
+    lista = list(claves)
+    for i in range(0, len(lista), 500):
+        for f in conn.execute(select(
+            models.Cliente.id, models.Cliente.negocio_id, models.Cliente.telefono_normalizado
+        ).where(tuple_(models.Cliente.negocio_id, models.Cliente.telefono_normalizado).in_(lista[i:i + 500]))):
+            existentes[(f.negocio_id, f.telefono_normalizado)] = f.id
+
+    actualizar, duplicados = [], []
+    for f in pendientes:
+        clave = (f.negocio_id, normalizar_telefono(f.telefono_whatsapp))
+        if clave in existentes:
+            duplicados.append((f.id, existentes[clave]))
+        else:
+            existentes[clave] = f.id
+            actualizar.append({"b_id": f.id, "b_normalizado": clave[1]})
+
+    for viejo, nuevo in duplicados:
+        for modelo in (models.Turno, models.SerieTurno):
+            conn.execute(update(modelo).where(modelo.cliente_id == viejo).values(cliente_id=nuevo))
+        conn.execute(delete(models.Cliente).where(models.Cliente.id == viejo))
+    if actualizar:
+        conn.execute(
+            update(models.Cliente).where(models.Cliente.id == bindparam("b_id"))
+            .values(telefono_normalizado=bindparam("b_normalizado")),
+            actualizar
+        )
+    if duplicados:
+        print(f"🔗 {len(duplicados)} clientes duplicados por formato de teléfono unificados")
+    return len(actualizar)
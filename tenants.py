@@ -0,0 +1,134 @@
+import os
+import sys
+import time
+import hashlib
+import secrets
+import threading
+from collections import namedtuple
+from fastapi import Depends, Header, HTTPException
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import get_db
+import models
+
+# --- RESOLUCIÓN DEL NEGOCIO (multi-barbería en un solo despliegue) ---
+# Cada pedido dice a qué negocio pertenece:
+#   - el panel / la API con el header X-API-Key (guardamos sólo su sha256)
+#   - el webhook por el número de Twilio al que escribió el cliente ("To")
+# La búsqueda es por índice único y queda en memoria: el costo por pedido no
+# depende de cuántos negocios haya.
+TENANTS_TTL_SEGUNDOS = int(os.getenv("TENANTS_TTL_SEGUNDOS", "300"))
+# Negocio para pedidos sin API key o webhooks sin "To" (instalaciones de un solo local, pruebas).
+# Sin definir (lo normal en producción) => se exige API key. Un "To" que no es de ningún
+# negocio nunca cae acá: se registra y el webhook no contesta.
+NEGOCIO_ID_POR_DEFECTO = int(os.getenv("NEGOCIO_ID_POR_DEFECTO", "") or 0) or None
+
+NegocioRef = namedtuple("NegocioRef", ["id", "nombre"])
+
+def hash_api_key(api_key: str):
+    return hashlib.sha256(api_key.encode()).hexdigest()
+
+def generar_api_key():
+    return "brb_" + secrets.token_urlsafe(32)
+
+class CacheTenants:
+    def __init__(self, ttl=TENANTS_TTL_SEGUNDOS):
+        self.ttl = ttl
+        self._datos = {}  # ("key", hash) | ("tel", numero) -> (NegocioRef o None, expira)
+        self._lock = threading.Lock()
+
+    def obtener(self, clave):
+        with self._lock:
+            entrada = self._datos.get(clave)
+        if entrada and entrada[1] > time.monotonic():
+            return entrada
+        return None
+
+    def guardar(self, clave, ref):
+        # También guardamos los "no existe" para que una key inválida no golpee la base en cada pedido
+        with self._lock:
+            self._datos[clave] = (ref, time.monotonic() + self.ttl)
+
+    def invalidar(self):
+        with self._lock:
+            self._datos.clear()
+
+cache_tenants = CacheTenants()
+
+def _consulta(clave):
+    tipo, valor = clave
+    columna = models.Negocio.api_key_hash if tipo == "key" else models.Negocio.telefono_whatsapp
+    return select(models.Negocio.id, models.Negocio.nombre).where(columna == valor, models.Negocio.activo == True)
+
+def _fila_a_ref(fila):
+    return NegocioRef(fila.id, fila.nombre) if fila else None
+
+# 1. Sync (endpoints del panel)
+def resolver(db: Session, clave):
+    entrada = cache_tenants.obtener(clave)
+    if entrada:
+        return entrada[0]
+    ref = _fila_a_ref(db.execute(_consulta(clave)).first())
+    cache_tenants.guardar(clave, ref)
+    return ref
+
+# 2. Async (webhook)
+async def resolver_async(db: AsyncSession, clave):
+    entrada = cache_tenants.obtener(clave)
+    if entrada:
+        return entrada[0]
+    ref = _fila_a_ref((await db.execute(_consulta(clave))).first())
+    cache_tenants.guardar(clave, ref)
+    return ref
+
+# Dependencia de FastAPI: el negocio_id del pedido (una vez por pedido, casi siempre sin consultas)
+def negocio_actual(x_api_key: str = Header(None), db: Session = Depends(get_db)) -> int:
+    if x_api_key:
+        ref = resolver(db, ("key", hash_api_key(x_api_key)))
+        if ref is None:
+            raise HTTPException(status_code=401, detail="API key inválida")
+        return ref.id
+    if NEGOCIO_ID_POR_DEFECTO is None:
+        raise HTTPException(status_code=401, detail="Falta el header X-API-Key")
+    return NEGOCIO_ID_POR_DEFECTO
+
+# Webhook: "To" llega como "whatsapp:+1415..." ; devuelve None si no es de ningún negocio
+async def negocio_por_whatsapp(db: AsyncSession, to: str):
+    if not to:
+        return NEGOCIO_ID_POR_DEFECTO
+    numero = to.replace("whatsapp:", "")
+    ref = await resolver_async(db, ("tel", numero))
+    if ref is None:
+        print(f"⚠️ Webhook para un número no registrado ({numero}): se ignora")
+        return None
+    return ref.id
+
+# Uso:
+#   python tenants.py nuevo "Barbería Norte" +14155238886   -> crea el negocio y muestra su API key
+#   python tenants.py rotar 3                               -> nueva API key para el negocio 3
+if __name__ == "__main__":
+    from database import SessionLocal
+    db = SessionLocal()
+    try:
+        api_key = generar_api_key()
+        if len(sys.argv) >= 3 and sys.argv[1] == "nuevo":
+            negocio = models.Negocio(
+                nombre=sys.argv[2],
+                telefono_whatsapp=sys.argv[3] if len(sys.argv) > 3 else None,
+                api_key_hash=hash_api_key(api_key),
+                activo=True
+            )
+            db.add(negocio)
+        elif len(sys.argv) == 3 and sys.argv[1] == "rotar":
+            negocio = db.get(models.Negocio, int(sys.argv[2]))
+            if negocio is None:
+                sys.exit("❌ Negocio no encontrado")
+            negocio.api_key_hash = hash_api_key(api_key)
+        else:
+            sys.exit("Uso: python tenants.py nuevo NOMBRE [NUMERO_WHATSAPP] | rotar NEGOCIO_ID")
+        db.commit()
+        print(f"✅ Negocio {negocio.id} ({negocio.nombre})")
+        print(f"🔑 API key (guárdala, no se vuelve a mostrar): {api_key}")
+    finally:
+        db.close()
@@ -0,0 +1,46 @@
+import os
+import sys
+import asyncio
+import tempfile
+import pytest
+
+# Las pruebas corren siempre contra un SQLite descartable (database.py lee DATABASE_URL al importarse)
+_DIR_PRUEBAS = tempfile.mkdtemp(prefix="barberia_pruebas_")
+os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(_DIR_PRUEBAS, "pruebas.db")
+os.environ.setdefault("NEGOCIO_ID_POR_DEFECTO", "1")
+
+# Los módulos de la app están en la raíz del repo
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Base chica y determinista, con los mismos datos sintéticos que los benchmarks
+@pytest.fixture
+def base():
+    import database
+    import tenants
+    import crud
+    import catalogo
+    import sesiones
+    from benchmarks.datos_sinteticos import Escala, preparar_base
+    escala = Escala(negocios=1, staff_por_negocio=2, clientes_por_negocio=20, turnos_por_staff=20)
+    preparar_base(database.engine, escala)
+    # Las cachés en memoria apuntarían a ids de la base anterior
+    tenants.cache_tenants.invalidar()
+    crud.cache_clientes = crud.CacheClientes()
+    catalogo.servicios.invalidar()
+    catalogo.staff.invalidar()
+    sesiones.almacen = sesiones.AlmacenMemoria()
+    return escala
+
+# asyncio.run que al final suelta las conexiones async (quedan atadas a ese event loop)
+@pytest.fixture
+def correr():
+    import database
+
+    def _correr(corrutina):
+        async def envuelta():
+            try:
+                return await corrutina
+            finally:
+                await database.async_engine.dispose()
+        return asyncio.run(envuelta())
+    return _correr
@@ -0,0 +1,43 @@
+import datetime
+from fastapi.testclient import TestClient
+import database
+import crud
+import bot
+import main
+from benchmarks.datos_sinteticos import telefono_cliente
+
+# Lejos de la agenda sintética: todos los barberos libres
+DIA = datetime.date.today() + datetime.timedelta(days=60)
+
+def _responder(correr, texto, telefono=telefono_cliente(1, 1)):
+    async def responder():
+        async with database.AsyncSessionLocal() as db:
+            respuesta, _ = await bot.responder_mensaje(db, texto, telefono, 1)
+            return respuesta
+    return correr(responder())
+
+def test_fuera_de_horario_ofrece_el_dia_siguiente(base, correr):
+    respuesta = _responder(correr, f"1 {DIA} 23:00")
+    assert "fuera de nuestro horario" in respuesta and "ocupado" not in respuesta
+    assert f"1 {DIA + datetime.timedelta(days=1)} 09:00" in respuesta
+
+    # La alternativa ofrecida se reserva con el número de la opción
+    assert "Reserva Confirmada" in _responder(correr, "1")
+
+def test_fecha_pasada_ofrece_desde_ahora(base, correr):
+    ayer = datetime.date.today() - datetime.timedelta(days=1)
+    respuesta = _responder(correr, f"1 {ayer} 10:00")
+    assert "ya pasó" in respuesta and "ocupado" not in respuesta
+    ofrecido = datetime.datetime.strptime(respuesta.split("\n1. *1 ")[1][:16], "%Y-%m-%d %H:%M")
+    assert ofrecido > datetime.datetime.now()
+
+def test_horario_libre_se_reserva(base, correr):
+    assert "Reserva Confirmada" in _responder(correr, f"1 {DIA} 10:00")
+
+def test_renombrar_cliente_se_ve_en_la_conversacion_en_curso(base, correr):
+    assert "¡Hola Cliente 1!" in _responder(correr, "hola")
+    cliente = crud.cache_clientes.obtener(1, telefono_cliente(1, 1))
+    r = TestClient(main.app).put(f"/clientes/{cliente.id}", json={"nombre": "Juan", "telefono_whatsapp": telefono_cliente(1, 1)})
+    assert r.status_code == 200
+    # Misma sesión (no venció): el saludo ya usa el nombre nuevo
+    assert "¡Hola Juan!" in _responder(correr, "hola")
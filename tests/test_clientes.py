@@ -0,0 +1,42 @@
+from fastapi.testclient import TestClient
+import database
+import models
+import crud
+import main
+from benchmarks.datos_sinteticos import telefono_cliente
+
+def _cliente(telefono):
+    db = database.SessionLocal()
+    try:
+        return crud.resolver_cliente(db, telefono, negocio_id=1)
+    finally:
+        db.close()
+
+def test_actualizar_cliente_cambia_el_telefono_de_busqueda(base):
+    api = TestClient(main.app)
+    viejo = telefono_cliente(1, 1)
+    cliente = _cliente(viejo)  # queda en caché bajo el número viejo
+
+    r = api.put(f"/clientes/{cliente.id}", json={"nombre": "Juan Nuevo", "telefono_whatsapp": "0981 555 123"})
+    assert r.status_code == 200
+    assert r.json()["telefono_whatsapp"] == "0981 555 123"
+    assert r.json()["telefono_normalizado"] == "+595981555123"
+
+    # Se encuentra por el número nuevo (en cualquier formato) y con el nombre nuevo
+    assert _cliente("+595981555123") == crud.ClienteRef(cliente.id, "Juan Nuevo")
+    assert [c["id"] for c in api.get("/clientes/buscar", params={"q": "0981555"}).json()] == [cliente.id]
+    # El número viejo ya no es de este cliente
+    assert _cliente(viejo).id != cliente.id
+
+def test_actualizar_cliente_con_telefono_de_otro_da_409(base):
+    api = TestClient(main.app)
+    uno, otro = _cliente(telefono_cliente(1, 1)), _cliente(telefono_cliente(1, 2))
+
+    r = api.put(f"/clientes/{uno.id}", json={"nombre": "Repetido", "telefono_whatsapp": telefono_cliente(1, 2)})
+    assert r.status_code == 409
+    db = database.SessionLocal()
+    try:
+        assert db.get(models.Cliente, uno.id).nombre == uno.nombre
+    finally:
+        db.close()
+    assert _cliente(telefono_cliente(1, 2)) == otro
@@ -0,0 +1,65 @@
+import datetime
+import pytest
+from fastapi.testclient import TestClient
+import database
+import models
+import crud
+import schemas
+import disponibilidad
+import main
+
+MANANA = datetime.date.today() + datetime.timedelta(days=30)
+
+def _turno(hora, telefono="0981000111"):
+    return schemas.TurnoCreate(
+        negocio_id=1, staff_id=1, servicio_id=1, telefono_cliente=telefono,
+        fecha_hora_inicio=datetime.datetime.combine(MANANA, datetime.time(hora)),
+    )
+
+def test_reservar_entra_en_el_presupuesto(base):
+    db = database.SessionLocal()
+    try:
+        crud.resolver_cliente(db, "0981000111", negocio_id=1)  # cliente ya conocido (en caché)
+        # servicio, series del barbero, INSERT y la lectura de la respuesta con servicio y staff
+        with database.medir_consultas("reservar", presupuesto=4) as alcance:
+            turno = crud.create_turno(db, _turno(10))
+            assert turno.servicio.nombre and turno.staff.nombre  # ya cargados: no suman consultas
+        assert alcance.sospechas_n1() == []
+    finally:
+        db.close()
+
+def test_disponibilidad_del_dia_entra_en_el_presupuesto(base):
+    db = database.SessionLocal()
+    try:
+        with database.medir_consultas("turnos del día", presupuesto=2):
+            disponibilidad.turnos_del_dia(db, 1, MANANA)
+    finally:
+        db.close()
+
+def test_lazy_load_por_fila_se_pasa_del_presupuesto(base, monkeypatch):
+    monkeypatch.setattr(database, "DB_N1_REPETICIONES", 3)
+    db = database.SessionLocal()
+    try:
+        with pytest.raises(database.PresupuestoConsultasExcedido) as error:
+            with database.medir_consultas("listado con lazy loads", presupuesto=5) as alcance:
+                for turno in db.query(models.Turno).limit(10):
+                    turno.cliente.nombre  # un SELECT de clientes por fila
+        assert "listado con lazy loads" in str(error.value)
+        # La sentencia repetida queda marcada como sospecha de N+1, con el lugar que la disparó
+        sentencia, veces = alcance.sospechas_n1()[0]
+        assert "FROM clientes" in sentencia and veces >= 3
+        assert "test_consultas.py" in alcance.sitios[sentencia]
+    finally:
+        db.close()
+
+def test_presupuesto_por_pedido(base, monkeypatch):
+    cliente = TestClient(main.app)
+    datos = {"staff_id": 1, "servicio_id": 1, "telefono_cliente": "0981000222"}
+
+    monkeypatch.setattr(database, "DB_PRESUPUESTO_CONSULTAS", 8)
+    r = cliente.post("/reservar/", json=dict(datos, fecha_hora_inicio=f"{MANANA}T11:00:00"))
+    assert r.status_code == 200
+
+    monkeypatch.setattr(database, "DB_PRESUPUESTO_CONSULTAS", 2)
+    with pytest.raises(database.PresupuestoConsultasExcedido):
+        cliente.post("/reservar/", json=dict(datos, fecha_hora_inicio=f"{MANANA}T12:00:00"))
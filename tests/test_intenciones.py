@@ -0,0 +1,44 @@
+import pytest
+from intenciones import clasificar
+
+# Frases que el bot entendía antes del router precompilado: tienen que seguir yendo al mismo lado
+@pytest.mark.parametrize("texto, esperada", [
+    ("servicios", "servicios"),
+    ("Servicios!", "servicios"),
+    ("servicios por favor", "servicios"),
+    ("quiero ver los servicios", "servicios"),
+    ("mis reservas", "mis_reservas"),
+    ("Quiero ver mis reservas", "mis_reservas"),
+    ("reservas", "mis_reservas"),
+    ("hola", "saludo"),
+    ("Buenas tardes, servicios?", "saludo"),
+    ("hola quiero ver mis reservas", "saludo"),
+    ("¿servicios?", "servicios"),
+    ("Buen día, quería un turno", "saludo"),
+    ("Qué tal? tienen lugar", "saludo"),
+    ("mis amigos quieren ver mis reservas", "mis_reservas"),
+    ("mis turnos", "desconocido"),
+])
+def test_frases_de_menu(texto, esperada):
+    assert clasificar(texto).nombre == esperada
+
+def test_reserva_completa():
+    intencion = clasificar("1 2026-02-28 10:00")
+    assert intencion.nombre == "reserva"
+    assert intencion.datos == {"servicio_id": "1", "fecha": "2026-02-28", "hora": "10:00"}
+
+def test_horario_sin_fecha():
+    intencion = clasificar("10:30hs")
+    assert intencion.nombre == "horario"
+    assert intencion.datos["hora_sola"] == "10:30" and intencion.datos["fecha_sola"] is None
+
+@pytest.mark.parametrize("texto, esperada", [
+    ("2", "opcion"),
+    ("150", "opcion"),
+    ("10:30hs", "horario"),
+    ("mañana 28/02", "reserva_invalida"),
+    ("chicos", "desconocido"),
+    ("quiero reservar", "desconocido"),
+])
+def test_otras_intenciones(texto, esperada):
+    assert clasificar(texto).nombre == esperada
@@ -0,0 +1,42 @@
+import re
+import datetime
+from fastapi.testclient import TestClient
+import main
+
+# nombre{etiquetas} valor (formato de texto de Prometheus 0.0.4)
+LINEA = re.compile(r'^([a-zA-Z_:][a-zA-Z0-9_:]*)(\{(?:[a-zA-Z_][a-zA-Z0-9_]*="(?:[^"\\]|\\.)*",?)*\})? (\S+)$')
+
+def _leer(texto):
+    valores = {}
+    for linea in texto.splitlines():
+        if linea.startswith("#"):
+            assert linea.startswith(("# HELP ", "# TYPE ")), linea
+            continue
+        m = LINEA.match(linea)
+        assert m, f"línea inválida: {linea!r}"
+        valores[m.group(1) + (m.group(2) or "")] = float(m.group(3))
+    return valores
+
+def test_metrics_por_plantilla_de_ruta(base):
+    api = TestClient(main.app)
+    assert api.get("/turnos/").status_code == 200
+    inicio = datetime.datetime.combine(datetime.date.today(), datetime.time(10)).isoformat()
+    assert api.patch("/turnos/999999", json={"estado": "cancelado", "fecha_hora_inicio": inicio}).status_code == 404
+
+    r = api.get("/metrics")
+    assert r.status_code == 200
+    assert r.headers["content-type"].startswith("text/plain; version=0.0.4")
+    valores = _leer(r.text)
+
+    assert valores['http_request_duration_seconds_count{method="GET",route="/turnos/"}'] >= 1
+    assert valores['http_request_duration_seconds_bucket{method="GET",route="/turnos/",le="+Inf"}'] >= 1
+    assert valores['http_requests_total{method="GET",route="/turnos/",status="200"}'] >= 1
+    # El listado consulta la base: su tiempo y sus sentencias quedan en la ruta
+    assert valores['http_request_db_seconds_sum{method="GET",route="/turnos/"}'] > 0
+    assert valores['http_request_db_queries_total{method="GET",route="/turnos/"}'] > 0
+    # Con id en la URL se cuenta la plantilla, no una serie por turno
+    assert valores['http_requests_total{method="PATCH",route="/turnos/{turno_id}",status="404"}'] >= 1
+    assert not any("999999" in clave for clave in valores)
+
+    for gauge in ("db_pool_size", "db_pool_checked_out", "db_pool_checked_in", "db_pool_overflow"):
+        assert f'{gauge}{{pool="sync"}}' in valores and f'{gauge}{{pool="async"}}' in valores
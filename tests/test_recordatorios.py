@@ -0,0 +1,82 @@
+import time
+import asyncio
+import datetime
+from sqlalchemy import select, func
+import database
+import models
+import recordatorios
+
+# Una ventana que cubre toda la agenda sintética (arranca un par de días antes de hoy)
+AHORA = datetime.datetime.combine(datetime.date.today() - datetime.timedelta(days=3), datetime.time.min)
+HORAS = 24 * 10
+
+class EnviadorConHora(recordatorios.EnviadorFalso):
+    def __init__(self, fallar_telefonos=()):
+        super().__init__(fallar_telefonos)
+        self.horas = []
+
+    async def enviar(self, telefono, texto, remitente=None):
+        await super().enviar(telefono, texto, remitente)
+        self.horas.append(time.monotonic())
+
+def _confirmados():
+    with database.engine.connect() as conn:
+        return conn.execute(select(models.Turno.id, models.Cliente.telefono_normalizado).join(
+            models.Cliente, models.Turno.cliente_id == models.Cliente.id
+        ).where(models.Turno.estado == "confirmado").order_by(models.Turno.id)).all()
+
+def _registrados():
+    with database.engine.connect() as conn:
+        return dict(conn.execute(select(
+            models.RecordatorioEnviado.estado, func.count()
+        ).group_by(models.RecordatorioEnviado.estado)).all())
+
+def test_limitador_respeta_la_tasa():
+    async def pedir(cantidad):
+        limitador = recordatorios.LimitadorTasa(por_segundo=50, rafaga=5)
+        inicio = time.monotonic()
+        for _ in range(cantidad):
+            await limitador.esperar()
+        return time.monotonic() - inicio
+
+    # 5 fichas de arranque; las 25 restantes a 50 por segundo
+    duracion = asyncio.run(pedir(30))
+    assert 0.45 <= duracion < 1.5
+
+def test_dos_corridas_en_la_misma_ventana_envian_una_vez(base, correr):
+    confirmados = _confirmados()
+    assert confirmados
+
+    primera = EnviadorConHora()
+    resumen = correr(recordatorios.enviar_recordatorios(primera, ahora=AHORA, horas=HORAS, lote=7, por_segundo=20))
+    assert resumen == {"enviados": len(confirmados), "fallidos": 0, "omitidos": 0}
+    # Un mensaje por turno (un cliente con dos turnos recibe dos)
+    assert len(primera.enviados) == len(confirmados)
+
+    segunda = EnviadorConHora()
+    resumen = correr(recordatorios.enviar_recordatorios(segunda, ahora=AHORA, horas=HORAS, lote=7, por_segundo=20))
+    assert resumen == {"enviados": 0, "fallidos": 0, "omitidos": 0}
+    assert segunda.enviados == []
+    assert _registrados() == {"enviado": len(confirmados)}
+
+def test_envios_respetan_el_limite(base, correr):
+    enviador = EnviadorConHora()
+    correr(recordatorios.enviar_recordatorios(enviador, ahora=AHORA, horas=HORAS, por_segundo=20))
+    enviados = len(enviador.horas)
+    assert enviados > 20
+    # Ráfaga de 20 y después 20 por segundo: el resto no puede salir antes
+    assert enviador.horas[-1] - enviador.horas[0] >= 0.9 * (enviados - 20) / 20
+
+def test_rechazo_definitivo_no_se_reintenta_en_la_corrida_siguiente(base, correr):
+    confirmados = _confirmados()
+    rechazado = confirmados[0].telefono_normalizado
+    del_rechazado = sum(1 for c in confirmados if c.telefono_normalizado == rechazado)
+
+    enviador = EnviadorConHora(fallar_telefonos=[rechazado])
+    resumen = correr(recordatorios.enviar_recordatorios(enviador, ahora=AHORA, horas=HORAS, por_segundo=1000))
+    assert resumen["fallidos"] == del_rechazado
+    assert resumen["enviados"] == len(confirmados) - del_rechazado
+
+    otra = EnviadorConHora()
+    assert correr(recordatorios.enviar_recordatorios(otra, ahora=AHORA, horas=HORAS, por_segundo=1000))["enviados"] == 0
+    assert _registrados() == {"enviado": len(confirmados) - del_rechazado, "fallido": del_rechazado}
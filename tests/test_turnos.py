@@ -0,0 +1,97 @@
+import datetime
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from fastapi.testclient import TestClient
+import database
+import models
+import crud
+import schemas
+import tenants
+import main
+from benchmarks.datos_sinteticos import telefono_cliente
+
+MANANA = datetime.date.today() + datetime.timedelta(days=30)
+
+def _reservar(hora, telefono="0981000111"):
+    db = database.SessionLocal()
+    try:
+        turno = crud.create_turno(db, schemas.TurnoCreate(
+            negocio_id=1, staff_id=1, servicio_id=1, telefono_cliente=telefono,
+            fecha_hora_inicio=datetime.datetime.combine(MANANA, datetime.time(hora)),
+        ))
+        return turno.id, turno.fecha_hora_inicio.isoformat()
+    finally:
+        db.close()
+
+def test_cambiar_estado_turno(base):
+    api = TestClient(main.app)
+    turno_id, inicio = _reservar(10)
+
+    r = api.patch(f"/turnos/{turno_id}", json={"estado": "cancelado", "fecha_hora_inicio": inicio})
+    assert r.status_code == 200
+    assert r.json()["estado"] == "cancelado"
+
+    # El horario quedó libre: otro lo reserva y el cancelado ya no puede volver
+    assert _reservar(10, telefono="0981000222")
+    r = api.patch(f"/turnos/{turno_id}", json={"estado": "confirmado", "fecha_hora_inicio": inicio})
+    assert r.status_code == 409
+
+def test_cambiar_estado_turno_sin_la_clave_completa_o_de_otro_negocio(base):
+    api = TestClient(main.app)
+    turno_id, inicio = _reservar(10)
+    otra_hora = datetime.datetime.combine(MANANA, datetime.time(11)).isoformat()
+
+    r = api.patch(f"/turnos/{turno_id}", json={"estado": "cancelado", "fecha_hora_inicio": otra_hora})
+    assert r.status_code == 404
+
+    db = database.SessionLocal()
+    try:
+        db.add(models.Negocio(nombre="Otra Barbería", api_key_hash=tenants.hash_api_key("clave-otra")))
+        db.commit()
+    finally:
+        db.close()
+    r = api.patch(f"/turnos/{turno_id}", json={"estado": "cancelado", "fecha_hora_inicio": inicio},
+                  headers={"X-API-Key": "clave-otra"})
+    assert r.status_code == 404
+
+    db = database.SessionLocal()
+    try:
+        assert db.query(models.Turno).filter(models.Turno.id == turno_id).one().estado == "confirmado"
+    finally:
+        db.close()
+
+def _filas(inicio):
+    db = database.SessionLocal()
+    try:
+        return db.query(models.Turno).filter(models.Turno.staff_id == 1, models.Turno.fecha_hora_inicio == inicio).count()
+    finally:
+        db.close()
+
+def test_mismo_horario_dos_veces_queda_un_solo_turno(base):
+    api = TestClient(main.app)
+    datos = {"staff_id": 1, "servicio_id": 1, "fecha_hora_inicio": f"{MANANA}T15:00:00"}
+
+    assert api.post("/reservar/", json=dict(datos, telefono_cliente=telefono_cliente(1, 1))).status_code == 200
+    r = api.post("/reservar/", json=dict(datos, telefono_cliente=telefono_cliente(1, 2)))
+    assert r.status_code == 409
+    assert _filas(datetime.datetime.combine(MANANA, datetime.time(15))) == 1
+
+def test_mismo_horario_desde_dos_sesiones_a_la_vez(base):
+    inicio = datetime.datetime.combine(MANANA, datetime.time(16))
+    listos = threading.Barrier(2)
+
+    def reservar(telefono):
+        db = database.SessionLocal()
+        try:
+            listos.wait()
+            turno = crud.create_turno(db, schemas.TurnoCreate(
+                negocio_id=1, staff_id=1, servicio_id=1, telefono_cliente=telefono, fecha_hora_inicio=inicio))
+            return turno is not None
+        finally:
+            db.close()
+
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        resultados = list(pool.map(reservar, [telefono_cliente(1, 1), telefono_cliente(1, 2)]))
+    # La base (trigger en SQLite, exclusión en Postgres) deja pasar a uno solo; el otro es "ocupado"
+    assert sorted(resultados) == [False, True]
+    assert _filas(inicio) == 1
@@ -0,0 +1,62 @@
+import time
+import asyncio
+import aiosqlite
+import httpx
+import pytest
+import database
+import main
+from benchmarks.datos_sinteticos import telefono_cliente, telefono_negocio
+
+# Cada sentencia del motor async tarda esto de más (como la latencia de red hasta Neon). Si el
+# webhook bloqueara el event loop o compartiera una sola conexión/sesión, N mensajes en paralelo
+# tardarían N veces lo que tarda uno.
+DEMORA_CONSULTA_S = 0.2
+CONCURRENTES = 8
+
+@pytest.fixture
+def base_lenta(base, monkeypatch):
+    execute_original = aiosqlite.Cursor.execute
+
+    async def execute_con_demora(self, *args, **kwargs):
+        await asyncio.sleep(DEMORA_CONSULTA_S)
+        return await execute_original(self, *args, **kwargs)
+
+    monkeypatch.setattr(aiosqlite.Cursor, "execute", execute_con_demora)
+    return base
+
+async def _escribir(cliente, n):
+    # "mis reservas" sólo lee: no hay escrituras que SQLite tenga que encolar
+    return await cliente.post("/webhook/", data={
+        "Body": "mis reservas",
+        "From": f"whatsapp:{telefono_cliente(1, n)}",
+        "To": f"whatsapp:{telefono_negocio(1)}",
+    })
+
+async def _medir():
+    try:
+        async with main.app.router.lifespan_context(main.app):
+            transporte = httpx.ASGITransport(app=main.app)
+            async with httpx.AsyncClient(transport=transporte, base_url="http://prueba") as cliente:
+                await _escribir(cliente, 1)  # negocio y catálogo quedan en caché
+
+                inicio = time.perf_counter()
+                respuestas = [await _escribir(cliente, 2)]
+                uno = time.perf_counter() - inicio
+
+                inicio = time.perf_counter()
+                respuestas += await asyncio.gather(*[_escribir(cliente, n) for n in range(3, 3 + CONCURRENTES)])
+                en_paralelo = time.perf_counter() - inicio
+    finally:
+        # Las conexiones async quedan atadas a este event loop
+        await database.async_engine.dispose()
+    return uno, en_paralelo, respuestas
+
+def test_webhooks_en_paralelo_tardan_como_uno(base_lenta):
+    uno, en_paralelo, respuestas = asyncio.run(_medir())
+
+    assert all(r.status_code == 200 for r in respuestas)
+    assert all("reservas" in r.text.lower() for r in respuestas)
+    # La demora está en el camino del pedido (si no, la prueba no mide nada)
+    assert uno >= DEMORA_CONSULTA_S
+    # Serializados serían ~CONCURRENTES veces uno; concurrentes, apenas más que uno
+    assert en_paralelo < 2 * uno, f"{CONCURRENTES} en paralelo: {en_paralelo:.2f}s, uno solo: {uno:.2f}s"